@@ -0,0 +1,44 @@
+"""feed-entries
+
+Revision ID: 2ff46a8686fa
+Revises: 9b61d9c4b3a2
+Create Date: 2020-06-22 10:41:17.530412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2ff46a8686fa'
+down_revision = '9b61d9c4b3a2'
+branch_labels = None
+depends_on = None
+
+
+# Fan-out feed store maintained by the indexer when [discprov] feed_entries_max_per_user > 0,
+# see src/tasks/feed_entries.py. Populate it with scripts/backfill_feed_entries.py
+def upgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      CREATE TABLE feed_entries (
+        follower_user_id integer NOT NULL,
+        item_type varchar NOT NULL,
+        item_id integer NOT NULL,
+        is_repost boolean NOT NULL,
+        is_playlist_track boolean NOT NULL,
+        activity_timestamp timestamp NOT NULL,
+        PRIMARY KEY (follower_user_id, item_type, item_id, is_repost)
+      );
+      CREATE INDEX feed_entries_follower_activity_idx ON feed_entries (
+        follower_user_id, activity_timestamp, item_type, item_id
+      );
+      CREATE INDEX feed_entries_item_idx ON feed_entries (item_id, item_type);
+    ''')
+
+
+def downgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      DROP TABLE IF EXISTS feed_entries;
+    ''')
@@ -0,0 +1,54 @@
+"""trending-tables
+
+Revision ID: 5a3e1c2f7d84
+Revises: 2ff46a8686fa
+Create Date: 2020-06-29 16:05:42.881274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a3e1c2f7d84'
+down_revision = '2ff46a8686fa'
+branch_labels = None
+depends_on = None
+
+
+# Listen counts ingested from the identity service and the trending rankings computed from them
+# by the index_trending task, see src/tasks/index_trending.py
+def upgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      CREATE TABLE track_listen_counts (
+        time_range varchar NOT NULL,
+        track_id integer NOT NULL,
+        listens integer NOT NULL,
+        PRIMARY KEY (time_range, track_id)
+      );
+
+      CREATE TABLE trending_tracks (
+        time_range varchar NOT NULL,
+        genre varchar NOT NULL,
+        rank integer NOT NULL,
+        track_id integer NOT NULL,
+        listens integer NOT NULL,
+        repost_count integer NOT NULL,
+        windowed_repost_count integer NOT NULL,
+        save_count integer NOT NULL,
+        windowed_save_count integer NOT NULL,
+        owner_id integer NOT NULL,
+        owner_follower_count integer NOT NULL,
+        created_at timestamp,
+        PRIMARY KEY (time_range, genre, rank)
+      );
+    ''')
+
+
+def downgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      DROP TABLE IF EXISTS track_listen_counts;
+      DROP TABLE IF EXISTS trending_tracks;
+    ''')
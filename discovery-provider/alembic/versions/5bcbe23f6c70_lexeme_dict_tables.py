@@ -0,0 +1,274 @@
+"""lexeme-dict-tables
+
+Revision ID: 5bcbe23f6c70
+Revises: 042c55d0efda
+Create Date: 2020-06-08 10:12:41.512273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5bcbe23f6c70'
+down_revision = '042c55d0efda'
+branch_labels = None
+depends_on = None
+
+
+# Replace the lexeme materialized views with tables maintained incrementally by the indexer.
+# Definitions must stay in sync with src/tasks/lexeme_dict.py
+def upgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      --- track_lexeme_dict
+
+      DROP MATERIALIZED VIEW track_lexeme_dict;
+      DROP INDEX IF EXISTS track_words_idx;
+      CREATE TABLE track_lexeme_dict (
+        track_id integer NOT NULL,
+        track_title text,
+        word text NOT NULL
+      );
+      INSERT INTO track_lexeme_dict
+      SELECT * FROM (
+        SELECT
+          t.track_id,
+          t.title as track_title,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(t."title", ''), '&', 'and')
+              )
+            )
+          ) as word
+        FROM
+            tracks t
+        INNER JOIN users u ON t.owner_id = u.user_id
+        WHERE
+          t.is_current = true and
+          t.is_unlisted = false and
+          t.is_delete = false and
+          t.stem_of IS NULL and
+          u.is_current = true
+        GROUP BY t.track_id, t.title
+      ) AS words;
+      CREATE INDEX track_words_idx ON track_lexeme_dict USING gin(word gin_trgm_ops);
+      CREATE INDEX track_lexeme_dict_track_id_idx ON track_lexeme_dict (track_id);
+
+
+      --- user_lexeme_dict
+
+      DROP MATERIALIZED VIEW user_lexeme_dict;
+      DROP INDEX IF EXISTS user_words_idx;
+      CREATE TABLE user_lexeme_dict (
+        user_id integer NOT NULL,
+        user_name text,
+        word text NOT NULL
+      );
+      INSERT INTO user_lexeme_dict
+      SELECT * FROM (
+        SELECT
+          u.user_id,
+          u.name as user_name,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(u.name, ''), '&', 'and')
+              ) ||
+              to_tsvector(
+                'audius_ts_config',
+                COALESCE(u.handle, '')
+              )
+            )
+          ) as word
+        FROM
+            users u
+        WHERE u.is_current = true
+        GROUP BY u.user_id, u.name, u.handle
+      ) AS words;
+      CREATE INDEX user_words_idx ON user_lexeme_dict USING gin(word gin_trgm_ops);
+      CREATE INDEX user_lexeme_dict_user_id_idx ON user_lexeme_dict (user_id);
+
+
+      --- playlist_lexeme_dict and album_lexeme_dict
+
+      DROP MATERIALIZED VIEW playlist_lexeme_dict;
+      DROP MATERIALIZED VIEW album_lexeme_dict;
+      DROP INDEX IF EXISTS playlist_words_idx;
+      DROP INDEX IF EXISTS album_words_idx;
+      CREATE TABLE playlist_lexeme_dict (
+        playlist_id integer NOT NULL,
+        playlist_name text,
+        word text NOT NULL
+      );
+      CREATE TABLE album_lexeme_dict (
+        playlist_id integer NOT NULL,
+        playlist_name text,
+        word text NOT NULL
+      );
+      INSERT INTO playlist_lexeme_dict
+      SELECT * FROM (
+        SELECT
+          p.playlist_id,
+          p.playlist_name,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(p.playlist_name, ''), '&', 'and')
+              )
+            )
+          ) as word
+        FROM
+            playlists p
+        INNER JOIN users u ON p.playlist_owner_id = u.user_id
+        WHERE
+            p.is_current = true and
+            p.is_album = false and
+            p.is_private = false and
+            p.is_delete = false and
+            u.is_current = true
+        GROUP BY p.playlist_id, p.playlist_name
+      ) AS words;
+      INSERT INTO album_lexeme_dict
+      SELECT * FROM (
+        SELECT
+          p.playlist_id,
+          p.playlist_name,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(p.playlist_name, ''), '&', 'and')
+              )
+            )
+          ) as word
+        FROM
+            playlists p
+        INNER JOIN users u ON p.playlist_owner_id = u.user_id
+        WHERE
+            p.is_current = true and
+            p.is_album = true and
+            p.is_private = false and
+            p.is_delete = false and
+            u.is_current = true
+        GROUP BY p.playlist_id, p.playlist_name
+      ) AS words;
+      CREATE INDEX playlist_words_idx ON playlist_lexeme_dict USING gin(word gin_trgm_ops);
+      CREATE INDEX album_words_idx ON album_lexeme_dict USING gin(word gin_trgm_ops);
+      CREATE INDEX playlist_lexeme_dict_playlist_id_idx ON playlist_lexeme_dict (playlist_id);
+      CREATE INDEX album_lexeme_dict_playlist_id_idx ON album_lexeme_dict (playlist_id);
+    ''')
+
+
+def downgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      DROP TABLE track_lexeme_dict;
+      CREATE MATERIALIZED VIEW track_lexeme_dict as
+      SELECT * FROM (
+        SELECT
+          t.track_id,
+          t.title as track_title,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(t."title", ''), '&', 'and')
+              )
+            )
+          ) as word
+        FROM
+            tracks t
+        INNER JOIN users u ON t.owner_id = u.user_id
+        WHERE
+          t.is_current = true and
+          t.is_unlisted = false and
+          t.is_delete = false and
+          t.stem_of IS NULL and
+          u.is_current = true
+        GROUP BY t.track_id, t.title
+      ) AS words;
+      CREATE INDEX track_words_idx ON track_lexeme_dict USING gin(word gin_trgm_ops);
+
+      DROP TABLE user_lexeme_dict;
+      CREATE MATERIALIZED VIEW user_lexeme_dict as
+      SELECT * FROM (
+        SELECT
+          u.user_id,
+          u.name as user_name,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(u.name, ''), '&', 'and')
+              ) ||
+              to_tsvector(
+                'audius_ts_config',
+                COALESCE(u.handle, '')
+              )
+            )
+          ) as word
+        FROM
+            users u
+        WHERE u.is_current = true
+        GROUP BY u.user_id, u.name, u.handle
+      ) AS words;
+      CREATE INDEX user_words_idx ON user_lexeme_dict USING gin(word gin_trgm_ops);
+
+      DROP TABLE playlist_lexeme_dict;
+      DROP TABLE album_lexeme_dict;
+      CREATE MATERIALIZED VIEW playlist_lexeme_dict as
+      SELECT * FROM (
+        SELECT
+          p.playlist_id,
+          p.playlist_name,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(p.playlist_name, ''), '&', 'and')
+              )
+            )
+          ) as word
+        FROM
+            playlists p
+        INNER JOIN users u ON p.playlist_owner_id = u.user_id
+        WHERE
+            p.is_current = true and
+            p.is_album = false and
+            p.is_private = false and
+            p.is_delete = false and
+            u.is_current = true
+        GROUP BY p.playlist_id, p.playlist_name
+      ) AS words;
+      CREATE MATERIALIZED VIEW album_lexeme_dict as
+      SELECT * FROM (
+        SELECT
+          p.playlist_id,
+          p.playlist_name,
+          unnest(
+            tsvector_to_array(
+              to_tsvector(
+                'audius_ts_config',
+                replace(COALESCE(p.playlist_name, ''), '&', 'and')
+              )
+            )
+          ) as word
+        FROM
+            playlists p
+        INNER JOIN users u ON p.playlist_owner_id = u.user_id
+        WHERE
+            p.is_current = true and
+            p.is_album = true and
+            p.is_private = false and
+            p.is_delete = false and
+            u.is_current = true
+        GROUP BY p.playlist_id, p.playlist_name
+      ) AS words;
+      CREATE INDEX playlist_words_idx ON playlist_lexeme_dict USING gin(word gin_trgm_ops);
+      CREATE INDEX album_words_idx ON album_lexeme_dict USING gin(word gin_trgm_ops);
+    ''')
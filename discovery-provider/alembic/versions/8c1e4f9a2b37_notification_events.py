@@ -0,0 +1,43 @@
+"""notification-events
+
+Revision ID: 8c1e4f9a2b37
+Revises: 5a3e1c2f7d84
+Create Date: 2020-07-02 11:18:53.204716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1e4f9a2b37'
+down_revision = '5a3e1c2f7d84'
+branch_labels = None
+depends_on = None
+
+
+# Notifications appended by the indexer for each block and served by /notifications,
+# see src/tasks/notification_events.py. Populate it with scripts/backfill_notification_events.py
+def upgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      CREATE TABLE notification_events (
+        blocknumber integer NOT NULL,
+        event_index integer NOT NULL,
+        type varchar NOT NULL,
+        initiator integer NOT NULL,
+        entity_type varchar,
+        entity_id integer,
+        entity_owner_id integer,
+        metadata jsonb NOT NULL,
+        timestamp timestamp NOT NULL,
+        PRIMARY KEY (blocknumber, event_index)
+      );
+    ''')
+
+
+def downgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      DROP TABLE IF EXISTS notification_events;
+    ''')
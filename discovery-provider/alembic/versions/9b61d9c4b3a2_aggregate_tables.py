@@ -0,0 +1,162 @@
+"""aggregate-tables
+
+Revision ID: 9b61d9c4b3a2
+Revises: 5bcbe23f6c70
+Create Date: 2020-06-15 14:27:03.118634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b61d9c4b3a2'
+down_revision = '5bcbe23f6c70'
+branch_labels = None
+depends_on = None
+
+
+# Per entity counts maintained by the indexer, backfilled from the current rows.
+# Counts must stay in sync with src/tasks/aggregates.py
+def upgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      --- user_aggregates
+
+      CREATE TABLE user_aggregates (
+        user_id integer NOT NULL PRIMARY KEY,
+        track_count integer NOT NULL,
+        playlist_count integer NOT NULL,
+        album_count integer NOT NULL,
+        follower_count integer NOT NULL,
+        followee_count integer NOT NULL,
+        repost_count integer NOT NULL,
+        track_save_count integer NOT NULL,
+        track_blocknumber integer
+      );
+      INSERT INTO user_aggregates
+      SELECT
+        u.user_id,
+        COALESCE(t.track_count, 0),
+        COALESCE(p.playlist_count, 0),
+        COALESCE(p.album_count, 0),
+        COALESCE(followers.follower_count, 0),
+        COALESCE(followees.followee_count, 0),
+        COALESCE(r.repost_count, 0),
+        COALESCE(s.track_save_count, 0),
+        t.track_blocknumber
+      FROM (SELECT DISTINCT user_id FROM users WHERE is_current = true) u
+      LEFT JOIN (
+        SELECT
+          owner_id,
+          count(*) FILTER (WHERE is_unlisted = false and stem_of IS NULL) as track_count,
+          max(blocknumber) as track_blocknumber
+        FROM tracks
+        WHERE is_current = true and is_delete = false
+        GROUP BY owner_id
+      ) t ON t.owner_id = u.user_id
+      LEFT JOIN (
+        SELECT
+          playlist_owner_id,
+          count(*) FILTER (WHERE is_album = false) as playlist_count,
+          count(*) FILTER (WHERE is_album = true) as album_count
+        FROM playlists
+        WHERE is_current = true and is_private = false and is_delete = false
+        GROUP BY playlist_owner_id
+      ) p ON p.playlist_owner_id = u.user_id
+      LEFT JOIN (
+        SELECT followee_user_id, count(*) as follower_count
+        FROM follows
+        WHERE is_current = true and is_delete = false
+        GROUP BY followee_user_id
+      ) followers ON followers.followee_user_id = u.user_id
+      LEFT JOIN (
+        SELECT follower_user_id, count(*) as followee_count
+        FROM follows
+        WHERE is_current = true and is_delete = false
+        GROUP BY follower_user_id
+      ) followees ON followees.follower_user_id = u.user_id
+      LEFT JOIN (
+        SELECT user_id, count(*) as repost_count
+        FROM reposts
+        WHERE is_current = true and is_delete = false
+        GROUP BY user_id
+      ) r ON r.user_id = u.user_id
+      LEFT JOIN (
+        SELECT user_id, count(*) as track_save_count
+        FROM saves
+        WHERE is_current = true and is_delete = false and save_type = 'track'
+        GROUP BY user_id
+      ) s ON s.user_id = u.user_id;
+
+      --- track_aggregates
+
+      CREATE TABLE track_aggregates (
+        track_id integer NOT NULL PRIMARY KEY,
+        repost_count integer NOT NULL,
+        save_count integer NOT NULL
+      );
+      INSERT INTO track_aggregates
+      SELECT
+        t.track_id,
+        COALESCE(r.repost_count, 0),
+        COALESCE(s.save_count, 0)
+      FROM (SELECT DISTINCT track_id FROM tracks WHERE is_current = true) t
+      LEFT JOIN (
+        SELECT repost_item_id, count(*) as repost_count
+        FROM reposts
+        WHERE is_current = true and is_delete = false and repost_type = 'track'
+        GROUP BY repost_item_id
+      ) r ON r.repost_item_id = t.track_id
+      LEFT JOIN (
+        SELECT save_item_id, count(*) as save_count
+        FROM saves
+        WHERE is_current = true and is_delete = false and save_type = 'track'
+        GROUP BY save_item_id
+      ) s ON s.save_item_id = t.track_id;
+
+      --- playlist_aggregates
+
+      CREATE TABLE playlist_aggregates (
+        playlist_id integer NOT NULL PRIMARY KEY,
+        playlist_repost_count integer NOT NULL,
+        album_repost_count integer NOT NULL,
+        playlist_save_count integer NOT NULL,
+        album_save_count integer NOT NULL
+      );
+      INSERT INTO playlist_aggregates
+      SELECT
+        p.playlist_id,
+        COALESCE(r.playlist_repost_count, 0),
+        COALESCE(r.album_repost_count, 0),
+        COALESCE(s.playlist_save_count, 0),
+        COALESCE(s.album_save_count, 0)
+      FROM (SELECT DISTINCT playlist_id FROM playlists WHERE is_current = true) p
+      LEFT JOIN (
+        SELECT
+          repost_item_id,
+          count(*) FILTER (WHERE repost_type = 'playlist') as playlist_repost_count,
+          count(*) FILTER (WHERE repost_type = 'album') as album_repost_count
+        FROM reposts
+        WHERE is_current = true and is_delete = false and repost_type IN ('playlist', 'album')
+        GROUP BY repost_item_id
+      ) r ON r.repost_item_id = p.playlist_id
+      LEFT JOIN (
+        SELECT
+          save_item_id,
+          count(*) FILTER (WHERE save_type = 'playlist') as playlist_save_count,
+          count(*) FILTER (WHERE save_type = 'album') as album_save_count
+        FROM saves
+        WHERE is_current = true and is_delete = false and save_type IN ('playlist', 'album')
+        GROUP BY save_item_id
+      ) s ON s.save_item_id = p.playlist_id;
+    ''')
+
+
+def downgrade():
+    connection = op.get_bind()
+    connection.execute('''
+      DROP TABLE IF EXISTS user_aggregates;
+      DROP TABLE IF EXISTS track_aggregates;
+      DROP TABLE IF EXISTS playlist_aggregates;
+    ''')
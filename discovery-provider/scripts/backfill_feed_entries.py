@@ -0,0 +1,58 @@
+""" Rebuild the feed_entries table backing /feed from the current follows, tracks, playlists and reposts.
+
+    The indexer keeps feed entries up to date incrementally once [discprov] feed_entries_max_per_user
+    is set. Run this one-shot command after enabling the store, after changing the per user cap, or
+    when the entries are suspected to be out of sync.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.backfill_feed_entries [--batch-size 1000]
+"""
+import argparse
+import ast
+import logging
+from src.models import Follow
+from src.tasks.feed_entries import FEED_ENTRIES_MAX_PER_USER, empty_feed_changes, update_feed_entries
+from src.utils.config import shared_config
+from src.utils.db_session import SessionManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill_feed_entries(batch_size):
+    if FEED_ENTRIES_MAX_PER_USER <= 0:
+        logger.error("backfill_feed_entries.py | Set [discprov] feed_entries_max_per_user to enable the store")
+        return
+
+    db = SessionManager(
+        shared_config["db"]["url"],
+        ast.literal_eval(shared_config["db"]["engine_args_literal"])
+    )
+    with db.scoped_session() as session:
+        follower_user_ids = [
+            follower_user_id for (follower_user_id,) in (
+                session.query(Follow.follower_user_id)
+                .filter(Follow.is_current == True, Follow.is_delete == False)
+                .distinct()
+                .order_by(Follow.follower_user_id)
+                .all()
+            )
+        ]
+
+    # each batch of followers is rebuilt in its own transaction
+    for batch_start in range(0, len(follower_user_ids), batch_size):
+        feed_changes = empty_feed_changes()
+        feed_changes["follower"].update(follower_user_ids[batch_start:batch_start + batch_size])
+        with db.scoped_session() as session:
+            update_feed_entries(session, feed_changes)
+        logger.info(
+            f"backfill_feed_entries.py | Rebuilt {min(batch_start + batch_size, len(follower_user_ids))}"
+            f"/{len(follower_user_ids)} followers"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfill_feed_entries(args.batch_size)
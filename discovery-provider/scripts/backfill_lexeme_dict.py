@@ -0,0 +1,28 @@
+""" Rebuild the search lexeme dictionaries from the current users, tracks and playlists.
+
+    The indexer keeps the lexeme dictionaries up to date incrementally. Run this one-shot command
+    after restoring a database or when the dictionaries are suspected to be out of sync.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.backfill_lexeme_dict
+"""
+import ast
+import logging
+from src.tasks.lexeme_dict import rebuild_lexeme_dicts
+from src.utils.config import shared_config
+from src.utils.db_session import SessionManager
+
+logging.basicConfig(level=logging.INFO)
+
+
+def backfill_lexeme_dict():
+    db = SessionManager(
+        shared_config["db"]["url"],
+        ast.literal_eval(shared_config["db"]["engine_args_literal"])
+    )
+    with db.scoped_session() as session:
+        rebuild_lexeme_dicts(session)
+
+
+if __name__ == "__main__":
+    backfill_lexeme_dict()
@@ -0,0 +1,50 @@
+""" Populate the notification_events table backing /notifications for already indexed blocks.
+
+    The indexer appends the notifications of each block it indexes. Run this one-shot command once
+    after the notification_events migration to derive the notifications of the blocks indexed before
+    it, or to rebuild a block range. Existing events in the range are replaced.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.backfill_notification_events [--start-block 0] [--end-block N]
+            [--batch-size 5000]
+"""
+import argparse
+import ast
+import logging
+from src.models import Block, NotificationEvent
+from src.tasks.notification_events import update_notification_events
+from src.utils.config import shared_config
+from src.utils.db_session import SessionManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill_notification_events(start_block, end_block, batch_size):
+    db = SessionManager(
+        shared_config["db"]["url"],
+        ast.literal_eval(shared_config["db"]["engine_args_literal"])
+    )
+    if end_block is None:
+        with db.scoped_session() as session:
+            end_block = session.query(Block.number).filter(Block.is_current == True).scalar() or 0
+
+    # each batch of blocks is replaced in its own transaction
+    for batch_start in range(start_block, end_block + 1, batch_size):
+        batch_end = min(batch_start + batch_size - 1, end_block)
+        with db.scoped_session() as session:
+            session.query(NotificationEvent).filter(
+                NotificationEvent.blocknumber >= batch_start,
+                NotificationEvent.blocknumber <= batch_end
+            ).delete()
+            update_notification_events(session, batch_start - 1, batch_end)
+        logger.info(f"backfill_notification_events.py | Backfilled blocks up to {batch_end}/{end_block}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start-block", type=int, default=0)
+    parser.add_argument("--end-block", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    backfill_notification_events(args.start_block, args.end_block, args.batch_size)
@@ -0,0 +1,209 @@
+""" Benchmark the populate_*_metadata query helpers against the per-counter queries they replaced.
+
+    Each helper is run on random batches of current users, tracks and playlists. The number of
+    statements sent to the database (round trips) and the p50/p95 latency of each implementation
+    are reported.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.benchmark_populate_metadata [--iterations 50] [--batch-size 100]
+            [--current-user-id 1]
+"""
+import argparse
+import ast
+import time
+from sqlalchemy import event, func
+from src.models import User, Track, Playlist, Follow, Repost, RepostType, Save, SaveType
+from src.queries.query_helpers import populate_user_metadata, populate_track_metadata, \
+    populate_playlist_metadata
+from src.utils.config import shared_config
+from src.utils.db_session import SessionManager
+
+playlist_repost_types = [RepostType.playlist, RepostType.album]
+playlist_save_types = [SaveType.playlist, SaveType.album]
+
+
+######## BASELINE ########
+# One GROUP BY query per counter, as populate_*_metadata used to do
+
+def baseline_user_metadata(session, user_ids, current_user_id):
+    owner_filters = [Track.is_current == True, Track.is_delete == False, Track.owner_id.in_(user_ids)]
+    session.query(Track.owner_id, func.count(Track.owner_id)).filter(
+        *owner_filters, Track.is_unlisted == False, Track.stem_of == None
+    ).group_by(Track.owner_id).all()
+    for is_album in [False, True]:
+        session.query(Playlist.playlist_owner_id, func.count(Playlist.playlist_owner_id)).filter(
+            Playlist.is_current == True,
+            Playlist.is_album == is_album,
+            Playlist.is_private == False,
+            Playlist.is_delete == False,
+            Playlist.playlist_owner_id.in_(user_ids)
+        ).group_by(Playlist.playlist_owner_id).all()
+    for column in [Follow.followee_user_id, Follow.follower_user_id]:
+        session.query(column, func.count(column)).filter(
+            Follow.is_current == True, Follow.is_delete == False, column.in_(user_ids)
+        ).group_by(column).all()
+    session.query(Repost.user_id, func.count(Repost.user_id)).filter(
+        Repost.is_current == True, Repost.is_delete == False, Repost.user_id.in_(user_ids)
+    ).group_by(Repost.user_id).all()
+    session.query(Save.user_id, func.count(Save.user_id)).filter(
+        Save.is_current == True,
+        Save.is_delete == False,
+        Save.save_type == SaveType.track,
+        Save.user_id.in_(user_ids)
+    ).group_by(Save.user_id).all()
+    session.query(Track.owner_id, func.max(Track.blocknumber)).filter(
+        *owner_filters
+    ).group_by(Track.owner_id).all()
+
+    if current_user_id:
+        follow_filters = [Follow.is_current == True, Follow.is_delete == False]
+        session.query(Follow.followee_user_id).filter(
+            *follow_filters, Follow.followee_user_id.in_(user_ids), Follow.follower_user_id == current_user_id
+        ).all()
+        followees = [
+            r[0] for r in session.query(Follow.followee_user_id).filter(
+                *follow_filters, Follow.follower_user_id == current_user_id
+            )
+        ]
+        session.query(Follow.followee_user_id, func.count(Follow.followee_user_id)).filter(
+            *follow_filters, Follow.follower_user_id.in_(followees), Follow.followee_user_id.in_(user_ids)
+        ).group_by(Follow.followee_user_id).all()
+
+
+def baseline_item_metadata(session, item_ids, repost_types, save_types, current_user_id):
+    repost_filters = [
+        Repost.is_current == True,
+        Repost.is_delete == False,
+        Repost.repost_item_id.in_(item_ids),
+        Repost.repost_type.in_(repost_types)
+    ]
+    save_filters = [
+        Save.is_current == True,
+        Save.is_delete == False,
+        Save.save_item_id.in_(item_ids),
+        Save.save_type.in_(save_types)
+    ]
+    session.query(Repost.repost_item_id, func.count(Repost.repost_item_id)).filter(
+        *repost_filters
+    ).group_by(Repost.repost_item_id).all()
+    session.query(Save.save_item_id, func.count(Save.save_item_id)).filter(
+        *save_filters
+    ).group_by(Save.save_item_id).all()
+
+    if current_user_id:
+        session.query(Repost.repost_item_id).filter(*repost_filters, Repost.user_id == current_user_id).all()
+        session.query(Save.save_item_id).filter(*save_filters, Save.user_id == current_user_id).all()
+        followees = session.query(Follow.followee_user_id).filter(
+            Follow.follower_user_id == current_user_id, Follow.is_current == True, Follow.is_delete == False
+        )
+        session.query(Repost).filter(*repost_filters, Repost.user_id.in_(followees)).all()
+        session.query(Save).filter(*save_filters, Save.user_id.in_(followees)).all()
+
+
+######## BENCHMARK ########
+
+def sample_ids(session, id_column, is_current_column, batch_size):
+    return [
+        r[0] for r in session.query(id_column)
+        .filter(is_current_column == True)
+        .order_by(func.random())
+        .limit(batch_size)
+        .all()
+    ]
+
+
+def percentile(durations, pct):
+    durations = sorted(durations)
+    return durations[min(int(len(durations) * pct / 100), len(durations) - 1)]
+
+
+def run_benchmark(name, run, iterations, round_trips):
+    durations = []
+    statements = []
+    for _ in range(iterations):
+        round_trips[0] = 0
+        start_time = time.time()
+        run()
+        durations.append((time.time() - start_time) * 1000)
+        statements.append(round_trips[0])
+    print(
+        f"{name:<20} round trips {max(statements):>3}   "
+        f"p50 {percentile(durations, 50):>8.2f}ms   p95 {percentile(durations, 95):>8.2f}ms"
+    )
+
+
+def benchmark_populate_metadata(iterations, batch_size, current_user_id):
+    db = SessionManager(
+        shared_config["db"]["url"],
+        ast.literal_eval(shared_config["db"]["engine_args_literal"])
+    )
+    with db.scoped_session() as session:
+        round_trips = [0]
+
+        @event.listens_for(session.get_bind(), "before_cursor_execute")
+        def count_round_trip(*args):  # pylint: disable=W0612,W0613
+            round_trips[0] += 1
+
+        user_ids = sample_ids(session, User.user_id, User.is_current, batch_size)
+        track_ids = sample_ids(session, Track.track_id, Track.is_current, batch_size)
+        playlist_ids = sample_ids(session, Playlist.playlist_id, Playlist.is_current, batch_size)
+        print(
+            f"{len(user_ids)} users, {len(track_ids)} tracks, {len(playlist_ids)} playlists, "
+            f"{iterations} iterations, current user {current_user_id}"
+        )
+
+        # The populated dicts only need an id, remix metadata is not part of the comparison
+        run_benchmark(
+            "users baseline",
+            lambda: baseline_user_metadata(session, user_ids, current_user_id),
+            iterations, round_trips
+        )
+        run_benchmark(
+            "users",
+            lambda: populate_user_metadata(
+                session, user_ids, [{"user_id": user_id} for user_id in user_ids], current_user_id, True
+            ),
+            iterations, round_trips
+        )
+        run_benchmark(
+            "tracks baseline",
+            lambda: baseline_item_metadata(
+                session, track_ids, [RepostType.track], [SaveType.track], current_user_id
+            ),
+            iterations, round_trips
+        )
+        run_benchmark(
+            "tracks",
+            lambda: populate_track_metadata(
+                session, track_ids, [{"track_id": track_id} for track_id in track_ids], current_user_id
+            ),
+            iterations, round_trips
+        )
+        run_benchmark(
+            "playlists baseline",
+            lambda: baseline_item_metadata(
+                session, playlist_ids, playlist_repost_types, playlist_save_types, current_user_id
+            ),
+            iterations, round_trips
+        )
+        run_benchmark(
+            "playlists",
+            lambda: populate_playlist_metadata(
+                session,
+                playlist_ids,
+                [{"playlist_id": playlist_id} for playlist_id in playlist_ids],
+                playlist_repost_types,
+                playlist_save_types,
+                current_user_id
+            ),
+            iterations, round_trips
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--current-user-id", type=int, default=None)
+    args = parser.parse_args()
+    benchmark_populate_metadata(args.iterations, args.batch_size, args.current_user_id)
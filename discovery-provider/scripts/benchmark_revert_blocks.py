@@ -0,0 +1,163 @@
+""" Benchmark the set based revert of indexed blocks against the per block, per row revert it replaced.
+
+    Each implementation reverts the most recently indexed 10, 100 and 1000 blocks inside a
+    transaction that is rolled back afterwards, so the indexed data is left untouched. The number of
+    statements sent to the database (round trips) and the p50/p95 latency of each implementation
+    are reported.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.benchmark_revert_blocks [--iterations 5] [--block-counts 10,100,1000]
+"""
+import argparse
+import ast
+import time
+from sqlalchemy import event
+from src.models import Block, User, Track, Repost, Follow, Playlist, Save
+from src.tasks.index import revert_block_range, default_padded_start_hash, default_config_start_hash
+from src.tasks.notification_events import revert_notification_events
+from src.utils.config import shared_config
+from src.utils.db_session import SessionManager, get_engine
+
+
+######## BASELINE ########
+# One pass per block, with one previous entry lookup and one delete per reverted row, as
+# revert_blocks used to do
+
+def baseline_revert_blocks(session, revert_blocks_list):
+    for revert_block in revert_blocks_list:
+        revert_hash = revert_block.blockhash
+        revert_block_number = revert_block.number
+        parent_hash = revert_block.parenthash
+        if revert_block.parenthash == default_padded_start_hash:
+            parent_hash = default_config_start_hash
+
+        session.query(Block).filter(Block.blockhash == revert_hash).update({"is_current": False})
+        session.query(Block).filter(Block.blockhash == parent_hash).update({"is_current": True})
+
+        for save_to_revert in session.query(Save).filter(Save.blockhash == revert_hash).all():
+            previous_save_entry = (
+                session.query(Save)
+                .filter(Save.user_id == save_to_revert.user_id)
+                .filter(Save.save_item_id == save_to_revert.save_item_id)
+                .filter(Save.save_type == save_to_revert.save_type)
+                .order_by(Save.blocknumber.desc())
+                .first()
+            )
+            if previous_save_entry:
+                previous_save_entry.is_current = True
+            session.delete(save_to_revert)
+
+        for repost_to_revert in session.query(Repost).filter(Repost.blockhash == revert_hash).all():
+            previous_repost_entry = (
+                session.query(Repost)
+                .filter(Repost.user_id == repost_to_revert.user_id)
+                .filter(Repost.repost_item_id == repost_to_revert.repost_item_id)
+                .filter(Repost.repost_type == repost_to_revert.repost_type)
+                .order_by(Repost.blocknumber.desc())
+                .first()
+            )
+            if previous_repost_entry:
+                previous_repost_entry.is_current = True
+            session.delete(repost_to_revert)
+
+        for follow_to_revert in session.query(Follow).filter(Follow.blockhash == revert_hash).all():
+            previous_follow_entry = (
+                session.query(Follow)
+                .filter(Follow.follower_user_id == follow_to_revert.follower_user_id)
+                .filter(Follow.followee_user_id == follow_to_revert.followee_user_id)
+                .order_by(Follow.blocknumber.desc())
+                .first()
+            )
+            if previous_follow_entry:
+                previous_follow_entry.is_current = True
+            session.delete(follow_to_revert)
+
+        for (model, id_column) in [
+                (Playlist, Playlist.playlist_id),
+                (Track, Track.track_id),
+                (User, User.user_id)
+        ]:
+            for entry_to_revert in session.query(model).filter(model.blockhash == revert_hash).all():
+                previous_entry = (
+                    session.query(model)
+                    .filter(id_column == getattr(entry_to_revert, id_column.key))
+                    .filter(model.blocknumber < revert_block_number)
+                    .order_by(model.blocknumber.desc())
+                    .first()
+                )
+                if previous_entry:
+                    previous_entry.is_current = True
+                session.delete(entry_to_revert)
+
+        session.query(Block).filter(Block.blockhash == revert_hash).delete()
+        revert_notification_events(session, [revert_block_number])
+    session.flush()
+
+
+######## BENCHMARK ########
+
+def percentile(durations, pct):
+    durations = sorted(durations)
+    return durations[min(int(len(durations) * pct / 100), len(durations) - 1)]
+
+
+def run_benchmark(name, db, revert, revert_block_numbers, iterations, round_trips):
+    durations = []
+    statements = []
+    for _ in range(iterations):
+        session = db.session()
+        try:
+            # revert the blocks from the current block to the oldest, as update_task does
+            revert_blocks_list = (
+                session.query(Block)
+                .filter(Block.number.in_(revert_block_numbers))
+                .order_by(Block.number.desc())
+                .all()
+            )
+            round_trips[0] = 0
+            start_time = time.time()
+            revert(session, revert_blocks_list)
+            durations.append((time.time() - start_time) * 1000)
+            statements.append(round_trips[0])
+        finally:
+            session.rollback()
+            session.close()
+    print(
+        f"{name:<28} round trips {max(statements):>6}   "
+        f"p50 {percentile(durations, 50):>10.2f}ms   p95 {percentile(durations, 95):>10.2f}ms"
+    )
+
+
+def benchmark_revert_blocks(iterations, block_counts):
+    db_url = shared_config["db"]["url"]
+    db_engine_args = ast.literal_eval(shared_config["db"]["engine_args_literal"])
+    db = SessionManager(db_url, db_engine_args)
+    round_trips = [0]
+
+    # SessionManager shares the engine of the same url and engine args
+    @event.listens_for(get_engine(db_url, db_engine_args), "before_cursor_execute")
+    def count_round_trip(*args):  # pylint: disable=W0612,W0613
+        round_trips[0] += 1
+
+    with db.scoped_session() as session:
+        current_block_number = session.query(Block.number).filter(Block.is_current == True).scalar() or 0
+
+    for block_count in block_counts:
+        revert_block_numbers = list(range(max(current_block_number - block_count + 1, 1), current_block_number + 1))
+        print(f"{len(revert_block_numbers)} blocks up to {current_block_number}, {iterations} iterations")
+        run_benchmark(
+            f"{block_count} blocks baseline", db, baseline_revert_blocks, revert_block_numbers,
+            iterations, round_trips
+        )
+        run_benchmark(
+            f"{block_count} blocks", db, revert_block_range, revert_block_numbers,
+            iterations, round_trips
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--block-counts", default="10,100,1000")
+    args = parser.parse_args()
+    benchmark_revert_blocks(args.iterations, [int(block_count) for block_count in args.block_counts.split(",")])
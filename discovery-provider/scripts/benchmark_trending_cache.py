@@ -0,0 +1,101 @@
+""" Benchmark the CPU cost of reading a page of a cached trending ranking.
+
+    A synthetic ranking is encoded both as the JSON document the trending cache used to store and
+    as the packed records it stores now. For each page size, the CPU time (process time) to decode
+    one page and the number of bytes read from redis are reported as p50/p95 per request. The
+    JSON layout has to be read and decoded whole before being sliced, the packed layout is read
+    with GETRANGE and only the requested records are decoded.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.benchmark_trending_cache [--iterations 1000] [--ranking-size 1000]
+"""
+import argparse
+import json
+import random
+import time
+from src.utils.trending_cache import pack_trending_records, unpack_trending_records, \
+    trending_cache_header, trending_cache_record
+
+page_limits = [10, 100, 1000]
+
+
+def synthetic_ranking(ranking_size):
+    return [
+        {
+            "track_id": random.randint(1, 2 ** 31),
+            "listens": ranking_size - rank,
+            "repost_count": random.randint(0, 10000),
+            "windowed_repost_count": random.randint(0, 1000),
+            "save_count": random.randint(0, 10000),
+            "windowed_save_count": random.randint(0, 1000),
+            "track_owner_id": random.randint(1, 2 ** 31),
+            "track_owner_follower_count": random.randint(0, 100000),
+            "created_at": "2020-06-01T12:30:15",
+        }
+        for rank in range(ranking_size)
+    ]
+
+
+######## BASELINE ########
+# Whole JSON document decoded, then sliced, as the trending cache used to do
+
+def baseline_read_page(cached_value, offset, limit):
+    cached_entry = json.loads(cached_value.decode("utf-8"))
+    return cached_entry["response"]["listen_counts"][offset:offset + limit], len(cached_value)
+
+
+######## PACKED ########
+# Byte ranges of the header and the page, as get_trending_cache_entry reads them with GETRANGE
+
+def packed_read_page(cached_value, offset, limit):
+    header = cached_value[:trending_cache_header.size]
+    records_start = trending_cache_header.size + offset * trending_cache_record.size
+    packed_records = cached_value[records_start:records_start + limit * trending_cache_record.size]
+    trending_cache_header.unpack(header)
+    return unpack_trending_records(packed_records), len(header) + len(packed_records)
+
+
+######## BENCHMARK ########
+
+def percentile(durations, pct):
+    durations = sorted(durations)
+    return durations[min(int(len(durations) * pct / 100), len(durations) - 1)]
+
+
+def run_benchmark(name, read_page, cached_value, ranking_size, limit, iterations):
+    durations = []
+    bytes_read = []
+    for _ in range(iterations):
+        offset = random.randint(0, max(ranking_size - limit, 0))
+        start_time = time.process_time()
+        (_, page_bytes) = read_page(cached_value, offset, limit)
+        durations.append((time.process_time() - start_time) * 1000)
+        bytes_read.append(page_bytes)
+    print(
+        f"{name:<10} limit {limit:>5}   bytes read {max(bytes_read):>8}   "
+        f"p50 {percentile(durations, 50):>8.3f}ms   p95 {percentile(durations, 95):>8.3f}ms"
+    )
+
+
+def benchmark_trending_cache(iterations, ranking_size):
+    ranking = synthetic_ranking(ranking_size)
+    json_value = json.dumps(
+        {"response": {"listen_counts": ranking}, "refreshed_at": time.time()}
+    ).encode("utf-8")
+    packed_value = pack_trending_records(ranking, time.time())
+    print(
+        f"{ranking_size} ranked tracks, {iterations} iterations, "
+        f"json {len(json_value)} bytes, packed {len(packed_value)} bytes"
+    )
+
+    for limit in page_limits:
+        run_benchmark("json", baseline_read_page, json_value, ranking_size, limit, iterations)
+        run_benchmark("packed", packed_read_page, packed_value, ranking_size, limit, iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--ranking-size", type=int, default=1000)
+    args = parser.parse_args()
+    benchmark_trending_cache(args.iterations, args.ranking_size)
@@ -0,0 +1,63 @@
+""" Recompute the user_aggregates, track_aggregates and playlist_aggregates rows from the current
+    users, tracks, playlists, follows, reposts and saves.
+
+    The indexer keeps the aggregate tables up to date by applying count deltas. Run this one-shot
+    command when the counts are suspected to be out of sync, with indexing stopped: a delta applied
+    while a batch is being recomputed can be overwritten.
+
+    Usage (from the discovery-provider directory):
+        python -m scripts.recompute_aggregates [--batch-size 1000] [--entity-types user,track,playlist]
+"""
+import argparse
+import ast
+import logging
+from src.models import User, Track, Playlist
+from src.tasks.aggregates import recompute_aggregates
+from src.utils.config import shared_config
+from src.utils.db_session import SessionManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# entity type -> model and id column of the entities with an aggregate row
+entity_id_columns = {
+    "user": (User, User.user_id),
+    "track": (Track, Track.track_id),
+    "playlist": (Playlist, Playlist.playlist_id),
+}
+
+
+def recompute_all_aggregates(batch_size, entity_types):
+    db = SessionManager(
+        shared_config["db"]["url"],
+        ast.literal_eval(shared_config["db"]["engine_args_literal"])
+    )
+    for entity_type in entity_types:
+        (model, id_column) = entity_id_columns[entity_type]
+        with db.scoped_session() as session:
+            entity_ids = [
+                entity_id for (entity_id,) in (
+                    session.query(id_column)
+                    .filter(model.is_current == True)
+                    .distinct()
+                    .order_by(id_column)
+                    .all()
+                )
+            ]
+
+        # each batch of entities is recomputed in its own transaction
+        for batch_start in range(0, len(entity_ids), batch_size):
+            with db.scoped_session() as session:
+                recompute_aggregates(session, entity_type, entity_ids[batch_start:batch_start + batch_size])
+            logger.info(
+                f"recompute_aggregates.py | Recomputed {min(batch_start + batch_size, len(entity_ids))}"
+                f"/{len(entity_ids)} {entity_type}s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--entity-types", default="user,track,playlist")
+    args = parser.parse_args()
+    recompute_all_aggregates(args.batch_size, args.entity_types.split(","))
@@ -25,6 +25,8 @@ from src.utils import helpers, config
 from src.utils.db_session import SessionManager
 from src.utils.config import config_files, shared_config, ConfigIni
 from src.utils.ipfs_lib import IPFSClient
+from src.utils.ipfs_cache import CIDCache
+from src.utils.event_decoder import EventDecoder
 from src.tasks import celery_app
 
 # these global vars will be set in create_celery function
@@ -254,7 +256,14 @@ def configure_celery(flask_app, celery, test_config=None):
 
     # Update celery configuration
     celery.conf.update(
-        imports=["src.tasks.index", "src.tasks.index_blacklist", "src.tasks.index_cache"],
+        imports=[
+            "src.tasks.index",
+            "src.tasks.index_blacklist",
+            "src.tasks.index_cache",
+            "src.tasks.index_lexeme_dict",
+            "src.tasks.index_peers",
+            "src.tasks.index_trending"
+        ],
         beat_schedule={
             "update_discovery_provider": {
                 "task": "update_discovery_provider",
@@ -267,6 +276,18 @@ def configure_celery(flask_app, celery, test_config=None):
             "update_cache": {
                 "task": "update_discovery_cache",
                 "schedule": timedelta(seconds=60)
+            },
+            "update_lexeme_dict": {
+                "task": "update_lexeme_dict",
+                "schedule": timedelta(seconds=int(shared_config["discprov"]["lexeme_dict_refresh_interval"]))
+            },
+            "update_ipfs_peers": {
+                "task": "update_ipfs_peers",
+                "schedule": timedelta(seconds=int(shared_config["discprov"]["peer_refresh_task_interval"]))
+            },
+            "index_trending": {
+                "task": "index_trending",
+                "schedule": timedelta(seconds=int(shared_config["discprov"]["trending_refresh_interval"]))
             }
         },
         task_serializer="json",
@@ -282,10 +303,26 @@ def configure_celery(flask_app, celery, test_config=None):
     gateway_addrs = shared_config["ipfs"]["gateway_hosts"].split(',')
     gateway_addrs.append(shared_config["discprov"]["user_metadata_service_url"])
     logger.warning(f"__init__.py | {gateway_addrs}")
+    cid_cache = CIDCache(
+        shared_config["ipfs"]["cid_cache_path"] or None,
+        int(shared_config["ipfs"]["cid_cache_memory_bytes"])
+    )
     ipfs_client = IPFSClient(
-        shared_config["ipfs"]["host"], shared_config["ipfs"]["port"], gateway_addrs
+        shared_config["ipfs"]["host"], shared_config["ipfs"]["port"], gateway_addrs, cid_cache,
+        int(shared_config["ipfs"]["gateway_hedge_count"])
     )
 
+    # Initialize the decoder of the events emitted by the indexed contracts
+    event_decoder = EventDecoder()
+    for contract_name, abi_name in [
+            ("user_factory", "UserFactory"),
+            ("track_factory", "TrackFactory"),
+            ("social_feature_factory", "SocialFeatureFactory"),
+            ("playlist_factory", "PlaylistFactory"),
+            ("user_library_factory", "UserLibraryFactory")
+    ]:
+        event_decoder.register(contract_addresses[contract_name], abi_values[abi_name]["abi"], contract_name)
+
     # Initialize Redis connection
     redis_inst = redis.Redis.from_url(url=redis_url)
 
@@ -301,6 +338,7 @@ def configure_celery(flask_app, celery, test_config=None):
             self._abi_values = abi_values
             self._shared_config = shared_config
             self._ipfs_client = ipfs_client
+            self._event_decoder = event_decoder
             self._redis = redis_inst
 
         @property
@@ -323,6 +361,10 @@ def configure_celery(flask_app, celery, test_config=None):
         def ipfs_client(self):
             return self._ipfs_client
 
+        @property
+        def event_decoder(self):
+            return self._event_decoder
+
         @property
         def redis(self):
             return self._redis
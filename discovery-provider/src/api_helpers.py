@@ -11,11 +11,15 @@ def error_response(error, error_code=500):
     return jsonify({'success': False, 'error': error}), error_code
 
 
-def success_response(response_entity=None, status=200):
+def success_response(response_entity=None, status=200, next_cursor=None):
     response_dictionary = {
         'data': response_entity
     }
 
+    # cursor of the next page, for endpoints paginated with paginate_query_with_cursor
+    if next_cursor is not None:
+        response_dictionary['next_cursor'] = next_cursor
+
     response_dictionary['success'] = True
 
     latest_indexed_block = redis.get(most_recent_indexed_block_redis_key)
@@ -333,3 +333,155 @@ class Remix(Base):
     def __repr__(self):
         return f"<Remix(parent_track_id={self.parent_track_id},\
             child_track_id={self.child_track_id}>"
+
+class UserAggregate(Base):
+    __tablename__ = "user_aggregates"
+
+    user_id = Column(Integer, primary_key=True, nullable=False)
+    track_count = Column(Integer, nullable=False)
+    playlist_count = Column(Integer, nullable=False)
+    album_count = Column(Integer, nullable=False)
+    follower_count = Column(Integer, nullable=False)
+    followee_count = Column(Integer, nullable=False)
+    repost_count = Column(Integer, nullable=False)
+    track_save_count = Column(Integer, nullable=False)
+    track_blocknumber = Column(Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<UserAggregate(user_id={self.user_id},\
+track_count={self.track_count},\
+playlist_count={self.playlist_count},\
+album_count={self.album_count},\
+follower_count={self.follower_count},\
+followee_count={self.followee_count},\
+repost_count={self.repost_count},\
+track_save_count={self.track_save_count},\
+track_blocknumber={self.track_blocknumber})>"
+
+class TrackAggregate(Base):
+    __tablename__ = "track_aggregates"
+
+    track_id = Column(Integer, primary_key=True, nullable=False)
+    repost_count = Column(Integer, nullable=False)
+    save_count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<TrackAggregate(track_id={self.track_id},\
+repost_count={self.repost_count},\
+save_count={self.save_count})>"
+
+class PlaylistAggregate(Base):
+    __tablename__ = "playlist_aggregates"
+
+    playlist_id = Column(Integer, primary_key=True, nullable=False)
+    # Counted per type so callers can request playlist and album reposts/saves separately
+    playlist_repost_count = Column(Integer, nullable=False)
+    album_repost_count = Column(Integer, nullable=False)
+    playlist_save_count = Column(Integer, nullable=False)
+    album_save_count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<PlaylistAggregate(playlist_id={self.playlist_id},\
+playlist_repost_count={self.playlist_repost_count},\
+album_repost_count={self.album_repost_count},\
+playlist_save_count={self.playlist_save_count},\
+album_save_count={self.album_save_count})>"
+
+class FeedEntry(Base):
+    __tablename__ = "feed_entries"
+
+    follower_user_id = Column(Integer, nullable=False)
+    item_type = Column(String, nullable=False)
+    item_id = Column(Integer, nullable=False)
+    # Created by a followee (false) or reposted by followees (true)
+    is_repost = Column(Boolean, nullable=False)
+    # Track released along with a playlist of its owner, hidden unless only tracks are requested
+    is_playlist_track = Column(Boolean, nullable=False)
+    activity_timestamp = Column(DateTime, nullable=False)
+
+    PrimaryKeyConstraint(follower_user_id, item_type, item_id, is_repost)
+
+    def __repr__(self):
+        return f"<FeedEntry(follower_user_id={self.follower_user_id},\
+item_type={self.item_type},\
+item_id={self.item_id},\
+is_repost={self.is_repost},\
+is_playlist_track={self.is_playlist_track},\
+activity_timestamp={self.activity_timestamp})>"
+
+class TrackListenCount(Base):
+    __tablename__ = "track_listen_counts"
+
+    # Rolling window of the listens: day, week, month or year
+    time_range = Column(String, nullable=False)
+    track_id = Column(Integer, nullable=False)
+    listens = Column(Integer, nullable=False)
+
+    PrimaryKeyConstraint(time_range, track_id)
+
+    def __repr__(self):
+        return f"<TrackListenCount(time_range={self.time_range},\
+track_id={self.track_id},\
+listens={self.listens})>"
+
+class TrendingTrack(Base):
+    __tablename__ = "trending_tracks"
+
+    time_range = Column(String, nullable=False)
+    # Empty for the ranking across all genres
+    genre = Column(String, nullable=False)
+    rank = Column(Integer, nullable=False)
+    track_id = Column(Integer, nullable=False)
+    listens = Column(Integer, nullable=False)
+    repost_count = Column(Integer, nullable=False)
+    windowed_repost_count = Column(Integer, nullable=False)
+    save_count = Column(Integer, nullable=False)
+    windowed_save_count = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    owner_follower_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=True)
+
+    PrimaryKeyConstraint(time_range, genre, rank)
+
+    def __repr__(self):
+        return f"<TrendingTrack(time_range={self.time_range},\
+genre={self.genre},\
+rank={self.rank},\
+track_id={self.track_id},\
+listens={self.listens},\
+repost_count={self.repost_count},\
+windowed_repost_count={self.windowed_repost_count},\
+save_count={self.save_count},\
+windowed_save_count={self.windowed_save_count},\
+owner_id={self.owner_id},\
+owner_follower_count={self.owner_follower_count},\
+created_at={self.created_at})>"
+
+class NotificationEvent(Base):
+    __tablename__ = "notification_events"
+
+    blocknumber = Column(Integer, nullable=False)
+    # Position of the event among the events of its block
+    event_index = Column(Integer, nullable=False)
+    # Follow, Favorite, Repost, Create, RemixCreate or RemixCosign
+    type = Column(String, nullable=False)
+    initiator = Column(Integer, nullable=False)
+    entity_type = Column(String, nullable=True)
+    entity_id = Column(Integer, nullable=True)
+    entity_owner_id = Column(Integer, nullable=True)
+    # metadata is reserved by declarative models
+    event_metadata = Column("metadata", JSONB, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+
+    PrimaryKeyConstraint(blocknumber, event_index)
+
+    def __repr__(self):
+        return f"<NotificationEvent(blocknumber={self.blocknumber},\
+event_index={self.event_index},\
+type={self.type},\
+initiator={self.initiator},\
+entity_type={self.entity_type},\
+entity_id={self.entity_id},\
+entity_owner_id={self.entity_owner_id},\
+event_metadata={self.event_metadata},\
+timestamp={self.timestamp})>"
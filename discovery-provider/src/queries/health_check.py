@@ -1,5 +1,7 @@
+import json
 import logging
 import os
+import time
 import redis
 import sqlalchemy
 
@@ -8,9 +10,12 @@ from flask import Blueprint, jsonify, request
 from web3 import HTTPProvider, Web3
 from src.models import Block
 from src.utils import helpers
-from src.utils.db_session import get_db_read_replica
+from src.utils.db_session import get_db_read_replica, get_pool_stats
 from src.utils.config import shared_config
-from src.utils.redis_constants import latest_block_redis_key, latest_block_hash_redis_key
+from src.utils.redis_constants import latest_block_redis_key, latest_block_hash_redis_key, \
+    lexeme_dict_dirty_since_redis_key, lexeme_dict_refresh_duration_redis_key, \
+    lexeme_dict_refresh_lag_redis_key, lexeme_dict_refresh_skipped_redis_key, \
+    lexeme_dict_refresh_completed_redis_key, cid_cache_stats_redis_key, ipfs_gateway_health_redis_key
 
 
 logger = logging.getLogger(__name__)
@@ -75,6 +80,33 @@ def _get_db_conn_state():
 
     return {"open_connections": num_connections, "connection_info": connection_info}
 
+# Returns freshness of the search lexeme dictionaries rebuilt by the update_lexeme_dict task
+def _get_lexeme_dict_refresh_state():
+    def get_float(key):
+        value = redis.get(key)
+        return float(value) if value is not None else None
+
+    dirty_since = get_float(lexeme_dict_dirty_since_redis_key)
+    skipped_refreshes = redis.get(lexeme_dict_refresh_skipped_redis_key)
+    return {
+        # Age of the oldest change not yet reflected in search, 0 when up to date
+        "staleness_sec": time.time() - dirty_since if dirty_since is not None else 0,
+        "last_refresh_duration_sec": get_float(lexeme_dict_refresh_duration_redis_key),
+        "last_refresh_lag_sec": get_float(lexeme_dict_refresh_lag_redis_key),
+        "last_refresh_completed": get_float(lexeme_dict_refresh_completed_redis_key),
+        "skipped_refreshes": int(skipped_refreshes) if skipped_refreshes is not None else 0,
+    }
+
+# Returns IPFS CID cache counters flushed by the indexing workers
+def _get_cid_cache_stats():
+    stats = redis.hgetall(cid_cache_stats_redis_key)
+    return {key.decode("utf-8"): int(value) for key, value in stats.items()}
+
+# Returns IPFS gateway health scores last exported by the indexing workers
+def _get_ipfs_gateway_health():
+    gateway_health = redis.get(ipfs_gateway_health_redis_key)
+    return json.loads(gateway_health) if gateway_health is not None else {}
+
 
 #### ROUTES ####
 
@@ -83,7 +115,8 @@ def version():
     return jsonify(disc_prov_version), 200
 
 # Health check for server, db, and redis. Consumes latest block data from redis instead of chain.
-# Optional boolean "verbose" flag to output db connection info.
+# Optional boolean "verbose" flag to output db connection info, pool usage, search index lag
+#   and IPFS cache and gateway stats.
 # Optional boolean "enforce_block_diff" flag to error on unhealthy blockdiff.
 # NOTE - can extend this in future to include ganache connectivity, how recently a block
 #   has been added (ex. if it's been more than 30 minutes since last block), etc.
@@ -120,6 +153,14 @@ def health_check():
     if verbose:
         # DB connections check
         health_results["db_connections"] = _get_db_conn_state()
+        # Connection pool usage for engines created in this worker process
+        health_results["db_pool_stats"] = get_pool_stats()
+        # Search lexeme refresh lag
+        health_results["lexeme_dict"] = _get_lexeme_dict_refresh_state()
+        # IPFS metadata cache hits, misses and bytes
+        health_results["ipfs_cid_cache"] = _get_cid_cache_stats()
+        # IPFS gateway latency, error rate and ejections
+        health_results["ipfs_gateway_health"] = _get_ipfs_gateway_health()
 
     # Return error on unhealthy block diff if requested.
     if enforce_block_diff and health_results["block_difference"] > healthy_block_diff:
@@ -2,23 +2,25 @@ import logging # pylint: disable=C0302
 import datetime
 import sqlalchemy
 from sqlalchemy import func, asc, desc, text, case, or_, and_, Integer, Float, Date
-from sqlalchemy.orm import aliased
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.dialects import postgresql
 
 from flask import Blueprint, request
 
 from src import api_helpers, exceptions
-from src.models import User, Track, Repost, RepostType, Follow, Playlist, Save, SaveType, Remix, Stem
+from src.models import User, Track, Repost, RepostType, Follow, Playlist, Save, SaveType, Remix, Stem, \
+    UserAggregate, FeedEntry
 from src.utils import helpers
 from src.utils.db_session import get_db_read_replica
 from src.queries import response_name_constants
-from src.queries.query_helpers import get_current_user_id, parse_sort_param, populate_user_metadata, \
+from src.queries.social_graph import get_social_graph
+from src.tasks.feed_entries import FEED_ENTRIES_MAX_PER_USER, get_feed_entries
+from src.queries.query_helpers import get_current_user_id, populate_user_metadata, \
     populate_track_metadata, populate_playlist_metadata, get_repost_counts, get_save_counts, \
     get_pagination_vars, paginate_query, get_users_by_id, get_users_ids, \
     create_save_repost_count_subquery, decayed_score, filter_to_playlist_mood, \
     create_followee_playlists_subquery, add_users_to_tracks, create_save_count_subquery, \
-    create_repost_count_subquery
+    create_repost_count_subquery, parse_sort_keys, paginate_query_with_cursor, encode_cursor, decode_cursor
 
 logger = logging.getLogger(__name__)
 bp = Blueprint("queries", __name__)
@@ -134,8 +136,11 @@ def get_tracks():
             )
 
         whitelist_params = ['created_at', 'create_date', 'release_date', 'blocknumber', 'track_id']
-        base_query = parse_sort_param(base_query, Track, whitelist_params)
-        query_results = paginate_query(base_query).all()
+        sort_keys = parse_sort_keys(Track, whitelist_params)
+        # track_id breaks ties so pages can be resumed from a cursor
+        if not any(column is Track.track_id for (column, _) in sort_keys):
+            sort_keys.append((Track.track_id, sort_keys[-1][1] if sort_keys else False))
+        (query_results, next_cursor) = paginate_query_with_cursor(base_query, sort_keys)
         tracks = helpers.query_result_to_list(query_results)
 
         track_ids = list(map(lambda track: track["track_id"], tracks))
@@ -153,7 +158,7 @@ def get_tracks():
                 if user:
                     track['user'] = user
 
-    return api_helpers.success_response(tracks)
+    return api_helpers.success_response(tracks, next_cursor=next_cursor)
 
 
 # Get all tracks matching a route_id and track_id.
@@ -336,6 +341,267 @@ def get_playlists():
     return api_helpers.success_response(playlists)
 
 
+def get_feed_items_from_follows(session, current_user_id, feed_filter, tracks_only):
+    """ Build the feed of current_user_id at read time from the content of their followees
+
+        Returns:
+            tuple of the track and playlist dicts of the feed, with their activity_timestamp, and None
+            as the feed cannot be resumed from a cursor
+    """
+    # Users followed by current user, i.e. 'followees', shared with the populate helpers
+    social_graph = get_social_graph(session, current_user_id)
+
+    # Fetch followee creations if requested
+    if feed_filter in ["original", "all"]:
+        if not tracks_only:
+            # Query playlists posted by followees, sorted and paginated by created_at desc
+            created_playlists_query = (
+                session.query(Playlist)
+                .filter(
+                    Playlist.is_current == True,
+                    Playlist.is_delete == False,
+                    Playlist.is_private == False,
+                    social_graph.followee_filter(Playlist.playlist_owner_id)
+                )
+                .order_by(desc(Playlist.created_at))
+            )
+            created_playlists = paginate_query(created_playlists_query, False).all()
+
+            # get track ids for all tracks in playlists
+            playlist_track_ids = set()
+            for playlist in created_playlists:
+                for track in playlist.playlist_contents["track_ids"]:
+                    playlist_track_ids.add(track["track"])
+
+            # get all track objects for track ids
+            playlist_tracks = (
+                session.query(Track)
+                .filter(
+                    Track.is_current == True,
+                    Track.track_id.in_(playlist_track_ids)
+                )
+                .all()
+            )
+            playlist_tracks_dict = {track.track_id: track for track in playlist_tracks}
+
+            # get all track ids that have same owner as playlist and created in "same action"
+            # "same action": track created within [x time] before playlist creation
+            tracks_to_dedupe = set()
+            for playlist in created_playlists:
+                for track_entry in playlist.playlist_contents["track_ids"]:
+                    track = playlist_tracks_dict.get(track_entry["track"])
+                    if not track:
+                        raise Exception(f"Missing track {track_entry['track']} of playlist {playlist.playlist_id}")
+                    max_timedelta = datetime.timedelta(minutes=trackDedupeMaxMinutes)
+                    if (track.owner_id == playlist.playlist_owner_id) and \
+                        (track.created_at <= playlist.created_at) and \
+                        (playlist.created_at - track.created_at <= max_timedelta):
+                        tracks_to_dedupe.add(track.track_id)
+            tracks_to_dedupe = list(tracks_to_dedupe)
+        else:
+            # No playlists to consider
+            tracks_to_dedupe = []
+            created_playlists = []
+
+
+        # Query tracks posted by followees, sorted & paginated by created_at desc
+        # exclude tracks that were posted in "same action" as playlist
+        created_tracks_query = (
+            session.query(Track)
+            .filter(
+                Track.is_current == True,
+                Track.is_delete == False,
+                Track.is_unlisted == False,
+                Track.stem_of == None,
+                social_graph.followee_filter(Track.owner_id),
+                Track.track_id.notin_(tracks_to_dedupe)
+            )
+            .order_by(desc(Track.created_at))
+        )
+        created_tracks = paginate_query(created_tracks_query, False).all()
+
+        # extract created_track_ids and created_playlist_ids
+        created_track_ids = [track.track_id for track in created_tracks]
+        created_playlist_ids = [playlist.playlist_id for playlist in created_playlists]
+
+    # Fetch followee reposts if requested
+    if feed_filter in ["repost", "all"]:
+        # query items reposted by followees, sorted by oldest followee repost of item;
+        # paginated by most recent repost timestamp
+        repost_subquery = (
+            session.query(Repost)
+            .filter(
+                Repost.is_current == True,
+                Repost.is_delete == False,
+                social_graph.followee_filter(Repost.user_id)
+            )
+        )
+        # exclude items also created by followees to guarantee order determinism, in case of "all" filter
+        if feed_filter == "all":
+            repost_subquery = (
+                repost_subquery
+                .filter(
+                    or_(
+                        and_(
+                            Repost.repost_type == RepostType.track,
+                            Repost.repost_item_id.notin_(created_track_ids)
+                        ),
+                        and_(
+                            Repost.repost_type != RepostType.track,
+                            Repost.repost_item_id.notin_(created_playlist_ids)
+                        )
+                    )
+                )
+            )
+        repost_subquery = repost_subquery.subquery()
+
+        repost_query = (
+            session.query(
+                repost_subquery.c.repost_item_id,
+                repost_subquery.c.repost_type,
+                func.min(repost_subquery.c.created_at).label("min_created_at")
+            )
+            .group_by(repost_subquery.c.repost_item_id, repost_subquery.c.repost_type)
+            .order_by(desc("min_created_at"))
+        )
+        followee_reposts = paginate_query(repost_query, False).all()
+
+        # build dict of track_id / playlist_id -> oldest followee repost timestamp from followee_reposts above
+        track_repost_timestamp_dict = {}
+        playlist_repost_timestamp_dict = {}
+        for (repost_item_id, repost_type, oldest_followee_repost_timestamp) in followee_reposts:
+            if repost_type == RepostType.track:
+                track_repost_timestamp_dict[repost_item_id] = oldest_followee_repost_timestamp
+            elif repost_type in (RepostType.playlist, RepostType.album):
+                playlist_repost_timestamp_dict[repost_item_id] = oldest_followee_repost_timestamp
+
+        # extract reposted_track_ids and reposted_playlist_ids
+        reposted_track_ids = list(track_repost_timestamp_dict.keys())
+        reposted_playlist_ids = list(playlist_repost_timestamp_dict.keys())
+
+        # Query tracks reposted by followees
+        reposted_tracks = session.query(Track).filter(
+            Track.is_current == True,
+            Track.is_delete == False,
+            Track.is_unlisted == False,
+            Track.stem_of == None,
+            Track.track_id.in_(reposted_track_ids)
+        )
+        # exclude tracks already fetched from above, in case of "all" filter
+        if feed_filter == "all":
+            reposted_tracks = reposted_tracks.filter(
+                Track.track_id.notin_(created_track_ids)
+            )
+        reposted_tracks = reposted_tracks.order_by(
+            desc(Track.created_at)
+        ).all()
+
+        if not tracks_only:
+            # Query playlists reposted by followees, excluding playlists already fetched from above
+            reposted_playlists = session.query(Playlist).filter(
+                Playlist.is_current == True,
+                Playlist.is_delete == False,
+                Playlist.is_private == False,
+                Playlist.playlist_id.in_(reposted_playlist_ids)
+            )
+            # exclude playlists already fetched from above, in case of "all" filter
+            if feed_filter == "all":
+                reposted_playlists = reposted_playlists.filter(
+                    Playlist.playlist_id.notin_(created_playlist_ids)
+                )
+            reposted_playlists = reposted_playlists.order_by(
+                desc(Playlist.created_at)
+            ).all()
+        else:
+            reposted_playlists = []
+
+    if feed_filter == "original":
+        tracks_to_process = created_tracks
+        playlists_to_process = created_playlists
+    elif feed_filter == "repost":
+        tracks_to_process = reposted_tracks
+        playlists_to_process = reposted_playlists
+    else:
+        tracks_to_process = created_tracks + reposted_tracks
+        playlists_to_process = created_playlists + reposted_playlists
+
+    tracks = helpers.query_result_to_list(tracks_to_process)
+    playlists = helpers.query_result_to_list(playlists_to_process)
+
+    # define top level feed activity_timestamp to enable sorting
+    # activity_timestamp: created_at if item created by followee, else reposted_at
+    for track in tracks:
+        if social_graph.is_followee(track["owner_id"]):
+            track[response_name_constants.activity_timestamp] = track["created_at"]
+        else:
+            track[response_name_constants.activity_timestamp] = track_repost_timestamp_dict[track["track_id"]]
+    for playlist in playlists:
+        if social_graph.is_followee(playlist["playlist_owner_id"]):
+            playlist[response_name_constants.activity_timestamp] = playlist["created_at"]
+        else:
+            playlist[response_name_constants.activity_timestamp] = \
+                playlist_repost_timestamp_dict[playlist["playlist_id"]]
+
+    return (tracks, playlists, None)
+
+
+def get_feed_items_from_store(session, current_user_id, feed_filter, tracks_only):
+    """ Read a page of the feed of current_user_id from the feed_entries table maintained by the indexer
+
+        Returns:
+            tuple of the track and playlist dicts of the feed, with their activity_timestamp, and the
+            cursor of the next page
+    """
+    (limit, offset) = get_pagination_vars()
+    sort_keys = [(FeedEntry.activity_timestamp, True), (FeedEntry.item_type, True), (FeedEntry.item_id, True)]
+    cursor = request.args.get("cursor", type=str)
+    before = decode_cursor(cursor, sort_keys) if cursor else None
+
+    # pages start after the cursor when given, otherwise at offset
+    # fetch one extra entry to know whether a next page exists
+    feed_entries = get_feed_entries(
+        session, current_user_id, feed_filter, tracks_only, limit + 1, before, 0 if cursor else offset
+    )
+    next_cursor = None
+    if len(feed_entries) > limit:
+        feed_entries = feed_entries[:limit]
+        (item_type, item_id, activity_timestamp) = feed_entries[-1]
+        next_cursor = encode_cursor([activity_timestamp, item_type, item_id])
+
+    activity_timestamps = {"track": {}, "playlist": {}}
+    for (item_type, item_id, activity_timestamp) in feed_entries:
+        activity_timestamps[item_type].setdefault(item_id, activity_timestamp)
+
+    tracks = []
+    if activity_timestamps["track"]:
+        tracks = helpers.query_result_to_list(
+            session.query(Track)
+            .filter(
+                Track.is_current == True,
+                Track.track_id.in_(list(activity_timestamps["track"].keys()))
+            )
+            .all()
+        )
+    for track in tracks:
+        track[response_name_constants.activity_timestamp] = activity_timestamps["track"][track["track_id"]]
+
+    playlists = []
+    if activity_timestamps["playlist"]:
+        playlists = helpers.query_result_to_list(
+            session.query(Playlist)
+            .filter(
+                Playlist.is_current == True,
+                Playlist.playlist_id.in_(list(activity_timestamps["playlist"].keys()))
+            )
+            .all()
+        )
+    for playlist in playlists:
+        playlist[response_name_constants.activity_timestamp] = \
+            activity_timestamps["playlist"][playlist["playlist_id"]]
+
+    return (tracks, playlists, next_cursor)
+
+
 # Discovery Provider Social Feed Overview
 # For a given user, current_user, we provide a feed of relevant content from around the audius network.
 # This is generated in the following manner:
@@ -368,208 +634,13 @@ def get_feed():
     # Current user - user for whom feed is being generated
     current_user_id = get_current_user_id()
     with db.scoped_session() as session:
-        # Generate list of users followed by current user, i.e. 'followees'
-        followee_user_ids = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.follower_user_id == current_user_id,
-                Follow.is_current == True,
-                Follow.is_delete == False
-            )
-            .all()
-        )
-        followee_user_ids = [f[0] for f in followee_user_ids]
-
-        # Fetch followee creations if requested
-        if feed_filter in ["original", "all"]:
-            if not tracks_only:
-                # Query playlists posted by followees, sorted and paginated by created_at desc
-                created_playlists_query = (
-                    session.query(Playlist)
-                    .filter(
-                        Playlist.is_current == True,
-                        Playlist.is_delete == False,
-                        Playlist.is_private == False,
-                        Playlist.playlist_owner_id.in_(followee_user_ids)
-                    )
-                    .order_by(desc(Playlist.created_at))
-                )
-                created_playlists = paginate_query(created_playlists_query, False).all()
-
-                # get track ids for all tracks in playlists
-                playlist_track_ids = set()
-                for playlist in created_playlists:
-                    for track in playlist.playlist_contents["track_ids"]:
-                        playlist_track_ids.add(track["track"])
-
-                # get all track objects for track ids
-                playlist_tracks = (
-                    session.query(Track)
-                    .filter(
-                        Track.is_current == True,
-                        Track.track_id.in_(playlist_track_ids)
-                    )
-                    .all()
-                )
-                playlist_tracks_dict = {track.track_id: track for track in playlist_tracks}
-
-                # get all track ids that have same owner as playlist and created in "same action"
-                # "same action": track created within [x time] before playlist creation
-                tracks_to_dedupe = set()
-                for playlist in created_playlists:
-                    for track_entry in playlist.playlist_contents["track_ids"]:
-                        track = playlist_tracks_dict.get(track_entry["track"])
-                        if not track:
-                            return api_helpers.error_response("Something caused the server to crash.")
-                        max_timedelta = datetime.timedelta(minutes=trackDedupeMaxMinutes)
-                        if (track.owner_id == playlist.playlist_owner_id) and \
-                            (track.created_at <= playlist.created_at) and \
-                            (playlist.created_at - track.created_at <= max_timedelta):
-                            tracks_to_dedupe.add(track.track_id)
-                tracks_to_dedupe = list(tracks_to_dedupe)
-            else:
-                # No playlists to consider
-                tracks_to_dedupe = []
-                created_playlists = []
-
-
-            # Query tracks posted by followees, sorted & paginated by created_at desc
-            # exclude tracks that were posted in "same action" as playlist
-            created_tracks_query = (
-                session.query(Track)
-                .filter(
-                    Track.is_current == True,
-                    Track.is_delete == False,
-                    Track.is_unlisted == False,
-                    Track.stem_of == None,
-                    Track.owner_id.in_(followee_user_ids),
-                    Track.track_id.notin_(tracks_to_dedupe)
-                )
-                .order_by(desc(Track.created_at))
-            )
-            created_tracks = paginate_query(created_tracks_query, False).all()
-
-            # extract created_track_ids and created_playlist_ids
-            created_track_ids = [track.track_id for track in created_tracks]
-            created_playlist_ids = [playlist.playlist_id for playlist in created_playlists]
-
-        # Fetch followee reposts if requested
-        if feed_filter in ["repost", "all"]:
-            # query items reposted by followees, sorted by oldest followee repost of item;
-            # paginated by most recent repost timestamp
-            repost_subquery = (
-                session.query(Repost)
-                .filter(
-                    Repost.is_current == True,
-                    Repost.is_delete == False,
-                    Repost.user_id.in_(followee_user_ids)
-                )
-            )
-            # exclude items also created by followees to guarantee order determinism, in case of "all" filter
-            if feed_filter == "all":
-                repost_subquery = (
-                    repost_subquery
-                    .filter(
-                        or_(
-                            and_(
-                                Repost.repost_type == RepostType.track,
-                                Repost.repost_item_id.notin_(created_track_ids)
-                            ),
-                            and_(
-                                Repost.repost_type != RepostType.track,
-                                Repost.repost_item_id.notin_(created_playlist_ids)
-                            )
-                        )
-                    )
-                )
-            repost_subquery = repost_subquery.subquery()
-
-            repost_query = (
-                session.query(
-                    repost_subquery.c.repost_item_id,
-                    repost_subquery.c.repost_type,
-                    func.min(repost_subquery.c.created_at).label("min_created_at")
-                )
-                .group_by(repost_subquery.c.repost_item_id, repost_subquery.c.repost_type)
-                .order_by(desc("min_created_at"))
-            )
-            followee_reposts = paginate_query(repost_query, False).all()
-
-            # build dict of track_id / playlist_id -> oldest followee repost timestamp from followee_reposts above
-            track_repost_timestamp_dict = {}
-            playlist_repost_timestamp_dict = {}
-            for (repost_item_id, repost_type, oldest_followee_repost_timestamp) in followee_reposts:
-                if repost_type == RepostType.track:
-                    track_repost_timestamp_dict[repost_item_id] = oldest_followee_repost_timestamp
-                elif repost_type in (RepostType.playlist, RepostType.album):
-                    playlist_repost_timestamp_dict[repost_item_id] = oldest_followee_repost_timestamp
-
-            # extract reposted_track_ids and reposted_playlist_ids
-            reposted_track_ids = list(track_repost_timestamp_dict.keys())
-            reposted_playlist_ids = list(playlist_repost_timestamp_dict.keys())
-
-            # Query tracks reposted by followees
-            reposted_tracks = session.query(Track).filter(
-                Track.is_current == True,
-                Track.is_delete == False,
-                Track.is_unlisted == False,
-                Track.stem_of == None,
-                Track.track_id.in_(reposted_track_ids)
-            )
-            # exclude tracks already fetched from above, in case of "all" filter
-            if feed_filter == "all":
-                reposted_tracks = reposted_tracks.filter(
-                    Track.track_id.notin_(created_track_ids)
-                )
-            reposted_tracks = reposted_tracks.order_by(
-                desc(Track.created_at)
-            ).all()
-
-            if not tracks_only:
-                # Query playlists reposted by followees, excluding playlists already fetched from above
-                reposted_playlists = session.query(Playlist).filter(
-                    Playlist.is_current == True,
-                    Playlist.is_delete == False,
-                    Playlist.is_private == False,
-                    Playlist.playlist_id.in_(reposted_playlist_ids)
-                )
-                # exclude playlists already fetched from above, in case of "all" filter
-                if feed_filter == "all":
-                    reposted_playlists = reposted_playlists.filter(
-                        Playlist.playlist_id.notin_(created_playlist_ids)
-                    )
-                reposted_playlists = reposted_playlists.order_by(
-                    desc(Playlist.created_at)
-                ).all()
-            else:
-                reposted_playlists = []
-
-        if feed_filter == "original":
-            tracks_to_process = created_tracks
-            playlists_to_process = created_playlists
-        elif feed_filter == "repost":
-            tracks_to_process = reposted_tracks
-            playlists_to_process = reposted_playlists
+        # Read precomputed feed entries when the indexer maintains them
+        if FEED_ENTRIES_MAX_PER_USER > 0:
+            (tracks, playlists, next_cursor) = \
+                get_feed_items_from_store(session, current_user_id, feed_filter, tracks_only)
         else:
-            tracks_to_process = created_tracks + reposted_tracks
-            playlists_to_process = created_playlists + reposted_playlists
-
-        tracks = helpers.query_result_to_list(tracks_to_process)
-        playlists = helpers.query_result_to_list(playlists_to_process)
-
-        # define top level feed activity_timestamp to enable sorting
-        # activity_timestamp: created_at if item created by followee, else reposted_at
-        for track in tracks:
-            if track["owner_id"] in followee_user_ids:
-                track[response_name_constants.activity_timestamp] = track["created_at"]
-            else:
-                track[response_name_constants.activity_timestamp] = track_repost_timestamp_dict[track["track_id"]]
-        for playlist in playlists:
-            if playlist["playlist_owner_id"] in followee_user_ids:
-                playlist[response_name_constants.activity_timestamp] = playlist["created_at"]
-            else:
-                playlist[response_name_constants.activity_timestamp] = \
-                    playlist_repost_timestamp_dict[playlist["playlist_id"]]
+            (tracks, playlists, next_cursor) = \
+                get_feed_items_from_follows(session, current_user_id, feed_filter, tracks_only)
 
         # bundle peripheral info into track and playlist objects
         track_ids = list(map(lambda track: track["track_id"], tracks))
@@ -611,7 +682,7 @@ def get_feed():
                     if user:
                         result['user'] = user
 
-    return api_helpers.success_response(feed_results)
+    return api_helpers.success_response(feed_results, next_cursor=next_cursor)
 
 
 # user repost feed steps
@@ -634,10 +705,12 @@ def get_repost_feed_for_user(user_id):
                 Repost.is_delete == False,
                 Repost.user_id == user_id
             )
-            .order_by(desc(Repost.created_at), desc(Repost.repost_item_id), desc(Repost.repost_type))
         )
 
-        reposts = paginate_query(repost_query).all()
+        (reposts, next_cursor) = paginate_query_with_cursor(
+            repost_query,
+            [(Repost.created_at, True), (Repost.repost_item_id, True), (Repost.repost_type, True)]
+        )
 
         # get track reposts from above
         track_reposts = [r for r in reposts if r.repost_type == RepostType.track]
@@ -784,25 +857,14 @@ def get_repost_feed_for_user(user_id):
                 for save in user_saved_query if save[1] == SaveType.playlist or save[1] == SaveType.album
             }
 
-            # query current user's followees
-            followee_user_ids = (
-                session.query(Follow.followee_user_id)
-                .filter(
-                    Follow.follower_user_id == current_user_id,
-                    Follow.is_current == True,
-                    Follow.is_delete == False
-                )
-                .all()
-            )
-            followee_user_ids = [f[0] for f in followee_user_ids]
-
             # query all followees' reposts
+            social_graph = get_social_graph(session, current_user_id)
             followee_repost_query = (
                 session.query(Repost)
                 .filter(
                     Repost.is_current == True,
                     Repost.is_delete == False,
-                    Repost.user_id.in_(followee_user_ids),
+                    social_graph.followee_filter(Repost.user_id),
                     or_(Repost.repost_item_id.in_(repost_track_ids),
                         Repost.repost_item_id.in_(repost_playlist_ids))
                 )
@@ -870,7 +932,7 @@ def get_repost_feed_for_user(user_id):
                     if user:
                         result['user'] = user
 
-    return api_helpers.success_response(feed_results)
+    return api_helpers.success_response(feed_results, next_cursor=next_cursor)
 
 
 # intersection of user1's followers and user2's followees
@@ -1019,44 +1081,27 @@ def get_followers_for_user(followee_user_id):
     users = []
     db = get_db_read_replica()
     with db.scoped_session() as session:
-        # correlated subquery sqlalchemy code:
-        # https://groups.google.com/forum/#!topic/sqlalchemy/WLIy8jxD7qg
-        inner_follow = aliased(Follow)
-        outer_follow = aliased(Follow)
-
-        # subquery to get a user's follower count
-        inner_select = (
+        # get all users that follow input user along with their follower count, users whose aggregates
+        # have not been computed yet count as having no followers
+        follower_count = func.coalesce(UserAggregate.follower_count, 0).label("follower_count")
+        follower_query = (
             session.query(
-                func.count(inner_follow.followee_user_id)
+                Follow.follower_user_id,
+                follower_count
             )
+            .outerjoin(UserAggregate, UserAggregate.user_id == Follow.follower_user_id)
             .filter(
-                inner_follow.is_current == True,
-                inner_follow.is_delete == False,
-                inner_follow.followee_user_id == outer_follow.follower_user_id
+                Follow.followee_user_id == followee_user_id,
+                Follow.is_current == True,
+                Follow.is_delete == False
             )
-            .correlate(outer_follow)
         )
-
-        # get all users that follow input user, sorted by their follower count desc
-        outer_select = (
-            session.query(
-                outer_follow.follower_user_id,
-                inner_select.as_scalar().label(response_name_constants.follower_count)
-            )
-            .filter(
-                outer_follow.followee_user_id == followee_user_id,
-                outer_follow.is_current == True,
-                outer_follow.is_delete == False
-            )
-            .group_by(outer_follow.follower_user_id)
-            .order_by(
-                desc(response_name_constants.follower_count),
-                # secondary sort to guarantee determinism as explained here:
-                # https://stackoverflow.com/questions/13580826/postgresql-repeating-rows-from-limit-offset
-                asc(outer_follow.follower_user_id)
-            )
+        # sorted by follower count desc, with a secondary sort to guarantee determinism as explained here:
+        # https://stackoverflow.com/questions/13580826/postgresql-repeating-rows-from-limit-offset
+        (follower_user_ids_by_follower_count, next_cursor) = paginate_query_with_cursor(
+            follower_query,
+            [(follower_count, True), (Follow.follower_user_id, False)]
         )
-        follower_user_ids_by_follower_count = paginate_query(outer_select).all()
 
         user_ids = [user_id for (user_id, follower_count) in follower_user_ids_by_follower_count]
 
@@ -1082,7 +1127,7 @@ def get_followers_for_user(followee_user_id):
             key=lambda user: (user[response_name_constants.follower_count], (user['user_id'])*(-1)),
             reverse=True
         )
-    return api_helpers.success_response(users)
+    return api_helpers.success_response(users, next_cursor=next_cursor)
 
 
 # Get paginated users that are followed by provided follower_user_id, sorted by their follower count descending.
@@ -1091,39 +1136,26 @@ def get_followees_for_user(follower_user_id):
     users = []
     db = get_db_read_replica()
     with db.scoped_session() as session:
-        # correlated subquery sqlalchemy code:
-        # https://groups.google.com/forum/#!topic/sqlalchemy/WLIy8jxD7qg
-        inner_follow = aliased(Follow)
-        outer_follow = aliased(Follow)
-
-        # subquery to get a user's follower count
-        inner_select = (
+        # get all users followed by input user along with their follower count, users whose aggregates
+        # have not been computed yet count as having no followers
+        follower_count = func.coalesce(UserAggregate.follower_count, 0).label("follower_count")
+        followee_query = (
             session.query(
-                func.count(inner_follow.followee_user_id)
+                Follow.followee_user_id,
+                follower_count
             )
+            .outerjoin(UserAggregate, UserAggregate.user_id == Follow.followee_user_id)
             .filter(
-                inner_follow.followee_user_id == outer_follow.followee_user_id,
-                inner_follow.is_current == True,
-                inner_follow.is_delete == False
+                Follow.follower_user_id == follower_user_id,
+                Follow.is_current == True,
+                Follow.is_delete == False
             )
-            .correlate(outer_follow)
         )
-
-        # get all users followed by input user, sorted by their follower count desc
-        outer_select = (
-            session.query(
-                outer_follow.followee_user_id,
-                inner_select.as_scalar().label(response_name_constants.follower_count)
-            )
-            .filter(
-                outer_follow.follower_user_id == follower_user_id,
-                outer_follow.is_current == True,
-                outer_follow.is_delete == False
-            )
-            .group_by(outer_follow.followee_user_id)
-            .order_by(desc(response_name_constants.follower_count))
+        # sorted by follower count desc, user id breaks ties
+        (followee_user_ids_by_follower_count, next_cursor) = paginate_query_with_cursor(
+            followee_query,
+            [(follower_count, True), (Follow.followee_user_id, False)]
         )
-        followee_user_ids_by_follower_count = paginate_query(outer_select).all()
 
         user_ids = [user_id for (user_id, follower_count) in followee_user_ids_by_follower_count]
 
@@ -1143,13 +1175,13 @@ def get_followees_for_user(follower_user_id):
         # bundle peripheral info into user results
         users = populate_user_metadata(session, user_ids, users, current_user_id)
 
-        # order by follower_count desc
+        # order by (follower_count desc, user_id asc) to match query sorting
         users.sort(
-            key=lambda user: user[response_name_constants.follower_count],
+            key=lambda user: (user[response_name_constants.follower_count], (user['user_id'])*(-1)),
             reverse=True
         )
 
-    return api_helpers.success_response(users)
+    return api_helpers.success_response(users, next_cursor=next_cursor)
 
 
 # Get paginated users that reposted provided repost_track_id, sorted by their follower count descending.
@@ -1464,10 +1496,14 @@ def get_saves(save_type):
                 )
             )
 
-        query_results = paginate_query(query).all()
+        # most recent saves first
+        (query_results, next_cursor) = paginate_query_with_cursor(
+            query,
+            [(Save.created_at, True), (Save.save_item_id, True)]
+        )
         save_results = helpers.query_result_to_list(query_results)
 
-    return api_helpers.success_response(save_results)
+    return api_helpers.success_response(save_results, next_cursor=next_cursor)
 
 # Get the user saved collections & uploaded collections along with the collection user owners
 # NOTE: This is a one off endpoint for retrieving a user's collections/associated user and should
@@ -1761,25 +1797,13 @@ def get_top_followee_windowed(type, window):
         # Construct a subquery to get the summed save + repost count for the `type`
         count_subquery = create_save_repost_count_subquery(session, type)
 
-        followee_user_ids = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.follower_user_id == current_user_id,
-                Follow.is_current == True,
-                Follow.is_delete == False
-            )
-        )
-        followee_user_ids_subquery = followee_user_ids.subquery()
+        social_graph = get_social_graph(session, current_user_id)
 
-        # Queries for tracks joined against followed users and counts
+        # Queries for tracks of followed users joined against counts
         tracks_query = (
             session.query(
                 Track,
             )
-            .join(
-                followee_user_ids_subquery,
-                Track.owner_id == followee_user_ids_subquery.c.followee_user_id
-            )
             .join(
                 count_subquery,
                 Track.track_id == count_subquery.c['id']
@@ -1789,6 +1813,7 @@ def get_top_followee_windowed(type, window):
                 Track.is_delete == False,
                 Track.is_unlisted == False,
                 Track.stem_of == None,
+                social_graph.followee_filter(Track.owner_id),
                 # Query only tracks created `window` time ago (week, month, etc.)
                 Track.created_at >= text("NOW() - interval '1 {}'".format(window)),
             )
@@ -1841,16 +1866,7 @@ def get_top_followee_saves(type):
     current_user_id = get_current_user_id()
     db = get_db_read_replica()
     with db.scoped_session() as session:
-        # Construct a subquery of all followees
-        followee_user_ids = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.follower_user_id == current_user_id,
-                Follow.is_current == True,
-                Follow.is_delete == False
-            )
-        )
-        followee_user_ids_subquery = followee_user_ids.subquery()
+        social_graph = get_social_graph(session, current_user_id)
 
         # Construct a subquery of all saves from followees aggregated by id
         save_count = (
@@ -1858,14 +1874,11 @@ def get_top_followee_saves(type):
                 Save.save_item_id,
                 func.count(Save.save_item_id).label(response_name_constants.save_count)
             )
-            .join(
-                followee_user_ids_subquery,
-                Save.user_id == followee_user_ids_subquery.c.followee_user_id
-            )
             .filter(
                 Save.is_current == True,
                 Save.is_delete == False,
                 Save.save_type == type,
+                social_graph.followee_filter(Save.user_id),
             )
             .group_by(
                 Save.save_item_id
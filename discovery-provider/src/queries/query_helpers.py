@@ -1,13 +1,15 @@
 import logging # pylint: disable=C0302
+import base64
 import json
 import requests
-from sqlalchemy import func, desc, text, Integer, and_
+from sqlalchemy import func, desc, text, Integer, DateTime, and_, or_, tuple_
 from urllib.parse import urljoin
 
 from flask import request
 
 from src import exceptions
 from src.queries import response_name_constants
+from src.queries.social_graph import get_social_graph
 from src.models import User, Track, Repost, RepostType, Follow, Playlist, Save, SaveType, Remix
 from src.utils import helpers
 from src.utils.config import shared_config
@@ -49,6 +51,9 @@ electronic_sub_genres = [
   'Jersey Club',
 ]
 
+# Genres get_genre_list expands with their sub-genres
+parent_genres = ['Electronic']
+
 ######## HELPERS ########
 
 
@@ -66,316 +71,118 @@ def get_current_user_id(required=True):
     return uid
 
 
-def parse_sort_param(base_query, model, whitelist_sort_params):
+def parse_sort_keys(model, whitelist_sort_params):
+    """ Returns the list of (column, descending) pairs requested by the sort param """
     sort = request.args.get("sort")
     if not sort:
-        return base_query
+        return []
 
     params = sort.split(',')
     try:
         params = {param[0]: param[1] for param in [p.split(':') for p in params]}
     except IndexError:
         raise exceptions.ArgumentError("Need to specify :asc or :desc on all parameters")
-    order_bys = []
+    sort_keys = []
     for field in params.keys():
         if field not in whitelist_sort_params:
             raise exceptions.ArgumentError('Parameter %s is invalid in sort' % field)
-        attr = getattr(model, field)
-        if params[field] == 'desc':
-            attr = attr.desc()
-        else:
-            attr = attr.asc()
-        order_bys.append(attr)
-
-    return base_query.order_by(*order_bys)
+        sort_keys.append((getattr(model, field), params[field] == 'desc'))
+    return sort_keys
 
 
 # given list of user ids and corresponding users, populates each user object with:
 #   track_count, playlist_count, album_count, follower_count, followee_count, repost_count
 #   if current_user_id available, populates does_current_user_follow, followee_follows
 def populate_user_metadata(session, user_ids, users, current_user_id, with_track_save_count = False):
-    # build dict of user id --> track count
-    track_counts = (
-        session.query(
-            Track.owner_id,
-            func.count(Track.owner_id)
-        )
-        .filter(
-            Track.is_current == True,
-            Track.is_delete == False,
-            Track.is_unlisted == False,
-            Track.stem_of == None,
-            Track.owner_id.in_(user_ids)
-        )
-        .group_by(Track.owner_id)
-        .all()
-    )
-    track_count_dict = {user_id: track_count for (user_id, track_count) in track_counts}
-
-    # build dict of user id --> playlist count
-    playlist_counts = (
-        session.query(
-            Playlist.playlist_owner_id,
-            func.count(Playlist.playlist_owner_id)
-        )
-        .filter(
-            Playlist.is_current == True,
-            Playlist.is_album == False,
-            Playlist.is_private == False,
-            Playlist.is_delete == False,
-            Playlist.playlist_owner_id.in_(user_ids)
-        )
-        .group_by(Playlist.playlist_owner_id)
-        .all()
-    )
-    playlist_count_dict = {user_id: playlist_count for (user_id, playlist_count) in playlist_counts}
-
-    # build dict of user id --> album count
-    album_counts = (
-        session.query(
-            Playlist.playlist_owner_id,
-            func.count(Playlist.playlist_owner_id)
-        )
-        .filter(
-            Playlist.is_current == True,
-            Playlist.is_album == True,
-            Playlist.is_private == False,
-            Playlist.is_delete == False,
-            Playlist.playlist_owner_id.in_(user_ids)
-        )
-        .group_by(Playlist.playlist_owner_id)
-        .all()
-    )
-    album_count_dict = {user_id: album_count for (user_id, album_count) in album_counts}
-
-    # build dict of user id --> follower count
-    follower_counts = (
-        session.query(
-            Follow.followee_user_id,
-            func.count(Follow.followee_user_id)
-        )
-        .filter(
-            Follow.is_current == True,
-            Follow.is_delete == False,
-            Follow.followee_user_id.in_(user_ids)
-        )
-        .group_by(Follow.followee_user_id)
-        .all()
-    )
-    follower_count_dict = {user_id: follower_count for (user_id, follower_count) in follower_counts}
-
-    # build dict of user id --> followee count
-    followee_counts = (
-        session.query(
-            Follow.follower_user_id,
-            func.count(Follow.follower_user_id)
-        )
-        .filter(
-            Follow.is_current == True,
-            Follow.is_delete == False,
-            Follow.follower_user_id.in_(user_ids)
-        )
-        .group_by(Follow.follower_user_id)
-        .all()
-    )
-    followee_count_dict = {user_id: followee_count for (user_id, followee_count) in followee_counts}
-
-    # build dict of user id --> repost count
-    repost_counts = (
-        session.query(
-            Repost.user_id,
-            func.count(Repost.user_id)
-        )
-        .filter(
-            Repost.is_current == True,
-            Repost.is_delete == False,
-            Repost.user_id.in_(user_ids)
-        )
-        .group_by(Repost.user_id)
-        .all()
-    )
-    repost_count_dict = {user_id: repost_count for (user_id, repost_count) in repost_counts}
-    track_save_count_dict = {}
-    if with_track_save_count :
-        # build dict of user id --> track save count
-        track_save_counts = (
-            session.query(
-                Save.user_id,
-                func.count(Save.user_id)
-            )
-            .filter(
-                Save.is_current == True,
-                Save.is_delete == False,
-                Save.save_type == SaveType.track,
-                Save.user_id.in_(user_ids)
-            )
-            .group_by(Save.user_id)
-            .all()
-        )
-        track_save_count_dict = {user_id: user_track_save_count for (user_id, user_track_save_count) in track_save_counts}
-
-    # build dict of user id --> track blocknumber
-    track_blocknumbers = (
-        session.query(
-            Track.owner_id,
-            func.max(Track.blocknumber)
-        )
-        .filter(
-            Track.is_current == True,
-            Track.is_delete == False,
-            Track.owner_id.in_(user_ids)
-        )
-        .group_by(Track.owner_id)
-        .all()
-    )
-    track_blocknumber_dict = {user_id: track_blocknumber for (user_id, track_blocknumber) in track_blocknumbers}
-
-    current_user_followed_user_ids = {}
-    current_user_followee_follow_count_dict = {}
-    if current_user_id:
-        # does current user follow any of requested user ids
-        current_user_followed_user_ids = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.is_current == True,
-                Follow.is_delete == False,
-                Follow.followee_user_id.in_(user_ids),
-                Follow.follower_user_id == current_user_id
-            )
-            .all()
-        )
-        current_user_followed_user_ids = {r[0]: True for r in current_user_followed_user_ids}
-
-        # build dict of user id --> followee follow count
-        current_user_followees = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.is_current == True,
-                Follow.is_delete == False,
-                Follow.follower_user_id == current_user_id
-            )
-        )
-        current_user_followees = {r[0]: True for r in current_user_followees}
-
-        current_user_followee_follow_counts = (
-            session.query(
-                Follow.followee_user_id,
-                func.count(Follow.followee_user_id)
-            )
-            .filter(
-                Follow.is_current == True,
-                Follow.is_delete == False,
-                Follow.follower_user_id.in_(current_user_followees),
-                Follow.followee_user_id.in_(user_ids)
-            )
-            .group_by(Follow.followee_user_id)
-            .all()
-        )
-        current_user_followee_follow_count_dict = {user_id: followee_follow_count for (user_id, followee_follow_count) in current_user_followee_follow_counts}
+    # build dict of user id --> counts and current user specific values, in a single statement
+    user_metadata_dict = get_user_metadata_dict(session, user_ids, current_user_id)
 
     for user in users:
         user_id = user["user_id"]
-        user[response_name_constants.track_count] = track_count_dict.get(user_id, 0)
-        user[response_name_constants.playlist_count] = playlist_count_dict.get(user_id, 0)
-        user[response_name_constants.album_count] = album_count_dict.get(user_id, 0)
-        user[response_name_constants.follower_count] = follower_count_dict.get(user_id, 0)
-        user[response_name_constants.followee_count] = followee_count_dict.get(user_id, 0)
-        user[response_name_constants.repost_count] = repost_count_dict.get(user_id, 0)
-        user[response_name_constants.track_blocknumber] = track_blocknumber_dict.get(user_id, -1)
+        user_metadata = user_metadata_dict.get(user_id)
+        user[response_name_constants.track_count] = user_metadata["track_count"] if user_metadata else 0
+        user[response_name_constants.playlist_count] = user_metadata["playlist_count"] if user_metadata else 0
+        user[response_name_constants.album_count] = user_metadata["album_count"] if user_metadata else 0
+        user[response_name_constants.follower_count] = user_metadata["follower_count"] if user_metadata else 0
+        user[response_name_constants.followee_count] = user_metadata["followee_count"] if user_metadata else 0
+        user[response_name_constants.repost_count] = user_metadata["repost_count"] if user_metadata else 0
+        user[response_name_constants.track_blocknumber] = user_metadata["track_blocknumber"] if user_metadata else -1
         if with_track_save_count:
-            user[response_name_constants.track_save_count] = track_save_count_dict.get(user_id, 0)
+            user[response_name_constants.track_save_count] = \
+                user_metadata["track_save_count"] if user_metadata else 0
         # current user specific
-        user[response_name_constants.does_current_user_follow] = current_user_followed_user_ids.get(user_id, False)
-        user[response_name_constants.current_user_followee_follow_count] = current_user_followee_follow_count_dict.get(user_id, 0)
+        user[response_name_constants.does_current_user_follow] = \
+            user_metadata["does_current_user_follow"] if user_metadata else False
+        user[response_name_constants.current_user_followee_follow_count] = \
+            user_metadata["current_user_followee_follow_count"] if user_metadata else 0
 
     return users
 
 
+def get_user_metadata_dict(session, user_ids, current_user_id):
+    """ Returns dict of user id --> row of the counts maintained in user_aggregates, whether the
+        current user follows the user and how many of the current user's followees follow the user.
+    """
+    followee_user_ids = []
+    if current_user_id:
+        followee_user_ids = get_social_graph(session, current_user_id).followee_user_ids
+        current_user_columns = """
+          ids.user_id = ANY(CAST(:followee_user_ids AS integer[])) as does_current_user_follow,
+          COALESCE(followee_follows.follow_count, 0) as current_user_followee_follow_count
+        """
+        current_user_joins = """
+          LEFT JOIN LATERAL (
+            SELECT count(*) as follow_count FROM follows f
+            WHERE
+              f.followee_user_id = ids.user_id and
+              f.follower_user_id = ANY(CAST(:followee_user_ids AS integer[])) and
+              f.is_current = true and
+              f.is_delete = false
+          ) followee_follows ON true
+        """
+    else:
+        current_user_columns = """
+          false as does_current_user_follow,
+          0 as current_user_followee_follow_count
+        """
+        current_user_joins = ""
+
+    user_metadata = session.execute(
+        text(f"""
+          SELECT
+            ids.user_id,
+            COALESCE(ua.track_count, 0) as track_count,
+            COALESCE(ua.playlist_count, 0) as playlist_count,
+            COALESCE(ua.album_count, 0) as album_count,
+            COALESCE(ua.follower_count, 0) as follower_count,
+            COALESCE(ua.followee_count, 0) as followee_count,
+            COALESCE(ua.repost_count, 0) as repost_count,
+            COALESCE(ua.track_save_count, 0) as track_save_count,
+            COALESCE(ua.track_blocknumber, -1) as track_blocknumber,
+            {current_user_columns}
+          FROM unnest(CAST(:user_ids AS integer[])) AS ids(user_id)
+          LEFT JOIN user_aggregates ua ON ua.user_id = ids.user_id
+          {current_user_joins}
+        """),
+        {"user_ids": list(user_ids), "followee_user_ids": followee_user_ids}
+    )
+    return {row["user_id"]: row for row in user_metadata}
+
+
 # given list of track ids and corresponding tracks, populates each track object with:
 #   repost_count, save_count
 #   if remix: remix users, has_remix_author_reposted, has_remix_author_saved
 #   if current_user_id available, populates followee_reposts, has_current_user_reposted, has_current_user_saved
 def populate_track_metadata(session, track_ids, tracks, current_user_id):
-    # build dict of track id --> repost count
-    repost_counts = (
-        session.query(
-            Repost.repost_item_id,
-            func.count(Repost.repost_item_id)
-        )
-        .filter(
-            Repost.is_current == True,
-            Repost.is_delete == False,
-            Repost.repost_item_id.in_(track_ids),
-            Repost.repost_type == RepostType.track
-        )
-        .group_by(Repost.repost_item_id)
-        .all()
-    )
-    repost_count_dict = {track_id: repost_count for (track_id, repost_count) in repost_counts}
-
-    # build dict of track id --> save count
-    save_counts = (
-        session.query(
-            Save.save_item_id,
-            func.count(Save.save_item_id)
-        )
-        .filter(
-            Save.is_current == True,
-            Save.is_delete == False,
-            Save.save_type == SaveType.track,
-            Save.save_item_id.in_(track_ids)
-        )
-        .group_by(Save.save_item_id)
-        .all()
-    )
-    save_count_dict = {track_id: save_count for (track_id, save_count) in save_counts}
+    # build dict of track id --> counts and current user specific flags, in a single statement
+    track_metadata_dict = get_track_metadata_dict(session, track_ids, current_user_id)
 
     remixes = get_track_remix_metadata(session, tracks, current_user_id)
 
-    user_reposted_track_dict = {}
-    user_saved_track_dict = {}
     followee_track_repost_dict = {}
     followee_track_save_dict = {}
     if current_user_id:
-        # has current user reposted any of requested track ids
-        user_reposted = (
-            session.query(
-                Repost.repost_item_id
-            )
-            .filter(
-                Repost.is_current == True,
-                Repost.is_delete == False,
-                Repost.repost_item_id.in_(track_ids),
-                Repost.repost_type == RepostType.track,
-                Repost.user_id == current_user_id
-            )
-            .all()
-        )
-        user_reposted_track_dict = {repost[0]: True for repost in user_reposted}
-
-        # has current user saved any of requested track ids
-        user_saved_tracks_query = (
-            session.query(Save.save_item_id)
-            .filter(
-                Save.is_current == True,
-                Save.is_delete == False,
-                Save.user_id == current_user_id,
-                Save.save_item_id.in_(track_ids),
-                Save.save_type == SaveType.track
-            )
-            .all()
-        )
-        user_saved_track_dict = {save[0]: True for save in user_saved_tracks_query}
-
-        # Get current user's followees.
-        followees = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.follower_user_id == current_user_id,
-                Follow.is_current == True,
-                Follow.is_delete == False
-            )
-        )
+        social_graph = get_social_graph(session, current_user_id)
 
         # build dict of track id --> followee reposts
         followee_track_reposts = (
@@ -385,7 +192,7 @@ def populate_track_metadata(session, track_ids, tracks, current_user_id):
                 Repost.is_delete == False,
                 Repost.repost_item_id.in_(track_ids),
                 Repost.repost_type == RepostType.track,
-                Repost.user_id.in_(followees)
+                social_graph.followee_filter(Repost.user_id)
             )
         )
         followee_track_reposts = helpers.query_result_to_list(followee_track_reposts)
@@ -402,7 +209,7 @@ def populate_track_metadata(session, track_ids, tracks, current_user_id):
                 Save.is_delete == False,
                 Save.save_item_id.in_(track_ids),
                 Save.save_type == SaveType.track,
-                Save.user_id.in_(followees)
+                social_graph.followee_filter(Save.user_id)
             )
         )
         followee_track_saves = helpers.query_result_to_list(followee_track_saves)
@@ -413,13 +220,16 @@ def populate_track_metadata(session, track_ids, tracks, current_user_id):
 
     for track in tracks:
         track_id = track["track_id"]
-        track[response_name_constants.repost_count] = repost_count_dict.get(track_id, 0)
-        track[response_name_constants.save_count] = save_count_dict.get(track_id, 0)
+        track_metadata = track_metadata_dict.get(track_id)
+        track[response_name_constants.repost_count] = track_metadata["repost_count"] if track_metadata else 0
+        track[response_name_constants.save_count] = track_metadata["save_count"] if track_metadata else 0
         # current user specific
         track[response_name_constants.followee_reposts] = followee_track_repost_dict.get(track_id, [])
         track[response_name_constants.followee_saves] = followee_track_save_dict.get(track_id, [])
-        track[response_name_constants.has_current_user_reposted] = user_reposted_track_dict.get(track_id, False)
-        track[response_name_constants.has_current_user_saved] = user_saved_track_dict.get(track['track_id'], False)
+        track[response_name_constants.has_current_user_reposted] = \
+            track_metadata["has_current_user_reposted"] if track_metadata else False
+        track[response_name_constants.has_current_user_saved] = \
+            track_metadata["has_current_user_saved"] if track_metadata else False
 
         # Populate the remix_of tracks w/ the parent track's user and if that user saved/reposted the child
         if response_name_constants.remix_of in track and type(track[response_name_constants.remix_of]) is dict and track["track_id"] in remixes:
@@ -435,6 +245,52 @@ def populate_track_metadata(session, track_ids, tracks, current_user_id):
     return tracks
 
 
+def get_track_metadata_dict(session, track_ids, current_user_id):
+    """ Returns dict of track id --> row of the repost and save counts maintained in track_aggregates
+        and whether the current user reposted or saved the track.
+    """
+    if current_user_id:
+        current_user_columns = """
+          EXISTS (
+            SELECT 1 FROM reposts r
+            WHERE
+              r.repost_item_id = ids.track_id and
+              r.repost_type = 'track' and
+              r.user_id = :current_user_id and
+              r.is_current = true and
+              r.is_delete = false
+          ) as has_current_user_reposted,
+          EXISTS (
+            SELECT 1 FROM saves s
+            WHERE
+              s.save_item_id = ids.track_id and
+              s.save_type = 'track' and
+              s.user_id = :current_user_id and
+              s.is_current = true and
+              s.is_delete = false
+          ) as has_current_user_saved
+        """
+    else:
+        current_user_columns = """
+          false as has_current_user_reposted,
+          false as has_current_user_saved
+        """
+
+    track_metadata = session.execute(
+        text(f"""
+          SELECT
+            ids.track_id,
+            COALESCE(ta.repost_count, 0) as repost_count,
+            COALESCE(ta.save_count, 0) as save_count,
+            {current_user_columns}
+          FROM unnest(CAST(:track_ids AS integer[])) AS ids(track_id)
+          LEFT JOIN track_aggregates ta ON ta.track_id = ids.track_id
+        """),
+        {"track_ids": list(track_ids), "current_user_id": current_user_id}
+    )
+    return {row["track_id"]: row for row in track_metadata}
+
+
 def get_track_remix_metadata(session, tracks, current_user_id):
     """
     Fetches tracks' remix parent owners and if they have saved/reposted the tracks
@@ -557,55 +413,15 @@ def get_track_remix_metadata(session, tracks, current_user_id):
 #   repost_count, save_count
 #   if current_user_id available, populates followee_reposts, has_current_user_reposted, has_current_user_saved
 def populate_playlist_metadata(session, playlist_ids, playlists, repost_types, save_types, current_user_id):
-    # build dict of playlist id --> repost count
-    playlist_repost_counts = dict(get_repost_counts(session, False, False, playlist_ids, repost_types))
-
-    # build dict of playlist id --> save count
-    playlist_save_counts = dict(get_save_counts(session, False, False, playlist_ids, save_types))
+    # build dict of playlist id --> counts and current user specific flags, in a single statement
+    playlist_metadata_dict = get_playlist_metadata_dict(
+        session, playlist_ids, repost_types, save_types, current_user_id
+    )
 
-    user_reposted_playlist_dict = {}
-    user_saved_playlist_dict = {}
     followee_playlist_repost_dict = {}
     followee_playlist_save_dict = {}
     if current_user_id:
-        # has current user reposted any of requested playlist ids
-        current_user_playlist_reposts = (
-            session.query(Repost.repost_item_id)
-            .filter(
-                Repost.is_current == True,
-                Repost.is_delete == False,
-                Repost.repost_item_id.in_(playlist_ids),
-                Repost.repost_type.in_(repost_types),
-                Repost.user_id == current_user_id
-            )
-            .all()
-        )
-        user_reposted_playlist_dict = {r[0]: True for r in current_user_playlist_reposts}
-
-        # has current user saved any of requested playlist ids
-        user_saved_playlists_query = (
-            session.query(Save.save_item_id)
-            .filter(
-                Save.is_current == True,
-                Save.is_delete == False,
-                Save.user_id == current_user_id,
-                Save.save_item_id.in_(playlist_ids),
-                Save.save_type.in_(save_types)
-            )
-            .all()
-        )
-        user_saved_playlist_dict = {save[0]: True for save in user_saved_playlists_query}
-
-        # Get current user's followees.
-        followee_user_ids = (
-            session.query(Follow.followee_user_id)
-            .filter(
-                Follow.follower_user_id == current_user_id,
-                Follow.is_current == True,
-                Follow.is_delete == False
-            )
-            .all()
-        )
+        social_graph = get_social_graph(session, current_user_id)
 
         # Build dict of playlist id --> followee reposts.
         followee_playlist_reposts = (
@@ -615,7 +431,7 @@ def populate_playlist_metadata(session, playlist_ids, playlists, repost_types, s
                 Repost.is_delete == False,
                 Repost.repost_item_id.in_(playlist_ids),
                 Repost.repost_type.in_(repost_types),
-                Repost.user_id.in_(followee_user_ids)
+                social_graph.followee_filter(Repost.user_id)
             )
             .all()
         )
@@ -633,7 +449,7 @@ def populate_playlist_metadata(session, playlist_ids, playlists, repost_types, s
                 Save.is_delete == False,
                 Save.save_item_id.in_(playlist_ids),
                 Save.save_type.in_(save_types),
-                Save.user_id.in_(followee_user_ids)
+                social_graph.followee_filter(Save.user_id)
             )
             .all()
         )
@@ -645,17 +461,81 @@ def populate_playlist_metadata(session, playlist_ids, playlists, repost_types, s
 
     for playlist in playlists:
         playlist_id = playlist["playlist_id"]
-        playlist[response_name_constants.repost_count] = playlist_repost_counts.get(playlist_id, 0)
-        playlist[response_name_constants.save_count] = playlist_save_counts.get(playlist_id, 0)
+        playlist_metadata = playlist_metadata_dict.get(playlist_id)
+        playlist[response_name_constants.repost_count] = \
+            playlist_metadata["repost_count"] if playlist_metadata else 0
+        playlist[response_name_constants.save_count] = playlist_metadata["save_count"] if playlist_metadata else 0
         # current user specific
         playlist[response_name_constants.followee_reposts] = followee_playlist_repost_dict.get(playlist_id, [])
         playlist[response_name_constants.followee_saves] = followee_playlist_save_dict.get(playlist_id, [])
         playlist[response_name_constants.has_current_user_reposted] = \
-            user_reposted_playlist_dict.get(playlist_id, False)
-        playlist[response_name_constants.has_current_user_saved] = user_saved_playlist_dict.get(playlist_id, False)
+            playlist_metadata["has_current_user_reposted"] if playlist_metadata else False
+        playlist[response_name_constants.has_current_user_saved] = \
+            playlist_metadata["has_current_user_saved"] if playlist_metadata else False
 
     return playlists
 
+
+def get_playlist_metadata_dict(session, playlist_ids, repost_types, save_types, current_user_id):
+    """ Returns dict of playlist id --> row of the repost and save counts of the requested types
+        maintained in playlist_aggregates and whether the current user reposted or saved the playlist.
+    """
+    repost_types = [RepostType(repost_type).value for repost_type in repost_types]
+    save_types = [SaveType(save_type).value for save_type in save_types]
+    if current_user_id:
+        current_user_columns = """
+          EXISTS (
+            SELECT 1 FROM reposts r
+            WHERE
+              r.repost_item_id = ids.playlist_id and
+              r.repost_type::text = ANY(CAST(:repost_types AS text[])) and
+              r.user_id = :current_user_id and
+              r.is_current = true and
+              r.is_delete = false
+          ) as has_current_user_reposted,
+          EXISTS (
+            SELECT 1 FROM saves s
+            WHERE
+              s.save_item_id = ids.playlist_id and
+              s.save_type::text = ANY(CAST(:save_types AS text[])) and
+              s.user_id = :current_user_id and
+              s.is_current = true and
+              s.is_delete = false
+          ) as has_current_user_saved
+        """
+    else:
+        current_user_columns = """
+          false as has_current_user_reposted,
+          false as has_current_user_saved
+        """
+
+    playlist_metadata = session.execute(
+        text(f"""
+          SELECT
+            ids.playlist_id,
+            CASE WHEN :count_playlist_reposts THEN COALESCE(pa.playlist_repost_count, 0) ELSE 0 END +
+              CASE WHEN :count_album_reposts THEN COALESCE(pa.album_repost_count, 0) ELSE 0 END
+              as repost_count,
+            CASE WHEN :count_playlist_saves THEN COALESCE(pa.playlist_save_count, 0) ELSE 0 END +
+              CASE WHEN :count_album_saves THEN COALESCE(pa.album_save_count, 0) ELSE 0 END
+              as save_count,
+            {current_user_columns}
+          FROM unnest(CAST(:playlist_ids AS integer[])) AS ids(playlist_id)
+          LEFT JOIN playlist_aggregates pa ON pa.playlist_id = ids.playlist_id
+        """),
+        {
+            "playlist_ids": list(playlist_ids),
+            "repost_types": repost_types,
+            "save_types": save_types,
+            "count_playlist_reposts": RepostType.playlist.value in repost_types,
+            "count_album_reposts": RepostType.album.value in repost_types,
+            "count_playlist_saves": SaveType.playlist.value in save_types,
+            "count_album_saves": SaveType.album.value in save_types,
+            "current_user_id": current_user_id
+        }
+    )
+    return {row["playlist_id"]: row for row in playlist_metadata}
+
 def get_repost_counts_query(session, query_by_user_flag, query_repost_type_flag, filter_ids, repost_types, max_block_number=None):
     query_col = Repost.user_id if query_by_user_flag else Repost.repost_item_id
 
@@ -704,7 +584,7 @@ def get_repost_counts_query(session, query_by_user_flag, query_repost_type_flag,
     return repost_counts_query
 
 # Gets the repost count for users or tracks with the filters specified in the params.
-# The time param {day, week, month, year} is used in generate_trending to create a windowed time frame for repost counts
+# The time param {day, week, month, year} creates a windowed time frame for repost counts
 def get_repost_counts(session, query_by_user_flag, query_repost_type_flag, filter_ids, repost_types, max_block_number=None, time=None):
     repost_counts_query = get_repost_counts_query(session, query_by_user_flag, query_repost_type_flag, filter_ids, repost_types, max_block_number)
 
@@ -763,7 +643,7 @@ def get_save_counts_query(session, query_by_user_flag, query_save_type_flag, fil
     return save_counts_query
 
 # Gets the save count for users or tracks with the filters specified in the params.
-# The time param {day, week, month, year} is used in generate_trending to create a windowed time frame for save counts
+# The time param {day, week, month, year} creates a windowed time frame for save counts
 def get_save_counts(session, query_by_user_flag, query_save_type_flag, filter_ids, save_types, max_block_number=None, time=None):
     save_counts_query = get_save_counts_query(session, query_by_user_flag, query_save_type_flag, filter_ids, save_types, max_block_number)
 
@@ -872,6 +752,77 @@ def paginate_query(query_obj, apply_offset=True, include_count=False):
         return (modified_query, query_obj.count())
     return modified_query
 
+
+# Cursors are opaque to clients: the urlsafe base64 JSON list of the sort key values of the
+# last row served, so the next page starts with a range scan instead of discarding offset rows
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor, sort_keys):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError("Cursor does not match the sort keys")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for ((column, _), value) in zip(sort_keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise exceptions.ArgumentError("Invalid value for parameter 'cursor'")
+
+
+def get_keyset_filter(sort_keys, values):
+    """ Filter matching the rows ordered after values by sort_keys """
+    descending_keys = {descending for (_, descending) in sort_keys}
+    if len(descending_keys) == 1:
+        # single direction, compare as a row so the scan can start from an index position
+        columns = tuple_(*[column for (column, _) in sort_keys])
+        return columns < tuple_(*values) if descending_keys.pop() else columns > tuple_(*values)
+
+    conditions = []
+    for (index, (column, descending)) in enumerate(sort_keys):
+        conditions.append(and_(
+            *[previous_column == value for ((previous_column, _), value) in zip(sort_keys[:index], values)],
+            column < values[index] if descending else column > values[index]
+        ))
+    return or_(*conditions)
+
+
+def paginate_query_with_cursor(query_obj, sort_keys):
+    """ Orders query_obj by sort_keys and returns the requested page along with the next page cursor.
+
+        Pages start after the `cursor` request param when given, otherwise at `offset`.
+
+        Args:
+            sort_keys: list of (column, descending) pairs ending with a unique tiebreaker, each value
+                is read from result rows by column key
+        Returns:
+            (results, next_cursor) tuple, next_cursor is None on the last page
+    """
+    (limit, offset) = get_pagination_vars()
+    query_obj = query_obj.order_by(
+        *[column.desc() if descending else column.asc() for (column, descending) in sort_keys]
+    )
+
+    cursor = request.args.get("cursor", type=str)
+    if cursor:
+        query_obj = query_obj.filter(get_keyset_filter(sort_keys, decode_cursor(cursor, sort_keys)))
+    else:
+        query_obj = query_obj.offset(offset)
+
+    # fetch one extra row to know whether a next page exists
+    results = query_obj.limit(limit + 1).all()
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        values = [getattr(results[-1], column.key) for (column, _) in sort_keys]
+        # rows sorted on a null value cannot be resumed from, callers fall back to offset
+        if None not in values:
+            next_cursor = encode_cursor(values)
+    return (results, next_cursor)
+
 def get_genre_list(genre):
     genre_list = []
     genre_list.append(genre)
@@ -1041,24 +992,12 @@ def create_followee_playlists_subquery(session, current_user_id):
         current_user_id: The current user id to query against
     """
     # Get active followees
-    followee_user_ids_subquery = (
-        session.query(Follow.followee_user_id)
-        .filter(
-            Follow.follower_user_id == current_user_id,
-            Follow.is_current == True,
-            Follow.is_delete == False
-        )
-        .subquery()
-    )
+    social_graph = get_social_graph(session, current_user_id)
     followee_playlists_subquery = (
         session.query(
             Playlist
         )
-        .select_from(Playlist)
-        .join(
-            followee_user_ids_subquery,
-            Playlist.playlist_owner_id == followee_user_ids_subquery.c.followee_user_id
-        )
+        .filter(social_graph.followee_filter(Playlist.playlist_owner_id))
         .subquery()
     )
     return followee_playlists_subquery
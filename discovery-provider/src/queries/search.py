@@ -5,11 +5,12 @@ from flask import Blueprint, request
 from enum import Enum
 
 from src import api_helpers, exceptions
-from src.models import User, Track, RepostType, Playlist, Save, SaveType, Follow
+from src.models import User, Track, RepostType, Playlist, Save, SaveType
 from src.utils import helpers
 from src.utils.config import shared_config
 from src.utils.db_session import get_db_read_replica
 from src.queries import response_name_constants
+from src.queries.social_graph import get_social_graph
 
 from src.queries.query_helpers import get_current_user_id, populate_user_metadata, \
     populate_track_metadata, populate_playlist_metadata, get_pagination_vars, \
@@ -258,17 +259,8 @@ def search_tags():
 
         if (searchKind in [SearchKind.all, SearchKind.users]):
             # Query followed users that have referenced this tag
-            followed_user_query = (
-                session.query(Follow.followee_user_id)
-                .filter(
-                    Follow.is_current == True,
-                    Follow.is_delete == False,
-                    Follow.follower_user_id == current_user_id,
-                    Follow.followee_user_id.in_(user_ids)
-                )
-                .all()
-            )
-            followed_user_ids = [i[0] for i in followed_user_query]
+            social_graph = get_social_graph(session, current_user_id)
+            followed_user_ids = [user_id for user_id in user_ids if social_graph.is_followee(user_id)]
             followed_users = (
                 session.query(User)
                 .filter(
@@ -0,0 +1,116 @@
+import logging
+import redis
+from flask import g, has_app_context
+from sqlalchemy import any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.models import Follow
+from src.utils.config import shared_config
+from src.utils.redis_constants import followee_ids_redis_key_prefix
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = shared_config["redis"]["url"]
+REDIS = redis.Redis.from_url(url=REDIS_URL)
+
+# Seconds the followee ids of a user are cached in redis across requests, 0 disables the cache
+FOLLOWEE_CACHE_TTL = int(shared_config["discprov"]["followee_cache_ttl"])
+
+
+def get_followee_ids_redis_key(user_id):
+    return f"{followee_ids_redis_key_prefix}:{user_id}"
+
+
+def invalidate_followee_cache(redis_inst, follower_user_ids):
+    """ Drop the cached followees of users whose follows changed, call once the changes are committed """
+    if follower_user_ids:
+        redis_inst.delete(*[get_followee_ids_redis_key(user_id) for user_id in follower_user_ids])
+
+
+class SocialGraph:
+    """ Followees of the current user, loaded at most once per request.
+
+        Query helpers should use get_social_graph instead of querying the follows table for the
+        current user's followees.
+    """
+
+    def __init__(self, session, current_user_id):
+        self._session = session
+        self._current_user_id = current_user_id
+        self._followee_user_ids = None
+        self._followee_user_id_set = None
+
+    @property
+    def current_user_id(self):
+        return self._current_user_id
+
+    @property
+    def followee_user_ids(self):
+        """ Sorted list of the ids of the users followed by the current user """
+        if self._followee_user_ids is None:
+            self._followee_user_ids = self._load_followee_user_ids()
+            self._followee_user_id_set = frozenset(self._followee_user_ids)
+        return self._followee_user_ids
+
+    @property
+    def followee_user_id_set(self):
+        if self._followee_user_id_set is None:
+            self.followee_user_ids  # pylint: disable=W0104
+        return self._followee_user_id_set
+
+    def is_followee(self, user_id):
+        return user_id in self.followee_user_id_set
+
+    def followee_filter(self, column):
+        """ SQL filter matching user id columns against the followees, bound as a single int array """
+        return column == any_(
+            bindparam("followee_user_ids", self.followee_user_ids, type_=ARRAY(Integer), unique=True)
+        )
+
+    def _load_followee_user_ids(self):
+        if not self._current_user_id:
+            return []
+
+        redis_key = get_followee_ids_redis_key(self._current_user_id)
+        if FOLLOWEE_CACHE_TTL > 0:
+            try:
+                cached_followee_user_ids = REDIS.get(redis_key)
+                if cached_followee_user_ids is not None:
+                    cached_followee_user_ids = cached_followee_user_ids.decode("utf-8")
+                    return [int(user_id) for user_id in cached_followee_user_ids.split(",") if user_id]
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"social_graph.py | Failed to read {redis_key}, {e}")
+
+        followee_user_ids = sorted(
+            followee_user_id for (followee_user_id,) in (
+                self._session.query(Follow.followee_user_id)
+                .filter(
+                    Follow.follower_user_id == self._current_user_id,
+                    Follow.is_current == True,
+                    Follow.is_delete == False
+                )
+                .all()
+            )
+        )
+
+        if FOLLOWEE_CACHE_TTL > 0:
+            try:
+                REDIS.set(
+                    redis_key,
+                    ",".join(str(user_id) for user_id in followee_user_ids),
+                    ex=FOLLOWEE_CACHE_TTL
+                )
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"social_graph.py | Failed to cache {redis_key}, {e}")
+        return followee_user_ids
+
+
+def get_social_graph(session, current_user_id):
+    """ Returns the SocialGraph of current_user_id, shared by every query helper in the request """
+    if not has_app_context():
+        return SocialGraph(session, current_user_id)
+
+    if "social_graphs" not in g:
+        g.social_graphs = {}
+    if current_user_id not in g.social_graphs:
+        g.social_graphs[current_user_id] = SocialGraph(session, current_user_id)
+    return g.social_graphs[current_user_id]
@@ -1,18 +1,20 @@
 import logging # pylint: disable=C0302
+import threading
 import redis
-import json
 import sqlalchemy
 
 from flask import Blueprint, request
 from urllib.parse import urljoin, unquote
 
-from src import api_helpers
+from src import api_helpers, exceptions
 from src.models import User, Track, RepostType, Follow, SaveType
 from src.utils.db_session import get_db_read_replica
 from src.utils.config import shared_config
 from src.queries.query_helpers import get_pagination_vars
-from src.tasks.generate_trending import generate_trending, trending_cache_hits_key, \
-        trending_cache_miss_key, trending_cache_total_key
+from src.tasks.generate_trending import trending_time_ranges, generate_trending, has_trending_ranking, \
+    update_trending_cache
+from src.utils.trending_cache import get_trending_cache_key, get_trending_cache_entry, \
+        acquire_trending_cache_refresh, release_trending_cache_refresh, record_trending_cache_access
 
 logger = logging.getLogger(__name__)
 bp = Blueprint("trending", __name__)
@@ -24,27 +26,49 @@ REDIS = redis.Redis.from_url(url=REDIS_URL)
 
 @bp.route("/trending/<time>", methods=("GET",))
 def trending(time):
+    if time not in trending_time_ranges:
+        raise exceptions.ArgumentError(f"Invalid value for parameter 'time' must be in {trending_time_ranges}")
+
     (limit, offset) = get_pagination_vars()
-    # Increment total trending count
-    REDIS.incr(trending_cache_total_key, 1)
 
     genre = request.args.get("genre", default=None, type=str)
-    if genre is None:
-        redis_key = f"trending-{time}"
-        redis_cache_value = REDIS.get(redis_key)
-        if redis_cache_value is not None:
-            json_cache = json.loads(redis_cache_value.decode('utf-8'))
-            if json_cache is not None:
-                num_cached_entries = len(json_cache['listen_counts'])
-                logger.error(f'Cache for {redis_key}, {num_cached_entries} entries, request limit {limit}')
-                if offset + limit <= num_cached_entries:
-                    json_cache['listen_counts'] = json_cache['listen_counts'][offset:offset + limit]
-                    logger.error(f'Returning cache for {redis_key}')
-                    # Increment cache hit count
-                    REDIS.incr(trending_cache_hits_key, 1)
-                    return api_helpers.success_response(json_cache)
-    # Increment cache miss count
-    REDIS.incr(trending_cache_miss_key, 1)
-    # Recalculate trending values if necessary
-    final_resp = generate_trending(get_db_read_replica(), time, genre, limit, offset)
-    return api_helpers.success_response(final_resp)
+    if genre is not None:
+        # Parse encoded characters, such as Hip-Hop%252FRap -> Hip-Hop/Rap
+        genre = unquote(genre)
+
+    # The whole ranking of every time range and genre is cached by the update_discovery_cache task
+    cache_key = get_trending_cache_key(time, genre)
+    cache_entry = get_trending_cache_entry(REDIS, cache_key, offset, limit)
+    if cache_entry is not None:
+        (json_cache, is_stale) = cache_entry
+        if is_stale:
+            record_trending_cache_access(REDIS, cache_key, "stale_hits")
+            # Serve the stale ranking while a single request refreshes it in the background
+            if acquire_trending_cache_refresh(REDIS, cache_key):
+                threading.Thread(
+                    target=refresh_trending_cache,
+                    args=(get_db_read_replica(), time, genre, cache_key),
+                    daemon=True
+                ).start()
+        else:
+            record_trending_cache_access(REDIS, cache_key, "hits")
+    elif not has_trending_ranking(get_db_read_replica(), time, genre):
+        # Only genres ranked by the index_trending task are cached and counted, so arbitrary genre
+        # strings cannot create redis keys and stats fields
+        json_cache = generate_trending(get_db_read_replica(), time, genre, limit, offset)
+    else:
+        record_trending_cache_access(REDIS, cache_key, "misses")
+        # Cache the ranking precomputed by the index_trending task
+        json_cache = update_trending_cache(get_db_read_replica(), REDIS, time, genre)
+        json_cache['listen_counts'] = json_cache['listen_counts'][offset:offset + limit]
+
+    return api_helpers.success_response(json_cache)
+
+
+def refresh_trending_cache(db, time, genre, cache_key):
+    try:
+        update_trending_cache(db, REDIS, time, genre)
+    except Exception: # pylint: disable=W0703
+        logger.error(f"trending.py | Failed to refresh trending cache {cache_key}", exc_info=True)
+    finally:
+        release_trending_cache_refresh(REDIS, cache_key)
@@ -0,0 +1,472 @@
+import logging
+import sqlalchemy
+from src.models import Track, Playlist, Follow, Repost, Save
+from src.tasks.current_versions import bind_values, follow_key_columns, repost_key_columns, \
+    save_key_columns
+
+logger = logging.getLogger(__name__)
+
+# Counts served by the populate_*_metadata query helpers are kept in aggregate tables, with one
+# row per user, track and playlist, updated by the indexer in the same transaction as the change
+# itself. Follows, reposts and saves apply +1/-1 deltas to the counts of the entities they point
+# at, the track and playlist counts of a user are recomputed from the user's own tracks and
+# playlists. The full recompute below is only used to backfill or repair the tables, see
+# scripts/recompute_aggregates.py.
+# The counts below must stay in sync with the backfill in the aggregate_tables migration.
+
+user_aggregates_upsert = """
+    INSERT INTO user_aggregates (
+      user_id,
+      track_count,
+      playlist_count,
+      album_count,
+      follower_count,
+      followee_count,
+      repost_count,
+      track_save_count,
+      track_blocknumber
+    )
+    SELECT
+      u.user_id,
+      (
+        SELECT count(*) FROM tracks t
+        WHERE
+          t.owner_id = u.user_id and
+          t.is_current = true and
+          t.is_delete = false and
+          t.is_unlisted = false and
+          t.stem_of IS NULL
+      ),
+      (
+        SELECT count(*) FROM playlists p
+        WHERE
+          p.playlist_owner_id = u.user_id and
+          p.is_current = true and
+          p.is_album = false and
+          p.is_private = false and
+          p.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM playlists p
+        WHERE
+          p.playlist_owner_id = u.user_id and
+          p.is_current = true and
+          p.is_album = true and
+          p.is_private = false and
+          p.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM follows f
+        WHERE f.followee_user_id = u.user_id and f.is_current = true and f.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM follows f
+        WHERE f.follower_user_id = u.user_id and f.is_current = true and f.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM reposts r
+        WHERE r.user_id = u.user_id and r.is_current = true and r.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM saves s
+        WHERE
+          s.user_id = u.user_id and
+          s.save_type = 'track' and
+          s.is_current = true and
+          s.is_delete = false
+      ),
+      (
+        SELECT max(t.blocknumber) FROM tracks t
+        WHERE t.owner_id = u.user_id and t.is_current = true and t.is_delete = false
+      )
+    FROM unnest(:entity_ids) AS u(user_id)
+    ON CONFLICT (user_id) DO UPDATE SET
+      track_count = EXCLUDED.track_count,
+      playlist_count = EXCLUDED.playlist_count,
+      album_count = EXCLUDED.album_count,
+      follower_count = EXCLUDED.follower_count,
+      followee_count = EXCLUDED.followee_count,
+      repost_count = EXCLUDED.repost_count,
+      track_save_count = EXCLUDED.track_save_count,
+      track_blocknumber = EXCLUDED.track_blocknumber
+"""
+
+track_aggregates_upsert = """
+    INSERT INTO track_aggregates (track_id, repost_count, save_count)
+    SELECT
+      t.track_id,
+      (
+        SELECT count(*) FROM reposts r
+        WHERE
+          r.repost_item_id = t.track_id and
+          r.repost_type = 'track' and
+          r.is_current = true and
+          r.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM saves s
+        WHERE
+          s.save_item_id = t.track_id and
+          s.save_type = 'track' and
+          s.is_current = true and
+          s.is_delete = false
+      )
+    FROM unnest(:entity_ids) AS t(track_id)
+    ON CONFLICT (track_id) DO UPDATE SET
+      repost_count = EXCLUDED.repost_count,
+      save_count = EXCLUDED.save_count
+"""
+
+playlist_aggregates_upsert = """
+    INSERT INTO playlist_aggregates (
+      playlist_id,
+      playlist_repost_count,
+      album_repost_count,
+      playlist_save_count,
+      album_save_count
+    )
+    SELECT
+      p.playlist_id,
+      (
+        SELECT count(*) FROM reposts r
+        WHERE
+          r.repost_item_id = p.playlist_id and
+          r.repost_type = 'playlist' and
+          r.is_current = true and
+          r.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM reposts r
+        WHERE
+          r.repost_item_id = p.playlist_id and
+          r.repost_type = 'album' and
+          r.is_current = true and
+          r.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM saves s
+        WHERE
+          s.save_item_id = p.playlist_id and
+          s.save_type = 'playlist' and
+          s.is_current = true and
+          s.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM saves s
+        WHERE
+          s.save_item_id = p.playlist_id and
+          s.save_type = 'album' and
+          s.is_current = true and
+          s.is_delete = false
+      )
+    FROM unnest(:entity_ids) AS p(playlist_id)
+    ON CONFLICT (playlist_id) DO UPDATE SET
+      playlist_repost_count = EXCLUDED.playlist_repost_count,
+      album_repost_count = EXCLUDED.album_repost_count,
+      playlist_save_count = EXCLUDED.playlist_save_count,
+      album_save_count = EXCLUDED.album_save_count
+"""
+
+# entity type -> statement recomputing the aggregate rows of :entity_ids
+aggregate_upserts = {
+    "user": user_aggregates_upsert,
+    "track": track_aggregates_upsert,
+    "playlist": playlist_aggregates_upsert,
+}
+
+# Recompute the counts of the tracks and playlists owned by :user_ids, leaving the social counts
+# of existing rows untouched
+user_content_aggregates_upsert = """
+    INSERT INTO user_aggregates (
+      user_id,
+      track_count,
+      playlist_count,
+      album_count,
+      follower_count,
+      followee_count,
+      repost_count,
+      track_save_count,
+      track_blocknumber
+    )
+    SELECT
+      u.user_id,
+      (
+        SELECT count(*) FROM tracks t
+        WHERE
+          t.owner_id = u.user_id and
+          t.is_current = true and
+          t.is_delete = false and
+          t.is_unlisted = false and
+          t.stem_of IS NULL
+      ),
+      (
+        SELECT count(*) FROM playlists p
+        WHERE
+          p.playlist_owner_id = u.user_id and
+          p.is_current = true and
+          p.is_album = false and
+          p.is_private = false and
+          p.is_delete = false
+      ),
+      (
+        SELECT count(*) FROM playlists p
+        WHERE
+          p.playlist_owner_id = u.user_id and
+          p.is_current = true and
+          p.is_album = true and
+          p.is_private = false and
+          p.is_delete = false
+      ),
+      0,
+      0,
+      0,
+      0,
+      (
+        SELECT max(t.blocknumber) FROM tracks t
+        WHERE t.owner_id = u.user_id and t.is_current = true and t.is_delete = false
+      )
+    FROM unnest(:user_ids) AS u(user_id)
+    ON CONFLICT (user_id) DO UPDATE SET
+      track_count = EXCLUDED.track_count,
+      playlist_count = EXCLUDED.playlist_count,
+      album_count = EXCLUDED.album_count,
+      track_blocknumber = EXCLUDED.track_blocknumber
+"""
+
+# Whether each changed follow, repost or save was active (current and not deleted) before the
+# change and whether it is now. A NULL was_active is read from the latest version up to
+# :before_block_number.
+social_states_select = """
+    SELECT
+      {changed_key_columns},
+      COALESCE(
+        c.was_active,
+        (
+          SELECT NOT e.is_delete FROM {table} e
+          WHERE {key_join} and e.blocknumber <= :before_block_number
+          ORDER BY e.blocknumber DESC
+          LIMIT 1
+        ),
+        false
+      ) as was_active,
+      EXISTS (
+        SELECT 1 FROM {table} e
+        WHERE {key_join} and e.is_current = true and e.is_delete = false
+      ) as is_active
+    FROM (VALUES {values}) AS c ({key_columns}, was_active)
+"""
+
+# Add the count deltas of each entity to its aggregate row, rows missing from the table start
+# at the deltas. Track and playlist counts of new user rows are set by user_content_aggregates_upsert.
+aggregate_deltas_upsert = """
+    INSERT INTO {table} ({id_column}, {columns})
+    SELECT {id_column}, {select_columns}
+    FROM (VALUES {values}) AS d ({id_column}, {delta_columns})
+    ON CONFLICT ({id_column}) DO UPDATE SET {update_columns}
+"""
+
+# entity type -> aggregate table, its id column and the columns maintained by deltas
+aggregate_delta_columns = {
+    "user": (
+        "user_aggregates",
+        "user_id",
+        ["follower_count", "followee_count", "repost_count", "track_save_count"]
+    ),
+    "track": ("track_aggregates", "track_id", ["repost_count", "save_count"]),
+    "playlist": (
+        "playlist_aggregates",
+        "playlist_id",
+        ["playlist_repost_count", "album_repost_count", "playlist_save_count", "album_save_count"]
+    ),
+}
+
+# user_aggregates columns only set by user_content_aggregates_upsert
+user_content_columns = ["track_count", "playlist_count", "album_count"]
+
+# social table -> model, (column, type) tuples identifying a row of it
+social_keys = {
+    "follows": (Follow, follow_key_columns),
+    "reposts": (Repost, repost_key_columns),
+    "saves": (Save, save_key_columns),
+}
+
+
+def empty_aggregate_changes():
+    """ Owners whose tracks or playlists changed, and social table -> key of each changed row -->
+        whether it was active before the change, None when unknown
+    """
+    return {"owner": set(), "follows": {}, "reposts": {}, "saves": {}}
+
+
+def get_social_key(model):
+    """ Returns the (social table, key) of a follow, repost or save model, None for other models """
+    for table, (social_model, key_columns) in social_keys.items():
+        if isinstance(model, social_model):
+            return (table, tuple(getattr(model, column) for column, _ in key_columns))
+    return None
+
+
+def add_aggregate_changes(aggregate_changes, models):
+    """ Record the owners and social rows whose counts are affected by models written by the indexer.
+        Whether the social rows were active before is read from the versions preceding the batch
+        by update_aggregates.
+
+        Args:
+            aggregate_changes: dict returned by empty_aggregate_changes, updated in place
+            models: iterable of model instances written by the indexer
+    """
+    for model in models:
+        if isinstance(model, Track):
+            aggregate_changes["owner"].add(model.owner_id)
+        elif isinstance(model, Playlist):
+            aggregate_changes["owner"].add(model.playlist_owner_id)
+        else:
+            social_key = get_social_key(model)
+            if social_key is not None:
+                (table, key) = social_key
+                aggregate_changes[table].setdefault(key, None)
+    return aggregate_changes
+
+
+def add_reverted_aggregate_changes(aggregate_changes, models):
+    """ Record the owners and social rows whose counts are affected by a revert. The latest reverted
+        version of a social row is the one that was current before the revert.
+
+        Args:
+            aggregate_changes: dict returned by empty_aggregate_changes, updated in place
+            models: iterable of the versions deleted by the revert
+    """
+    latest_social_versions = {}
+    for model in models:
+        if isinstance(model, Track):
+            aggregate_changes["owner"].add(model.owner_id)
+        elif isinstance(model, Playlist):
+            aggregate_changes["owner"].add(model.playlist_owner_id)
+        else:
+            social_key = get_social_key(model)
+            if social_key is not None and (
+                    social_key not in latest_social_versions or
+                    model.blocknumber > latest_social_versions[social_key].blocknumber
+            ):
+                latest_social_versions[social_key] = model
+    for (table, key), model in latest_social_versions.items():
+        aggregate_changes[table][key] = not model.is_delete
+    return aggregate_changes
+
+
+def add_aggregate_delta(aggregate_deltas, entity_type, entity_id, column, delta):
+    (_, _, columns) = aggregate_delta_columns[entity_type]
+    entity_deltas = aggregate_deltas[entity_type].setdefault(entity_id, dict.fromkeys(columns, 0))
+    entity_deltas[column] += delta
+
+
+def add_social_deltas(aggregate_deltas, table, key, delta):
+    """ Apply the +1/-1 delta of a follow, repost or save becoming active or inactive """
+    if table == "follows":
+        (follower_user_id, followee_user_id) = key
+        add_aggregate_delta(aggregate_deltas, "user", followee_user_id, "follower_count", delta)
+        add_aggregate_delta(aggregate_deltas, "user", follower_user_id, "followee_count", delta)
+    elif table == "reposts":
+        (user_id, repost_item_id, repost_type) = key
+        add_aggregate_delta(aggregate_deltas, "user", user_id, "repost_count", delta)
+        if repost_type == "track":
+            add_aggregate_delta(aggregate_deltas, "track", repost_item_id, "repost_count", delta)
+        else:
+            add_aggregate_delta(aggregate_deltas, "playlist", repost_item_id, f"{repost_type}_repost_count", delta)
+    elif table == "saves":
+        (user_id, save_item_id, save_type) = key
+        if save_type == "track":
+            add_aggregate_delta(aggregate_deltas, "user", user_id, "track_save_count", delta)
+            add_aggregate_delta(aggregate_deltas, "track", save_item_id, "save_count", delta)
+        else:
+            add_aggregate_delta(aggregate_deltas, "playlist", save_item_id, f"{save_type}_save_count", delta)
+
+
+def get_social_states(session, table, changed_keys, before_block_number):
+    """ Returns (key, was_active, is_active) of the changed rows of a social table """
+    (_, key_columns) = social_keys[table]
+    columns = [column for column, _ in key_columns]
+    params = {"before_block_number": before_block_number}
+    values = bind_values(
+        key_columns + [("was_active", "boolean")],
+        [key + (was_active,) for key, was_active in changed_keys.items()],
+        params
+    )
+    statement = social_states_select.format(
+        table=table,
+        key_columns=", ".join(columns),
+        changed_key_columns=", ".join(f"c.{column}" for column in columns),
+        key_join=" and ".join(f"e.{column} = c.{column}" for column in columns),
+        values=values
+    )
+    return [
+        (tuple(row[:len(columns)]), row[len(columns)], row[len(columns) + 1])
+        for row in session.execute(sqlalchemy.text(statement), params)
+    ]
+
+
+def update_aggregates(session, aggregate_changes, before_block_number=None):
+    """ Update the aggregate rows affected by the changed owners and social rows from the current rows.
+        Pending changes must be flushed to the session beforehand.
+
+        Args:
+            aggregate_changes: dict built by add_aggregate_changes or add_reverted_aggregate_changes
+            before_block_number: block preceding the changes, for the social rows whose previous
+                state is unknown
+    """
+    if aggregate_changes["owner"]:
+        session.execute(
+            sqlalchemy.text(user_content_aggregates_upsert),
+            {"user_ids": list(aggregate_changes["owner"])}
+        )
+        logger.info(f"aggregates.py | Updated content counts of {len(aggregate_changes['owner'])} users")
+
+    aggregate_deltas = {entity_type: {} for entity_type in aggregate_delta_columns}
+    for table in social_keys:
+        if not aggregate_changes[table]:
+            continue
+        for (key, was_active, is_active) in get_social_states(
+                session, table, aggregate_changes[table], before_block_number
+        ):
+            if was_active != is_active:
+                add_social_deltas(aggregate_deltas, table, key, 1 if is_active else -1)
+
+    for entity_type, entity_deltas in aggregate_deltas.items():
+        # changes within the batch can cancel out, e.g. a follow and an unfollow by the same user
+        entity_deltas = {
+            entity_id: deltas for entity_id, deltas in entity_deltas.items() if any(deltas.values())
+        }
+        if not entity_deltas:
+            continue
+        (aggregate_table, id_column, columns) = aggregate_delta_columns[entity_type]
+        # new user rows start with no tracks or playlists, until their owner content is recomputed
+        content_columns = user_content_columns if entity_type == "user" else []
+        params = {}
+        values = bind_values(
+            [(id_column, "integer")] + [(column, "integer") for column in columns],
+            [
+                (entity_id,) + tuple(deltas[column] for column in columns)
+                for entity_id, deltas in entity_deltas.items()
+            ],
+            params
+        )
+        statement = aggregate_deltas_upsert.format(
+            table=aggregate_table,
+            id_column=id_column,
+            columns=", ".join(columns + content_columns),
+            select_columns=", ".join(columns + ["0"] * len(content_columns)),
+            delta_columns=", ".join(columns),
+            update_columns=", ".join(
+                f"{column} = {aggregate_table}.{column} + EXCLUDED.{column}" for column in columns
+            ),
+            values=values
+        )
+        session.execute(sqlalchemy.text(statement), params)
+        logger.info(f"aggregates.py | Applied count deltas to {len(entity_deltas)} {entity_type}s")
+
+
+def recompute_aggregates(session, entity_type, entity_ids):
+    """ Recompute the whole aggregate rows of entity_ids from the current rows, to backfill or
+        repair the counts maintained by update_aggregates
+    """
+    session.execute(sqlalchemy.text(aggregate_upserts[entity_type]), {"entity_ids": list(entity_ids)})
@@ -0,0 +1,56 @@
+import sqlalchemy
+
+# Columns identifying the versions of one entity in each table versioned by block, with the
+# type their values are bound as
+user_key_columns = [("user_id", "integer")]
+track_key_columns = [("track_id", "integer")]
+playlist_key_columns = [("playlist_id", "integer")]
+repost_key_columns = [("user_id", "integer"), ("repost_item_id", "integer"), ("repost_type", "reposttype")]
+follow_key_columns = [("follower_user_id", "integer"), ("followee_user_id", "integer")]
+save_key_columns = [("user_id", "integer"), ("save_item_id", "integer"), ("save_type", "savetype")]
+
+
+def bind_values(columns, rows, params):
+    """ Returns a VALUES list of rows, with each value bound into params and cast to its column type
+
+        Args:
+            columns: (column, type) tuples of the values of each row
+            rows: tuples of column values
+            params: dict the bound values are added to
+    """
+    values = []
+    for row_index, row in enumerate(rows):
+        row_values = []
+        for (column, column_type), value in zip(columns, row):
+            param = f"{column}_{row_index}"
+            params[param] = value
+            row_values.append(f"CAST(:{param} AS {column_type})")
+        values.append(f"({', '.join(row_values)})")
+    return ", ".join(values)
+
+
+def invalidate_current_versions(session, table_name, key_columns, keys):
+    """ Mark the current versions of a set of entities as no longer current, in one statement
+
+        Args:
+            table_name: table versioned by block, e.g. "follows"
+            key_columns: (column, type) tuples identifying an entity of the table
+            keys: tuples of key column values, one per entity
+
+        Returns:
+            set of the keys a current version was invalidated for
+    """
+    if not keys:
+        return set()
+
+    params = {}
+    values = bind_values(key_columns, keys, params)
+
+    columns = [column for column, _ in key_columns]
+    invalidate_update = f"""
+        UPDATE {table_name} e SET is_current = false
+        FROM (VALUES {values}) AS v ({', '.join(columns)})
+        WHERE {' and '.join(f'e.{column} = v.{column}' for column in columns)} and e.is_current = true
+        RETURNING {', '.join(f'e.{column}' for column in columns)}
+    """
+    return {tuple(row) for row in session.execute(sqlalchemy.text(invalidate_update), params)}
@@ -0,0 +1,330 @@
+import logging
+import sqlalchemy
+from src.models import Track, Playlist, Follow, Repost
+from src.utils.config import shared_config
+
+logger = logging.getLogger(__name__)
+
+# Optional fan-out-on-write store backing /feed, 0 disables the store
+FEED_ENTRIES_MAX_PER_USER = int(shared_config["discprov"]["feed_entries_max_per_user"])
+
+# Tracks created by a followee at most this long before one of their playlists containing the
+# track are folded into the playlist, mirrors trackDedupeMaxMinutes in queries.py
+FEED_TRACK_DEDUPE_MAX_MINUTES = 10
+
+# Each follower keeps one row per item created by a followee (is_repost = false) and one row per
+# item reposted by followees (is_repost = true, timestamped by the oldest followee repost). Rows
+# are recomputed from the current tracks, playlists, reposts and follows of the items touched by
+# a batch of blocks, or of every item visible to a follower whose follows changed, then each
+# follower is capped to its :max_entries most recent rows.
+feed_entries_select = """
+    SELECT follower_user_id, item_type, item_id, is_repost, is_playlist_track, activity_timestamp
+    FROM (
+      SELECT
+        e.*,
+        row_number() OVER (
+          PARTITION BY e.follower_user_id
+          ORDER BY e.activity_timestamp DESC, e.item_type DESC, e.item_id DESC
+        ) as entry_rank
+      FROM (
+        SELECT
+          f.follower_user_id,
+          'track' as item_type,
+          t.track_id as item_id,
+          false as is_repost,
+          EXISTS (
+            SELECT 1 FROM playlists p
+            WHERE
+              p.playlist_owner_id = t.owner_id and
+              p.is_current = true and
+              p.is_delete = false and
+              p.is_private = false and
+              p.created_at >= t.created_at and
+              p.created_at - t.created_at <= make_interval(mins => :dedupe_max_minutes) and
+              p.playlist_contents->'track_ids' @> jsonb_build_array(jsonb_build_object('track', t.track_id))
+          ) as is_playlist_track,
+          t.created_at as activity_timestamp
+        FROM tracks t
+        JOIN follows f ON f.followee_user_id = t.owner_id
+        WHERE
+          f.is_current = true and
+          f.is_delete = false and
+          t.is_current = true and
+          t.is_delete = false and
+          t.is_unlisted = false and
+          t.stem_of IS NULL and
+          {track_filter} and
+          {follow_filter}
+        UNION ALL
+        SELECT
+          f.follower_user_id,
+          'playlist' as item_type,
+          p.playlist_id as item_id,
+          false as is_repost,
+          false as is_playlist_track,
+          p.created_at as activity_timestamp
+        FROM playlists p
+        JOIN follows f ON f.followee_user_id = p.playlist_owner_id
+        WHERE
+          f.is_current = true and
+          f.is_delete = false and
+          p.is_current = true and
+          p.is_delete = false and
+          p.is_private = false and
+          {playlist_filter} and
+          {follow_filter}
+        UNION ALL
+        SELECT
+          f.follower_user_id,
+          CASE WHEN r.repost_type = 'track' THEN 'track' ELSE 'playlist' END as item_type,
+          r.repost_item_id as item_id,
+          true as is_repost,
+          false as is_playlist_track,
+          min(r.created_at) as activity_timestamp
+        FROM reposts r
+        JOIN follows f ON f.followee_user_id = r.user_id
+        WHERE
+          f.is_current = true and
+          f.is_delete = false and
+          r.is_current = true and
+          r.is_delete = false and
+          (
+            (
+              r.repost_type = 'track' and
+              EXISTS (
+                SELECT 1 FROM tracks t
+                WHERE
+                  t.track_id = r.repost_item_id and
+                  t.is_current = true and
+                  t.is_delete = false and
+                  t.is_unlisted = false and
+                  t.stem_of IS NULL
+              )
+            ) or (
+              r.repost_type != 'track' and
+              EXISTS (
+                SELECT 1 FROM playlists p
+                WHERE
+                  p.playlist_id = r.repost_item_id and
+                  p.is_current = true and
+                  p.is_delete = false and
+                  p.is_private = false
+              )
+            )
+          ) and
+          {repost_filter} and
+          {follow_filter}
+        GROUP BY 1, 2, 3
+      ) e
+    ) ranked
+    WHERE entry_rank <= :max_entries
+"""
+
+item_feed_entries_select = feed_entries_select.format(
+    track_filter="t.track_id = ANY(CAST(:track_ids AS integer[]))",
+    playlist_filter="p.playlist_id = ANY(CAST(:playlist_ids AS integer[]))",
+    repost_filter="""(
+            (r.repost_type = 'track' and r.repost_item_id = ANY(CAST(:track_ids AS integer[]))) or
+            (r.repost_type != 'track' and r.repost_item_id = ANY(CAST(:playlist_ids AS integer[])))
+          )""",
+    follow_filter="true",
+)
+
+follower_feed_entries_select = feed_entries_select.format(
+    track_filter="true",
+    playlist_filter="true",
+    repost_filter="true",
+    follow_filter="f.follower_user_id = ANY(CAST(:follower_user_ids AS integer[]))",
+)
+
+item_feed_entries_filter = """
+    (item_type = 'track' and item_id = ANY(CAST(:track_ids AS integer[]))) or
+    (item_type = 'playlist' and item_id = ANY(CAST(:playlist_ids AS integer[])))
+"""
+
+item_feed_entries_delete = f"""
+    DELETE FROM feed_entries WHERE {item_feed_entries_filter}
+"""
+
+item_feed_entries_insert = f"""
+    INSERT INTO feed_entries (
+      follower_user_id, item_type, item_id, is_repost, is_playlist_track, activity_timestamp
+    )
+    {item_feed_entries_select}
+"""
+
+# Drop the rows past :max_entries of the followers who just received the changed items
+item_feed_entries_prune = f"""
+    DELETE FROM feed_entries e
+    USING (
+      SELECT
+        follower_user_id,
+        item_type,
+        item_id,
+        is_repost,
+        row_number() OVER (
+          PARTITION BY follower_user_id
+          ORDER BY activity_timestamp DESC, item_type DESC, item_id DESC
+        ) as entry_rank
+      FROM feed_entries
+      WHERE follower_user_id IN (
+        SELECT DISTINCT follower_user_id FROM feed_entries WHERE {item_feed_entries_filter}
+      )
+    ) ranked
+    WHERE
+      ranked.entry_rank > :max_entries and
+      e.follower_user_id = ranked.follower_user_id and
+      e.item_type = ranked.item_type and
+      e.item_id = ranked.item_id and
+      e.is_repost = ranked.is_repost
+"""
+
+# Tracks a changed playlist can fold in: those of its owner created within the dedupe window before
+# it. Edits and reverts keep the playlist's created_at, so this covers the tracks removed from or
+# restored to its contents as well as the ones it holds now.
+playlist_candidate_tracks_select = """
+    SELECT t.track_id
+    FROM playlists p
+    JOIN tracks t ON t.owner_id = p.playlist_owner_id
+    WHERE
+      p.playlist_id = ANY(CAST(:playlist_ids AS integer[])) and
+      p.is_current = true and
+      t.is_current = true and
+      t.created_at <= p.created_at and
+      p.created_at - t.created_at <= make_interval(mins => :dedupe_max_minutes)
+"""
+
+follower_feed_entries_delete = """
+    DELETE FROM feed_entries WHERE follower_user_id = ANY(CAST(:follower_user_ids AS integer[]))
+"""
+
+follower_feed_entries_insert = f"""
+    INSERT INTO feed_entries (
+      follower_user_id, item_type, item_id, is_repost, is_playlist_track, activity_timestamp
+    )
+    {follower_feed_entries_select}
+"""
+
+
+def empty_feed_changes():
+    return {"track": set(), "playlist": set(), "follower": set()}
+
+
+def add_feed_changes(feed_changes, models):
+    """ Record the items and followers whose feed entries are affected by models
+
+        Args:
+            feed_changes: dict returned by empty_feed_changes, updated in place
+            models: iterable of model instances written or reverted by the indexer
+    """
+    for model in models:
+        if isinstance(model, Track):
+            feed_changes["track"].add(model.track_id)
+        elif isinstance(model, Playlist):
+            feed_changes["playlist"].add(model.playlist_id)
+            # tracks released along with the playlist are folded into it, update_feed_entries
+            # also recomputes the ones removed from it
+            for track in (model.playlist_contents or {}).get("track_ids", []):
+                feed_changes["track"].add(track["track"])
+        elif isinstance(model, Repost):
+            item_type = "track" if model.repost_type == "track" else "playlist"
+            feed_changes[item_type].add(model.repost_item_id)
+        elif isinstance(model, Follow):
+            feed_changes["follower"].add(model.follower_user_id)
+    return feed_changes
+
+
+def update_feed_entries(session, feed_changes):
+    """ Recompute the feed entries of the changed items and followers from the current rows.
+        Pending changes must be flushed to the session beforehand. No-op when the store is disabled.
+    """
+    if FEED_ENTRIES_MAX_PER_USER <= 0:
+        return
+
+    params = {
+        "track_ids": list(feed_changes["track"]),
+        "playlist_ids": list(feed_changes["playlist"]),
+        "follower_user_ids": list(feed_changes["follower"]),
+        "max_entries": FEED_ENTRIES_MAX_PER_USER,
+        "dedupe_max_minutes": FEED_TRACK_DEDUPE_MAX_MINUTES,
+    }
+
+    track_ids = set(feed_changes["track"])
+    if feed_changes["playlist"]:
+        # Tracks removed from a changed playlist are no longer folded into it
+        playlist_track_ids = session.execute(sqlalchemy.text(playlist_candidate_tracks_select), params)
+        track_ids.update(track_id for (track_id,) in playlist_track_ids)
+        params["track_ids"] = list(track_ids)
+
+    if track_ids or feed_changes["playlist"]:
+        session.execute(sqlalchemy.text(item_feed_entries_delete), params)
+        session.execute(sqlalchemy.text(item_feed_entries_insert), params)
+        session.execute(sqlalchemy.text(item_feed_entries_prune), params)
+        logger.info(
+            f"feed_entries.py | Updated feed entries for {len(track_ids)} tracks "
+            f"and {len(feed_changes['playlist'])} playlists"
+        )
+
+    # followers with new or removed followees get their whole feed rebuilt
+    if feed_changes["follower"]:
+        session.execute(sqlalchemy.text(follower_feed_entries_delete), params)
+        session.execute(sqlalchemy.text(follower_feed_entries_insert), params)
+        logger.info(f"feed_entries.py | Rebuilt feed entries for {len(feed_changes['follower'])} followers")
+
+
+def get_feed_entries(session, follower_user_id, feed_filter, tracks_only, limit, before=None, offset=0):
+    """ Range read of the most recent feed entries of a user, newest first
+
+        Args:
+            feed_filter: "all", "original" or "repost"
+            tracks_only: bool, skip playlists and keep the tracks released along with them
+            before: optional (activity_timestamp, item_type, item_id) of the last entry already served
+            offset: entries to skip, for clients paginating without a cursor
+
+        Returns:
+            list of (item_type, item_id, activity_timestamp) tuples
+    """
+    filters = ["e.follower_user_id = :follower_user_id"]
+    if tracks_only:
+        filters.append("e.item_type = 'track'")
+    else:
+        filters.append("(e.is_repost = true or e.is_playlist_track = false)")
+
+    if feed_filter == "original":
+        filters.append("e.is_repost = false")
+    elif feed_filter == "repost":
+        filters.append("e.is_repost = true")
+    else:
+        # items created by a followee are only shown once, timestamped by their creation
+        filters.append(f"""(
+          e.is_repost = false or
+          NOT EXISTS (
+            SELECT 1 FROM feed_entries c
+            WHERE
+              c.follower_user_id = e.follower_user_id and
+              c.item_type = e.item_type and
+              c.item_id = e.item_id and
+              c.is_repost = false and
+              {"true" if tracks_only else "c.is_playlist_track = false"}
+          )
+        )""")
+
+    params = {"follower_user_id": follower_user_id, "limit": limit, "offset": offset}
+    if before:
+        filters.append(
+            "(e.activity_timestamp, e.item_type, e.item_id) < (:before_timestamp, :before_item_type, :before_item_id)"
+        )
+        (params["before_timestamp"], params["before_item_type"], params["before_item_id"]) = before
+
+    feed_entries = session.execute(
+        sqlalchemy.text(f"""
+            SELECT e.item_type, e.item_id, e.activity_timestamp
+            FROM feed_entries e
+            WHERE {" and ".join(filters)}
+            ORDER BY e.activity_timestamp DESC, e.item_type DESC, e.item_id DESC
+            LIMIT :limit
+            OFFSET :offset
+        """),
+        params
+    )
+    return [tuple(feed_entry) for feed_entry in feed_entries]
@@ -1,219 +1,285 @@
 import logging # pylint: disable=C0302
-from urllib.parse import urljoin, unquote
+from urllib.parse import urljoin
 import requests
+import sqlalchemy
 from sqlalchemy import func
 
-from src import api_helpers
-from src.models import Track, RepostType, Follow, SaveType
+from src.models import Track, TrendingTrack
 from src.utils.config import shared_config
 from src.queries import response_name_constants
-from src.queries.query_helpers import \
-    get_repost_counts, get_save_counts, get_genre_list
+from src.queries.query_helpers import get_genre_list, parent_genres
+from src.utils.trending_cache import get_trending_cache_key, set_trending_cache_entry
 
 logger = logging.getLogger(__name__)
 
-trending_cache_hits_key = 'trending_cache_hits'
-trending_cache_miss_key = 'trending_cache_miss'
-trending_cache_total_key = 'trending_cache_total'
+# Rolling windows trending is computed for, as accepted by /trending/<time>
+trending_time_ranges = ["day", "week", "month", "year"]
 
-def generate_trending(db, time, genre, limit, offset):
+# Tracks ranked per time range and genre, and listen counts ingested per time range
+TRENDING_TRACKS_LIMIT = int(shared_config["discprov"]["trending_tracks_limit"])
+TRENDING_LISTEN_COUNTS_LIMIT = int(shared_config["discprov"]["trending_listen_counts_limit"])
+# Genres are free-form, only the ones with at least this many current tracks are ranked
+TRENDING_GENRE_MIN_TRACKS = int(shared_config["discprov"]["trending_genre_min_tracks"])
+identity_listen_counts_page_size = 1000
+
+# genre value of the ranking across all genres
+all_genres = ""
+
+# Rank the tracks with the most listens in :time_range, then attach the total and windowed
+# repost and save counts of the ranked tracks and the follower count of their owners
+trending_tracks_insert = """
+    WITH ranked AS (
+      SELECT
+        t.track_id,
+        t.owner_id,
+        t.created_at,
+        l.listens,
+        row_number() OVER (ORDER BY l.listens DESC, t.track_id ASC) as rank
+      FROM track_listen_counts l
+      JOIN tracks t ON t.track_id = l.track_id
+      WHERE
+        l.time_range = :time_range and
+        t.is_current = true and
+        t.is_delete = false and
+        t.is_unlisted = false and
+        t.stem_of IS NULL and
+        {genre_filter}
+      ORDER BY l.listens DESC, t.track_id ASC
+      LIMIT :limit
+    )
+    INSERT INTO trending_tracks (
+      time_range,
+      genre,
+      rank,
+      track_id,
+      listens,
+      repost_count,
+      windowed_repost_count,
+      save_count,
+      windowed_save_count,
+      owner_id,
+      owner_follower_count,
+      created_at
+    )
+    SELECT
+      :time_range,
+      :genre,
+      ranked.rank,
+      ranked.track_id,
+      ranked.listens,
+      COALESCE(ta.repost_count, 0),
+      (
+        SELECT count(*) FROM reposts r
+        WHERE
+          r.repost_item_id = ranked.track_id and
+          r.repost_type = 'track' and
+          r.is_current = true and
+          r.is_delete = false and
+          r.created_at > NOW() - CAST(:interval AS interval)
+      ),
+      COALESCE(ta.save_count, 0),
+      (
+        SELECT count(*) FROM saves s
+        WHERE
+          s.save_item_id = ranked.track_id and
+          s.save_type = 'track' and
+          s.is_current = true and
+          s.is_delete = false and
+          s.created_at > NOW() - CAST(:interval AS interval)
+      ),
+      ranked.owner_id,
+      COALESCE(ua.follower_count, 0),
+      ranked.created_at
+    FROM ranked
+    LEFT JOIN track_aggregates ta ON ta.track_id = ranked.track_id
+    LEFT JOIN user_aggregates ua ON ua.user_id = ranked.owner_id
+"""
+
+
+def fetch_listen_counts(time, track_ids=None, limit=TRENDING_LISTEN_COUNTS_LIMIT):
+    """ Returns the track_id --> listens of the most listened tracks in the time window, among
+        track_ids when given, from the identity service, or None when the identity service could
+        not be reached
+    """
     identity_url = shared_config['discprov']['identity_service_url']
     identity_trending_endpoint = urljoin(identity_url, f"/tracks/trending/{time}")
 
-    post_body = {}
-    post_body["limit"] = limit
-    post_body["offset"] = offset
-
-    # Retrieve genre and query all tracks if required
-    if genre is not None:
-        # Parse encoded characters, such as Hip-Hop%252FRap -> Hip-Hop/Rap
-        genre = unquote(genre)
-        with db.scoped_session() as session:
-            genre_list = get_genre_list(genre)
-            genre_track_ids = (
-                session.query(Track.track_id)
-                .filter(
-                    Track.genre.in_(genre_list),
-                    Track.is_current == True,
-                    Track.is_delete == False,
-                    Track.is_unlisted == False,
-                    Track.stem_of == None
-                )
-                .all()
-            )
-            genre_specific_track_ids = [record[0] for record in genre_track_ids]
-            post_body["track_ids"] = genre_specific_track_ids
-
-    # Query trending information from identity service
-    resp = None
-    try:
-        resp = requests.post(identity_trending_endpoint, json=post_body)
-    except Exception as e: # pylint: disable=W0703
-        logger.error(
-            f'Error retrieving trending info - {identity_trending_endpoint}, {post_body}'
-        )
-        return api_helpers.error_response(e, 500)
+    listen_counts = {}
+    offset = 0
+    while offset < limit:
+        post_body = {"limit": identity_listen_counts_page_size, "offset": offset}
+        if track_ids is not None:
+            post_body["track_ids"] = track_ids
+        try:
+            resp = requests.post(identity_trending_endpoint, json=post_body)
+            json_resp = resp.json()
+        except Exception as e: # pylint: disable=W0703
+            logger.error(f"generate_trending.py | Error retrieving listen counts - {identity_trending_endpoint}, {e}")
+            return None
+        if "error" in json_resp:
+            logger.error(f"generate_trending.py | Error retrieving listen counts - {json_resp['error']}")
+            return None
 
-    json_resp = resp.json()
-    if "error" in json_resp:
-        return api_helpers.error_response(json_resp["error"], 500)
+        for track_entry in json_resp["listenCounts"]:
+            listen_counts[track_entry["trackId"]] = track_entry["listens"]
+        if len(json_resp["listenCounts"]) < identity_listen_counts_page_size:
+            break
+        offset += identity_listen_counts_page_size
+    return listen_counts
 
-    listen_counts = json_resp["listenCounts"]
-    # Convert trackId to snakeCase
-    for track_entry in listen_counts:
-        track_entry[response_name_constants.track_id] = track_entry['trackId']
-        del track_entry['trackId']
 
-    track_ids = [track[response_name_constants.track_id] for track in listen_counts]
+def fetch_trending_listen_counts(time, genre_track_ids):
+    """ Returns the track_id --> listens of the most listened tracks in the time window overall and
+        of each genre, so genre rankings are not limited to the tracks of the overall ranking, or
+        None when the identity service could not be reached
 
-    with db.scoped_session() as session:
-        # Filter tracks to not-deleted ones so trending order is preserved
-        not_deleted_track_ids = (
-            session.query(Track.track_id, Track.created_at)
+        Args:
+            genre_track_ids: dict of genre -> ids of the tracks ranked in the genre
+    """
+    listen_counts = fetch_listen_counts(time)
+    if listen_counts is None:
+        return None
+
+    for track_ids in genre_track_ids.values():
+        if not track_ids:
+            continue
+        genre_listen_counts = fetch_listen_counts(time, track_ids, TRENDING_TRACKS_LIMIT)
+        if genre_listen_counts is None:
+            return None
+        listen_counts.update(genre_listen_counts)
+    return listen_counts
+
+
+def update_listen_counts(session, time, listen_counts):
+    """ Replace the listen counts of the time window """
+    session.execute(
+        sqlalchemy.text("DELETE FROM track_listen_counts WHERE time_range = :time_range"),
+        {"time_range": time}
+    )
+    session.execute(
+        sqlalchemy.text("""
+            INSERT INTO track_listen_counts (time_range, track_id, listens)
+            SELECT :time_range, unnest(CAST(:track_ids AS integer[])), unnest(CAST(:listens AS integer[]))
+        """),
+        {
+            "time_range": time,
+            "track_ids": list(listen_counts.keys()),
+            "listens": list(listen_counts.values()),
+        }
+    )
+
+
+def get_trending_genres(session):
+    """ Returns the genres of at least TRENDING_GENRE_MIN_TRACKS current tracks and the parent
+        genres expanded by get_genre_list
+    """
+    track_genres = {
+        genre for (genre,) in (
+            session.query(Track.genre)
             .filter(
-                Track.track_id.in_(track_ids),
                 Track.is_current == True,
                 Track.is_delete == False,
-                Track.is_unlisted == False,
-                Track.stem_of == None
+                Track.genre != None,
+                Track.genre != ""
             )
+            .group_by(Track.genre)
+            .having(func.count(Track.track_id) >= TRENDING_GENRE_MIN_TRACKS)
             .all()
         )
+    }
+    return sorted(track_genres | set(parent_genres))
 
-        # Generate track -> created_at date
-        track_created_at_dict = {
-            record[0]: record[1] for record in not_deleted_track_ids
-        }
-
-        not_deleted_track_ids = set([record[0] for record in not_deleted_track_ids]) # pylint: disable=R1718
-        # Query repost counts
-        repost_counts = get_repost_counts(session, False, True, not_deleted_track_ids, None)
-         # Generate track_id --> repost_count mapping
-        track_repost_counts = {
-            repost_item_id: repost_count
-            for (repost_item_id, repost_count, repost_type) in repost_counts
-            if repost_type == RepostType.track
-        }
-
-        # Query repost count with respect to rolling time frame in URL (e.g. /trending/week -> window = rolling week)
-        track_repost_counts_for_time = \
-            get_repost_counts(session, False, True, not_deleted_track_ids, None, None, time)
-        # Generate track_id --> windowed_save_count mapping
-        track_repost_counts_for_time = {
-            repost_item_id: repost_count
-            for (repost_item_id, repost_count, repost_type) in track_repost_counts_for_time
-            if repost_type == RepostType.track
-        }
 
-        # Query follower info for each track owner
-        # Query each track owner
-        track_owners_query = (
-            session.query(Track.track_id, Track.owner_id)
-            .filter
-            (
+def get_genre_track_ids(session, genre):
+    """ Returns the ids of the tracks ranked in the genre, including its sub-genres """
+    return [
+        track_id for (track_id,) in (
+            session.query(Track.track_id)
+            .filter(
+                Track.genre.in_(get_genre_list(genre)),
                 Track.is_current == True,
+                Track.is_delete == False,
                 Track.is_unlisted == False,
-                Track.stem_of == None,
-                Track.track_id.in_(not_deleted_track_ids)
+                Track.stem_of == None
             )
             .all()
         )
+    ]
 
-        # Generate track_id <-> owner_id mapping
-        track_owner_dict = {track_id: owner_id for (track_id, owner_id) in track_owners_query}
-        # Generate list of owner ids
-        track_owner_list = [owner_id for (track_id, owner_id) in track_owners_query]
 
-        # build dict of owner_id --> follower_count
-        follower_counts = (
-            session.query(
-                Follow.followee_user_id,
-                func.count(Follow.followee_user_id)
-            )
+def update_trending_tracks(session, time):
+    """ Recompute the rankings of the time window, across all genres and for each genre """
+    session.execute(
+        sqlalchemy.text("DELETE FROM trending_tracks WHERE time_range = :time_range"),
+        {"time_range": time}
+    )
+    params = {"time_range": time, "interval": f"1 {time}", "limit": TRENDING_TRACKS_LIMIT}
+    session.execute(
+        sqlalchemy.text(trending_tracks_insert.format(genre_filter="true")),
+        {**params, "genre": all_genres}
+    )
+
+    genre_trending_tracks_insert = sqlalchemy.text(
+        trending_tracks_insert.format(genre_filter="t.genre = ANY(CAST(:genres AS varchar[]))")
+    )
+    genres = get_trending_genres(session)
+    for genre in genres:
+        session.execute(
+            genre_trending_tracks_insert,
+            {**params, "genre": genre, "genres": get_genre_list(genre)}
+        )
+    logger.info(f"generate_trending.py | Updated trending {time} for {len(genres)} genres")
+
+
+def generate_trending(db, time, genre, limit, offset):
+    """ Returns a page of the precomputed trending ranking of the time window and genre, None for all genres """
+    with db.scoped_session() as session:
+        trending_tracks = (
+            session.query(TrendingTrack)
             .filter(
-                Follow.is_current == True,
-                Follow.is_delete == False,
-                Follow.followee_user_id.in_(track_owner_list)
+                TrendingTrack.time_range == time,
+                TrendingTrack.genre == (all_genres if genre is None else genre),
+                TrendingTrack.rank > offset
             )
-            .group_by(Follow.followee_user_id)
+            .order_by(TrendingTrack.rank)
+            .limit(limit)
             .all()
         )
-        follower_count_dict = \
-                {user_id: follower_count for (user_id, follower_count) in follower_counts}
-
-        # Query save counts
-        save_counts = get_save_counts(session, False, True, not_deleted_track_ids, None)
-        # Generate track_id --> save_count mapping
-        track_save_counts = {
-            save_item_id: save_count
-            for (save_item_id, save_count, save_type) in save_counts
-            if save_type == SaveType.track
-        }
 
-        # Query save counts with respect to rolling time frame in URL (e.g. /trending/week -> window = rolling week)
-        save_counts_for_time = get_save_counts(session, False, True, not_deleted_track_ids, None, None, time)
-         # Generate track_id --> windowed_save_count mapping
-        track_save_counts_for_time = {
-            save_item_id: save_count
-            for (save_item_id, save_count, save_type) in save_counts_for_time
-            if save_type == SaveType.track
-        }
-
-        trending_tracks = []
-        for track_entry in listen_counts:
-            # Skip over deleted tracks
-            if track_entry[response_name_constants.track_id] not in not_deleted_track_ids:
-                continue
-
-            # Populate repost counts
-            if track_entry[response_name_constants.track_id] in track_repost_counts:
-                track_entry[response_name_constants.repost_count] = \
-                        track_repost_counts[track_entry[response_name_constants.track_id]]
-            else:
-                track_entry[response_name_constants.repost_count] = 0
-
-            # Populate repost counts with respect to time
-            if track_entry[response_name_constants.track_id] in track_repost_counts_for_time:
-                track_entry[response_name_constants.windowed_repost_count] = \
-                    track_repost_counts_for_time[track_entry[response_name_constants.track_id]]
-            else:
-                track_entry[response_name_constants.windowed_repost_count] = 0
-
-            # Populate save counts
-            if track_entry[response_name_constants.track_id] in track_save_counts:
-                track_entry[response_name_constants.save_count] = \
-                        track_save_counts[track_entry[response_name_constants.track_id]]
-            else:
-                track_entry[response_name_constants.save_count] = 0
-
-            # Populate save counts with respect to time
-            if track_entry[response_name_constants.track_id] in track_save_counts_for_time:
-                track_entry[response_name_constants.windowed_save_count] = \
-                        track_save_counts_for_time[track_entry[response_name_constants.track_id]]
-            else:
-                track_entry[response_name_constants.windowed_save_count] = 0
-
-            # Populate listen counts
-            owner_id = track_owner_dict[track_entry[response_name_constants.track_id]]
-            owner_follow_count = 0
-            if owner_id in follower_count_dict:
-                owner_follow_count = follower_count_dict[owner_id]
-            track_entry[response_name_constants.track_owner_id] = owner_id
-            track_entry[response_name_constants.track_owner_follower_count] = owner_follow_count
-
-            # Populate created at timestamps
-            if track_entry[response_name_constants.track_id] in track_created_at_dict:
-                # datetime needs to be in isoformat for json.dumps() in `update_trending_cache()` to
-                # properly process the dp response and add to redis cache
+        listen_counts = []
+        for trending_track in trending_tracks:
+            listen_counts.append({
+                response_name_constants.track_id: trending_track.track_id,
+                "listens": trending_track.listens,
+                response_name_constants.repost_count: trending_track.repost_count,
+                response_name_constants.windowed_repost_count: trending_track.windowed_repost_count,
+                response_name_constants.save_count: trending_track.save_count,
+                response_name_constants.windowed_save_count: trending_track.windowed_save_count,
+                response_name_constants.track_owner_id: trending_track.owner_id,
+                response_name_constants.track_owner_follower_count: trending_track.owner_follower_count,
                 # timespec = specifies additional components of the time to include
-                track_entry[response_name_constants.created_at] = \
-                        track_created_at_dict[track_entry[response_name_constants.track_id]] \
-                            .isoformat(timespec='seconds')
-            else:
-                track_entry[response_name_constants.created_at] = None
-
-            trending_tracks.append(track_entry)
+                response_name_constants.created_at:
+                    trending_track.created_at.isoformat(timespec='seconds') if trending_track.created_at else None
+            })
 
     final_resp = {}
-    final_resp['listen_counts'] = trending_tracks
+    final_resp['listen_counts'] = listen_counts
     return final_resp
+
+
+def has_trending_ranking(db, time, genre):
+    """ Returns whether a ranking was computed for the time window and genre, None for all genres """
+    with db.scoped_session() as session:
+        return session.query(TrendingTrack.rank).filter(
+            TrendingTrack.time_range == time,
+            TrendingTrack.genre == (all_genres if genre is None else genre)
+        ).first() is not None
+
+
+def update_trending_cache(db, redis, time, genre=None):
+    """ Cache the whole trending ranking of the time window and genre """
+    resp = generate_trending(db, time, genre, TRENDING_TRACKS_LIMIT, 0)
+    cache_key = get_trending_cache_key(time, genre)
+    set_trending_cache_entry(redis, cache_key, resp)
+    logger.info(f"generate_trending.py | Updated trending cache {cache_key}")
+    return resp
@@ -1,4 +1,6 @@
 import logging
+import time
+import sqlalchemy
 from src import contract_addresses
 from src.models import Block, User, Track, Repost, Follow, Playlist, Save
 from src.tasks.celery_app import celery
@@ -7,7 +9,17 @@ from src.tasks.users import user_state_update  # pylint: disable=E0611,E0001
 from src.tasks.social_features import social_feature_state_update
 from src.tasks.playlists import playlist_state_update
 from src.tasks.user_library import user_library_state_update
-from src.utils.helpers import get_ipfs_info_from_cnode_endpoint
+from src.tasks.metadata_prefetch import prefetch_ipfs_metadata
+from src.tasks.index_peers import load_cnode_endpoints
+from src.tasks.aggregates import empty_aggregate_changes, add_aggregate_changes, \
+    add_reverted_aggregate_changes, update_aggregates
+from src.tasks.feed_entries import empty_feed_changes, add_feed_changes, update_feed_entries
+from src.tasks.notification_events import update_notification_events, revert_notification_events
+from src.tasks.lexeme_dict import empty_lexeme_changes, add_lexeme_changes, mark_lexeme_changes_dirty
+from src.queries.social_graph import invalidate_followee_cache
+from src.utils.block_prefetch import fetch_blocks, fetch_tx_receipts
+from src.utils.db_session import collect_new_models
+from src.utils.tx_router import TxRouter
 from src.utils.redis_constants import latest_block_redis_key, \
     latest_block_hash_redis_key, most_recent_indexed_block_redis_key
 
@@ -21,6 +33,16 @@ default_padded_start_hash = (
 )
 default_config_start_hash = "0x0"
 
+# Ingestion modes of update_task, see [discprov] indexing_mode
+indexing_mode_blocks = "blocks"
+indexing_mode_logs = "logs"
+
+def get_indexing_mode():
+    indexing_mode = update_task.shared_config["discprov"]["indexing_mode"]
+    assert indexing_mode in (indexing_mode_blocks, indexing_mode_logs), \
+        f"Invalid indexing_mode {indexing_mode}, expected {indexing_mode_blocks} or {indexing_mode_logs}"
+    return indexing_mode
+
 def get_contract_info_if_exists(self, address):
     for contract_name, contract_address in contract_addresses.items():
         if update_task.web3.toChecksumAddress(contract_address) == address:
@@ -58,9 +80,13 @@ def initialize_blocks_table_if_necessary(db):
 
     return target_blockhash
 
-def get_latest_block(db):
+def get_latest_block(db, indexing_mode):
     latest_block = None
-    block_processing_window = int(update_task.shared_config["discprov"]["block_processing_window"])
+    # Logs mode only fetches block headers, so it can walk much larger windows per run
+    if indexing_mode == indexing_mode_logs:
+        block_processing_window = int(update_task.shared_config["discprov"]["logs_block_processing_window"])
+    else:
+        block_processing_window = int(update_task.shared_config["discprov"]["block_processing_window"])
     with db.scoped_session() as session:
         current_block_query = session.query(Block).filter_by(is_current=True)
         assert (
@@ -76,405 +102,390 @@ def get_latest_block(db):
 
         target_latest_block_number = current_block_number + block_processing_window
 
-        latest_block_from_chain = update_task.web3.eth.getBlock('latest', True)
+        latest_block_from_chain = update_task.web3.eth.getBlock('latest', False)
         latest_block_number_from_chain = latest_block_from_chain.number
 
         if target_latest_block_number > latest_block_number_from_chain:
             target_latest_block_number = latest_block_number_from_chain
 
         logger.info(f"index.py | get_latest_block | current={current_block_number} target={target_latest_block_number}")
-        latest_block = update_task.web3.eth.getBlock(target_latest_block_number, True)
+        latest_block = update_task.web3.eth.getBlock(
+            target_latest_block_number, indexing_mode == indexing_mode_blocks
+        )
     return latest_block
 
+def get_tx_router():
+    """ Build the router mapping each indexed contract to the handler processing its transactions.
+        To index a new factory, register its address under the name used to look up its txs
+        in index_blocks.
+    """
+    tx_router = TxRouter()
+    for contract_name in [
+            "user_factory",
+            "track_factory",
+            "social_feature_factory",
+            "playlist_factory",
+            "user_library_factory"
+    ]:
+        tx_router.register(contract_addresses[contract_name], contract_name)
+    return tx_router
+
 def update_latest_block_redis():
-    latest_block_from_chain = update_task.web3.eth.getBlock('latest', True)
+    latest_block_from_chain = update_task.web3.eth.getBlock('latest', False)
     redis = update_task.redis
     redis.set(latest_block_redis_key, latest_block_from_chain.number)
     redis.set(latest_block_hash_redis_key, latest_block_from_chain.hash.hex())
 
-def index_blocks(self, db, blocks_list):
+def get_block_tx_events(web3, tx_router, blocks_list, prefetch_workers):
+    """ Decode the events of the transactions sent to indexed contracts in each block, from their
+        receipts. Blocks must include their transactions.
+
+        Returns:
+            dict of blockhash -> list of (tx hash, tx events) sorted by tx hash
+    """
+    # Fetch the receipts of every routed transaction in the window concurrently
+    # before any DB work starts
+    tx_receipts = fetch_tx_receipts(
+        web3,
+        [
+            web3.toHex(tx["hash"])
+            for block in blocks_list
+            for tx, _ in tx_router.route_transactions(block.transactions)
+        ],
+        prefetch_workers
+    )
+
+    block_tx_events = {}
+    for block in blocks_list:
+        # Sort transactions by hash
+        sorted_txs = sorted(block.transactions, key=lambda entry: entry['hash'])
+        block_tx_events[web3.toHex(block.hash)] = [
+            (tx_hash, update_task.event_decoder.decode_receipt(tx_receipts[tx_hash]))
+            for tx_hash in [web3.toHex(tx["hash"]) for tx, _ in tx_router.route_transactions(sorted_txs)]
+        ]
+    return block_tx_events
+
+def get_block_tx_events_from_logs(web3, tx_router, blocks_list):
+    """ Decode the events emitted by indexed contracts in each block, from a single eth_getLogs
+        request over the block window. Blocks only need their header.
+
+        Returns:
+            dict of blockhash -> list of (tx hash, tx events) sorted by tx hash
+    """
+    block_hashes = {block.number: web3.toHex(block.hash) for block in blocks_list}
+    block_tx_logs = {blockhash: {} for blockhash in block_hashes.values()}
+    if blocks_list:
+        logs = web3.eth.getLogs({
+            "fromBlock": min(block_hashes),
+            "toBlock": max(block_hashes),
+            "address": [contract_addresses[handler_name] for handler_name in tx_router.handler_names]
+        })
+        for log in logs:
+            blockhash = web3.toHex(log["blockHash"])
+            # Logs are only applied to the block headers they were emitted in, when the chain
+            # reorganized in between the window is retried on the next run
+            if block_hashes.get(log["blockNumber"]) != blockhash:
+                raise Exception(
+                    f"index.py | get_block_tx_events_from_logs | Log of block {log['blockNumber']} "
+                    f"{blockhash} does not match the indexed block {block_hashes.get(log['blockNumber'])}"
+                )
+            block_tx_logs[blockhash].setdefault(web3.toHex(log["transactionHash"]), []).append(log)
+        logger.info(f"index.py | get_block_tx_events_from_logs | Fetched {len(logs)} logs")
+
+    return {
+        blockhash: [
+            (tx_hash, update_task.event_decoder.decode_receipt({"logs": tx_logs[tx_hash]}))
+            for tx_hash in sorted(tx_logs)
+        ]
+        for blockhash, tx_logs in block_tx_logs.items()
+    }
+
+def index_block(self, session, block, tx_router, block_tx_events, ipfs_metadata):
+    """ Apply a single block within the given session
+
+        block_tx_events holds the decoded events of each transaction of the block sent to or
+        emitted by an indexed contract, as (tx hash, tx events) tuples
+
+        Returns:
+            list of the models written by this block
+    """
     web3 = update_task.web3
-    redis = update_task.redis
+    block_number = block.number
+    block_timestamp = block.timestamp
 
-    num_blocks = len(blocks_list)
-    block_order_range = range(len(blocks_list) - 1, -1, -1)
-    for i in block_order_range:
-        block = blocks_list[i]
-        block_index = num_blocks - i
-        block_number = block.number
-        block_timestamp = block.timestamp
-        logger.info(
-            f"index.py | index_blocks | {self.request.id} | block {block.number} - {block_index}/{num_blocks}"
+    # Models written out by autoflush while the state updates query are no longer in session.new,
+    # collect every model added while applying the block instead
+    with collect_new_models(session) as block_models:
+        current_block_query = session.query(Block).filter_by(is_current=True)
+
+        # Without this check we may end up duplicating an insert operation
+        block_model = Block(
+            blockhash=web3.toHex(block.hash),
+            parenthash=web3.toHex(block.parentHash),
+            number=block.number,
+            is_current=True,
         )
 
-        # Handle each block in a distinct transaction
-        with db.scoped_session() as session:
-            current_block_query = session.query(Block).filter_by(is_current=True)
+        # Update blocks table after
+        assert (
+            current_block_query.count() == 1
+        ), "Expected single row marked as current"
 
-            # Without this check we may end up duplicating an insert operation
-            block_model = Block(
-                blockhash=web3.toHex(block.hash),
-                parenthash=web3.toHex(block.parentHash),
-                number=block.number,
-                is_current=True,
-            )
+        former_current_block = current_block_query.first()
+        former_current_block.is_current = False
+        session.add(block_model)
 
-            # Update blocks table after
-            assert (
-                current_block_query.count() == 1
-            ), "Expected single row marked as current"
+        factory_txs = {handler_name: [] for handler_name in tx_router.handler_names}
 
-            former_current_block = current_block_query.first()
-            former_current_block.is_current = False
-            session.add(block_model)
+        # Group the decoded events of the block by handler
+        for tx_hash, tx_events in block_tx_events:
+            for handler_name, handler_events in tx_events.items():
+                logger.info(
+                    f"index.py | index_blocks | {handler_name} tx {tx_hash} from block - {block_number},"
+                    f" events - {handler_events}, adding to {handler_name} txs"
+                )
+                factory_txs[handler_name].append(handler_events)
 
-            user_factory_txs = []
-            track_factory_txs = []
-            social_feature_factory_txs = []
-            playlist_factory_txs = []
-            user_library_factory_txs = []
+        # bulk process operations once all tx's for block have been parsed
+        user_state_update(
+            self, update_task, session, factory_txs["user_factory"], block_number, block_timestamp, ipfs_metadata
+        )
 
-            # Sort transactions by hash
-            sorted_txs = sorted(block.transactions, key=lambda entry: entry['hash'])
+        track_state_update(
+            self, update_task, session, factory_txs["track_factory"], block_number, block_timestamp, ipfs_metadata
+        )
 
-            # Parse tx events in each block
-            for tx in sorted_txs:
-                tx_hash = web3.toHex(tx["hash"])
-                tx_target_contract_address = tx["to"]
-                tx_receipt = web3.eth.getTransactionReceipt(tx_hash)
+        social_feature_state_update(
+            self, update_task, session, factory_txs["social_feature_factory"], block_number, block_timestamp
+        )
 
-                # Handle user operations
-                if tx_target_contract_address == contract_addresses["user_factory"]:
-                    logger.info(
-                        f"index.py | index_blocks | UserFactory contract addr: {tx_target_contract_address}"
-                        f" tx from block - {tx}, receipt - {tx_receipt}, adding to user_factory_txs to process in bulk"
-                    )
-                    user_factory_txs.append(tx_receipt)
+        # Playlist state operations processed in bulk
+        playlist_state_update(
+            self, update_task, session, factory_txs["playlist_factory"], block_number, block_timestamp
+        )
 
-                # Handle track operations
-                if tx_target_contract_address == contract_addresses["track_factory"]:
-                    logger.info(
-                        f"index.py | index_blocks | TrackFactory contract addr: {tx_target_contract_address}"
-                        f" tx from block - {tx}, receipt - {tx_receipt}"
-                    )
-                    # Track state operations
-                    track_factory_txs.append(tx_receipt)
+        user_library_state_update(
+            self, update_task, session, factory_txs["user_library_factory"], block_number, block_timestamp
+        )
 
-                # Handle social operations
-                if tx_target_contract_address == contract_addresses["social_feature_factory"]:
-                    logger.info(
-                        f"index.py | index_blocks | Social feature contract addr: {tx_target_contract_address}"
-                        f"tx from block - {tx}, receipt - {tx_receipt}"
-                    )
-                    social_feature_factory_txs.append(tx_receipt)
+        # write out all pending changes so the next block in the same transaction sees them
+        session.flush()
 
-                # Handle repost operations
-                if tx_target_contract_address == contract_addresses["playlist_factory"]:
-                    logger.info(
-                        f"index.py | index_blocks | Playlist contract addr: {tx_target_contract_address}"
-                        f"tx from block - {tx}, receipt - {tx_receipt}"
-                    )
-                    playlist_factory_txs.append(tx_receipt)
+    return block_models
 
-                # Handle User Library operations
-                if tx_target_contract_address == contract_addresses["user_library_factory"]:
-                    logger.info(
-                        f"index.py | index_blocks | User Library contract addr: {tx_target_contract_address}"
-                        f"tx from block - {tx}, receipt - {tx_receipt}"
-                    )
-                    user_library_factory_txs.append(tx_receipt)
+def index_blocks(self, db, blocks_list, indexing_mode):
+    web3 = update_task.web3
+    redis = update_task.redis
+    shared_config = update_task.shared_config
+    prefetch_workers = int(shared_config["discprov"]["block_prefetch_workers"])
+    # Several blocks are applied in one transaction, committing every commit_batch_size blocks
+    # or once commit_batch_interval_ms has elapsed, whichever comes first
+    commit_batch_size = max(int(shared_config["discprov"]["block_commit_batch_size"]), 1)
+    commit_batch_interval_ms = int(shared_config["discprov"]["block_commit_batch_interval_ms"])
+    tx_router = get_tx_router()
+
+    # Decode the logs of the indexed contracts in the window once, grouped by handler and event type
+    if indexing_mode == indexing_mode_logs:
+        block_tx_events = get_block_tx_events_from_logs(web3, tx_router, blocks_list)
+    else:
+        block_tx_events = get_block_tx_events(web3, tx_router, blocks_list, prefetch_workers)
+
+    # Fetch the IPFS metadata referenced by user and track events in the window concurrently,
+    # collecting the events from the oldest block as they are applied
+    handler_tx_events = {"user_factory": [], "track_factory": []}
+    for tx_events in [
+            tx_events
+            for block in reversed(blocks_list)
+            for _, tx_events in block_tx_events[web3.toHex(block.hash)]
+    ]:
+        for handler_name, handler_events in tx_events.items():
+            if handler_name in handler_tx_events:
+                handler_tx_events[handler_name].append(handler_events)
+    ipfs_metadata = prefetch_ipfs_metadata(
+        update_task, db, handler_tx_events["track_factory"], handler_tx_events["user_factory"]
+    )
+
+    # Latest chain block as cached by update_latest_block_redis, used to detect when indexing
+    # is caught up to the chain head
+    latest_chain_block_number = redis.get(latest_block_redis_key)
+    if latest_chain_block_number is not None:
+        latest_chain_block_number = int(latest_chain_block_number)
 
-            # bulk process operations once all tx's for block have been parsed
-            user_state_changed = (
-                user_state_update(
-                    self, update_task, session, user_factory_txs, block_number, block_timestamp
+    num_blocks = len(blocks_list)
+    # blocks_list is ordered from newest to oldest
+    ordered_blocks = list(reversed(blocks_list))
+    block_index = 0
+    while block_index < num_blocks:
+        batch_start_time = time.time()
+        num_batch_blocks = 0
+        lexeme_changes = empty_lexeme_changes()
+        aggregate_changes = empty_aggregate_changes()
+        feed_changes = empty_feed_changes()
+        follower_user_ids = set()
+        batch_min_block_number = ordered_blocks[block_index].number - 1
+
+        # Handle a batch of blocks in a distinct transaction, each block keeps its own
+        # blocks table row so reverts still happen block by block
+        with db.scoped_session() as session:
+            while block_index < num_blocks:
+                block = ordered_blocks[block_index]
+                block_index += 1
+                num_batch_blocks += 1
+                logger.info(
+                    f"index.py | index_blocks | {self.request.id} | block {block.number} - {block_index}/{num_blocks}"
                 )
-                > 0
-            )
 
-            track_state_changed = (
-                track_state_update(
-                    self, update_task, session, track_factory_txs, block_number, block_timestamp
+                block_models = index_block(
+                    self, session, block, tx_router, block_tx_events[web3.toHex(block.hash)], ipfs_metadata
                 )
-                > 0
-            )
-
-            social_feature_state_changed = ( # pylint: disable=W0612
-                social_feature_state_update(
-                    self, update_task, session, social_feature_factory_txs, block_number, block_timestamp
+                add_lexeme_changes(lexeme_changes, block_models)
+                add_aggregate_changes(aggregate_changes, block_models)
+                add_feed_changes(feed_changes, block_models)
+                follower_user_ids.update(
+                    model.follower_user_id for model in block_models if isinstance(model, Follow)
                 )
-                > 0
-            )
 
-            # Playlist state operations processed in bulk
-            playlist_state_changed = playlist_state_update(
-                self, update_task, session, playlist_factory_txs, block_number, block_timestamp
-            )
-
-            user_library_state_changed = user_library_state_update( # pylint: disable=W0612
-                self, update_task, session, user_library_factory_txs, block_number, block_timestamp
-            )
-
-            # keep search materialized view in sync with db
-            # only refresh track_lexeme_dict when necessary
-            # social state changes are not factored in since they don't affect track_lexeme_dict
-            # write out all pending transactions to db before refreshing view
-            track_lexeme_state_changed = (user_state_changed or track_state_changed)
-            session.flush()
-            if user_state_changed:
-                session.execute("REFRESH MATERIALIZED VIEW user_lexeme_dict")
-            if track_lexeme_state_changed:
-                session.execute("REFRESH MATERIALIZED VIEW track_lexeme_dict")
-            if playlist_state_changed:
-                session.execute("REFRESH MATERIALIZED VIEW playlist_lexeme_dict")
-                session.execute("REFRESH MATERIALIZED VIEW album_lexeme_dict")
+                # Fall back to per-block commits once caught up so new blocks are visible immediately
+                caught_up = latest_chain_block_number is None \
+                    or latest_chain_block_number - block.number < commit_batch_size
+                batch_elapsed_ms = (time.time() - batch_start_time) * 1000
+                if caught_up or num_batch_blocks >= commit_batch_size \
+                        or batch_elapsed_ms >= commit_batch_interval_ms:
+                    break
+
+            # update the counts and feed entries of every entity touched by the batch and record its
+            # notifications before committing it
+            update_aggregates(session, aggregate_changes, batch_min_block_number)
+            update_feed_entries(session, feed_changes)
+            update_notification_events(session, batch_min_block_number, block.number)
+
+        # queue the entities changed in this batch for the search lexeme dictionaries,
+        # rebuilt outside of indexing by the update_lexeme_dict task
+        mark_lexeme_changes_dirty(redis, lexeme_changes)
+        invalidate_followee_cache(redis, follower_user_ids)
 
         # add the block number of the most recently processed block to redis
         redis.set(most_recent_indexed_block_redis_key, block.number)
+        logger.info(f"index.py | index_blocks | Committed {num_batch_blocks} blocks up to {block.number}")
 
     if num_blocks > 0:
         logger.warning(f"index.py | index_blocks | Indexed {num_blocks} blocks")
 
-# transactions are reverted in reverse dependency order (social features --> playlists --> tracks --> users)
+    # export the IPFS CID cache counters and gateway health of this worker
+    update_task.ipfs_client.flush_cid_cache_stats(redis)
+    update_task.ipfs_client.flush_gateway_health(redis)
+
+# Entity tables versioned by block, with the columns identifying the versions of one entity,
+# reverted in reverse dependency order (social features --> playlists --> tracks --> users)
+revert_entity_keys = [
+    (Save, ["user_id", "save_item_id", "save_type"]),
+    (Repost, ["user_id", "repost_item_id", "repost_type"]),
+    (Follow, ["follower_user_id", "followee_user_id"]),
+    (Playlist, ["playlist_id"]),
+    (Track, ["track_id"]),
+    (User, ["user_id"]),
+]
+
+# Mark the latest version outside of the reverted blocks of every entity changed in them as current
+restore_current_versions_update = """
+    UPDATE {table} e SET is_current = true
+    FROM (
+      SELECT DISTINCT ON ({key_columns}) {key_columns}, blockhash
+      FROM {table}
+      WHERE
+        ({key_columns}) IN (
+          SELECT {key_columns} FROM {table} WHERE blockhash = ANY(CAST(:blockhashes AS varchar[]))
+        ) and
+        NOT (blockhash = ANY(CAST(:blockhashes AS varchar[])))
+      ORDER BY {key_columns}, blocknumber DESC
+    ) latest
+    WHERE {key_join} and e.blockhash = latest.blockhash
+"""
+
+reverted_versions_delete = """
+    DELETE FROM {table} WHERE blockhash = ANY(CAST(:blockhashes AS varchar[]))
+"""
+
+def revert_block_range(session, revert_blocks_list):
+    """ Revert a chain of blocks at once, with a few set based statements per entity table
+
+        Args:
+            revert_blocks_list: blocks to revert, ordered from the current block to the oldest
+
+        Returns:
+            list of the reverted entity models
+    """
+    revert_blockhashes = [revert_block.blockhash for revert_block in revert_blocks_list]
+    params = {"blockhashes": revert_blockhashes}
+
+    reverted_models = []
+    for model, key_columns in revert_entity_keys:
+        reverted_models.extend(
+            session.query(model).filter(model.blockhash.in_(revert_blockhashes)).all()
+        )
+        statement_args = {
+            "table": model.__tablename__,
+            "key_columns": ", ".join(key_columns),
+            "key_join": " and ".join(f"e.{column} = latest.{column}" for column in key_columns),
+        }
+        session.execute(sqlalchemy.text(restore_current_versions_update.format(**statement_args)), params)
+        session.execute(sqlalchemy.text(reverted_versions_delete.format(**statement_args)), params)
+
+    # The parent of the oldest reverted block becomes the current block
+    parent_hash = revert_blocks_list[-1].parenthash
+
+    # Special case for default start block value of 0x0 / 0x0...0
+    if parent_hash == default_padded_start_hash:
+        parent_hash = default_config_start_hash
+
+    # Remove outdated block entries and the notifications they produced
+    session.query(Block).filter(Block.blockhash.in_(revert_blockhashes)).delete(synchronize_session=False)
+    session.query(Block).filter(Block.blockhash == parent_hash).update(
+        {"is_current": True}, synchronize_session=False
+    )
+    revert_notification_events(session, [revert_block.number for revert_block in revert_blocks_list])
+
+    return reverted_models
+
 def revert_blocks(self, db, revert_blocks_list):
-    # TODO: Remove this exception once the unexpected revert scenario has been diagnosed
     num_revert_blocks = len(revert_blocks_list)
     if num_revert_blocks == 0:
         return
 
-    if num_revert_blocks > 500:
-        logger.error(f"index.py | {self.request.id} | Revert blocks list > 500:")
+    # Guard against reverting most of the indexed data on an unexpected revert, raise
+    # max_revert_blocks to rewind further
+    max_revert_blocks = int(update_task.shared_config["discprov"]["max_revert_blocks"])
+    if num_revert_blocks > max_revert_blocks:
+        logger.error(f"index.py | {self.request.id} | Revert blocks list > {max_revert_blocks}:")
         logger.error(revert_blocks_list)
-        raise Exception('Unexpected revert, >0 blocks')
+        raise Exception(f"Unexpected revert, >{max_revert_blocks} blocks")
 
     logger.error(f"index.py | {self.request.id} | Reverting {num_revert_blocks} blocks")
     logger.error(revert_blocks_list)
 
     with db.scoped_session() as session:
+        reverted_models = revert_block_range(session, revert_blocks_list)
+        logger.info(f"index.py | {self.request.id} | Reverted {len(reverted_models)} entities")
 
-        rebuild_playlist_index = False
-        rebuild_track_index = False
-        rebuild_user_index = False
-
-        for revert_block in revert_blocks_list:
-            # Cache relevant information about current block
-            revert_hash = revert_block.blockhash
-            revert_block_number = revert_block.number
-            logger.info(f"Reverting {revert_block_number}")
-            parent_hash = revert_block.parenthash
-
-            # Special case for default start block value of 0x0 / 0x0...0
-            if revert_block.parenthash == default_padded_start_hash:
-                parent_hash = default_config_start_hash
+        lexeme_changes = empty_lexeme_changes()
+        aggregate_changes = empty_aggregate_changes()
+        feed_changes = empty_feed_changes()
+        add_lexeme_changes(lexeme_changes, reverted_models)
+        add_reverted_aggregate_changes(aggregate_changes, reverted_models)
+        add_feed_changes(feed_changes, reverted_models)
+        follower_user_ids = {model.follower_user_id for model in reverted_models if isinstance(model, Follow)}
 
-            # Update newly current block row and outdated row (indicated by current block's parent hash)
-            session.query(Block).filter(Block.blockhash == revert_hash).update(
-                {"is_current": False}
-            )
-            session.query(Block).filter(Block.blockhash == parent_hash).update(
-                {"is_current": True}
-            )
-
-            # aggregate all transactions in current block
-            revert_save_entries = (
-                session.query(Save).filter(Save.blockhash == revert_hash).all()
-            )
-            revert_repost_entries = (
-                session.query(Repost).filter(Repost.blockhash == revert_hash).all()
-            )
-            revert_follow_entries = (
-                session.query(Follow).filter(Follow.blockhash == revert_hash).all()
-            )
-            revert_playlist_entries = (
-                session.query(Playlist).filter(Playlist.blockhash == revert_hash).all()
-            )
-            revert_track_entries = (
-                session.query(Track).filter(Track.blockhash == revert_hash).all()
-            )
-            revert_user_entries = (
-                session.query(User).filter(User.blockhash == revert_hash).all()
-            )
+        # update counts and feed entries from the restored current rows
+        update_aggregates(session, aggregate_changes)
+        update_feed_entries(session, feed_changes)
 
-            # revert all of above transactions
-
-            for save_to_revert in revert_save_entries:
-                save_item_id = save_to_revert.save_item_id
-                save_user_id = save_to_revert.user_id
-                save_type = save_to_revert.save_type
-                previous_save_entry = (
-                    session.query(Save)
-                    .filter(Save.user_id == save_user_id)
-                    .filter(Save.save_item_id == save_item_id)
-                    .filter(Save.save_type == save_type)
-                    .order_by(Save.blocknumber.desc())
-                    .first()
-                )
-                if previous_save_entry:
-                    previous_save_entry.is_current = True
-                # Remove outdated save item entry
-                session.delete(save_to_revert)
-
-            for repost_to_revert in revert_repost_entries:
-                repost_user_id = repost_to_revert.user_id
-                repost_item_id = repost_to_revert.repost_item_id
-                repost_type = repost_to_revert.repost_type
-                previous_repost_entry = (
-                    session.query(Repost)
-                    .filter(Repost.user_id == repost_user_id)
-                    .filter(Repost.repost_item_id == repost_item_id)
-                    .filter(Repost.repost_type == repost_type)
-                    .order_by(Repost.blocknumber.desc())
-                    .first()
-                )
-                # Update prev repost row (is_delete) to is_current == True
-                if previous_repost_entry:
-                    previous_repost_entry.is_current = True
-                # Remove outdated repost entry
-                logger.info(f"Reverting repost: {repost_to_revert}")
-                session.delete(repost_to_revert)
-
-            for follow_to_revert in revert_follow_entries:
-                previous_follow_entry = (
-                    session.query(Follow)
-                    .filter(Follow.follower_user_id == follow_to_revert.follower_user_id)
-                    .filter(Follow.followee_user_id == follow_to_revert.followee_user_id)
-                    .order_by(Follow.blocknumber.desc())
-                    .first()
-                )
-                # update prev follow row (is_delete) to is_current = true
-                if previous_follow_entry:
-                    previous_follow_entry.is_current = True
-                # remove outdated follow entry
-                logger.info(f"Reverting follow: {follow_to_revert}")
-                session.delete(follow_to_revert)
-
-            for playlist_to_revert in revert_playlist_entries:
-                playlist_id = playlist_to_revert.playlist_id
-                previous_playlist_entry = (
-                    session.query(Playlist)
-                    .filter(Playlist.playlist_id == playlist_id)
-                    .filter(Playlist.blocknumber < revert_block_number)
-                    .order_by(Playlist.blocknumber.desc())
-                    .first()
-                )
-                if previous_playlist_entry:
-                    previous_playlist_entry.is_current = True
-                # Remove outdated playlist entry
-                session.delete(playlist_to_revert)
-
-            for track_to_revert in revert_track_entries:
-                track_id = track_to_revert.track_id
-                previous_track_entry = (
-                    session.query(Track)
-                    .filter(Track.track_id == track_id)
-                    .filter(Track.blocknumber < revert_block_number)
-                    .order_by(Track.blocknumber.desc())
-                    .first()
-                )
-                if previous_track_entry:
-                    # First element in descending order is new current track item
-                    previous_track_entry.is_current = True
-                # Remove track entries
-                logger.info(f"Reverting track: {track_to_revert}")
-                session.delete(track_to_revert)
-
-            # TODO: ASSERT ON IDS GREATER FOR BOTH DATA MODELS
-            for user_to_revert in revert_user_entries:
-                user_id = user_to_revert.user_id
-                previous_user_entry = (
-                    session.query(User)
-                    .filter(User.user_id == user_id)
-                    .filter(User.blocknumber < revert_block_number)
-                    .order_by(User.blocknumber.desc())
-                    .first()
-                )
-                if previous_user_entry:
-                    # Update previous user row, setting is_current to true
-                    previous_user_entry.is_current = True
-                # Remove outdated user entries
-                logger.info(f"Reverting user: {user_to_revert}")
-                session.delete(user_to_revert)
-
-            # Remove outdated block entry
-            session.query(Block).filter(Block.blockhash == revert_hash).delete()
-
-            rebuild_playlist_index = rebuild_playlist_index or bool(revert_playlist_entries)
-            rebuild_track_index = rebuild_track_index or bool(revert_track_entries)
-            rebuild_user_index = rebuild_user_index or bool(revert_user_entries)
-
-        if rebuild_playlist_index:
-            session.execute("REFRESH MATERIALIZED VIEW playlist_lexeme_dict")
-            session.execute("REFRESH MATERIALIZED VIEW album_lexeme_dict")
-        if rebuild_user_index or rebuild_track_index:
-            session.execute("REFRESH MATERIALIZED VIEW track_lexeme_dict")
-        if rebuild_user_index:
-            session.execute("REFRESH MATERIALIZED VIEW user_lexeme_dict")
+    # queue reverted entities so their lexemes are rebuilt from the restored current rows
+    mark_lexeme_changes_dirty(update_task.redis, lexeme_changes)
+    invalidate_followee_cache(update_task.redis, follower_user_ids)
 
     # TODO - if we enable revert, need to set the most_recent_indexed_block_redis_key key in redis
 
 
-######## IPFS PEER REFRESH ########
-def refresh_peer_connections(task_context):
-    db = task_context.db
-    ipfs_client = task_context.ipfs_client
-    redis = task_context.redis
-    interval = int(task_context.shared_config["discprov"]["peer_refresh_interval"])
-    with db.scoped_session() as session:
-        db_cnode_endpts = (
-            session.query(
-                User.creator_node_endpoint).filter(
-                    User.creator_node_endpoint != None, User.is_current == True
-                ).distinct()
-        )
-
-        cnode_endpoints = {}
-        # Generate dictionary of unique creator node endpoints
-        for entry in db_cnode_endpts:
-            for cnode_user_set in entry:
-                cnode_entries = cnode_user_set.split(',')
-                for cnode_url in cnode_entries:
-                    if cnode_url == '':
-                        continue
-                    cnode_endpoints[cnode_url] = True
-
-        # Add user metadata URL to peer connection list
-        user_node_url = task_context.shared_config["discprov"]["user_metadata_service_url"]
-        cnode_endpoints[user_node_url] = True
-
-        # Update creator node list
-        ipfs_client.update_cnode_urls(list(cnode_endpoints.keys()))
-
-        # Query ipfs information for each cnode endpoint
-        multiaddr_info = {}
-        for cnode_url in cnode_endpoints:
-            stored_in_redis = redis.get(cnode_url)
-            if stored_in_redis is not None:
-                continue
-            if cnode_url == '':
-                continue
-
-            try:
-                logger.warning('index.py | Retrieving connection info for %s', cnode_url)
-                multiaddr_info[cnode_url] = get_ipfs_info_from_cnode_endpoint(
-                    cnode_url,
-                    None
-                )
-            except Exception as e:  # pylint: disable=broad-except
-                # Handle error in retrieval by not peering this node
-                logger.warning('index.py | Error retrieving info for %s, %s', cnode_url, str(e))
-                multiaddr_info[cnode_url] = None
-
-        for key in multiaddr_info:
-            if multiaddr_info[key] is not None:
-                try:
-                # Peer nodes
-                    logger.warning('index.py | Connecting to %s', multiaddr_info[key])
-                    ipfs_client.connect_peer(multiaddr_info[key])
-                    redis.set(key, multiaddr_info[key], ex=interval)
-                except Exception as e: #pylint: disable=broad-except
-                    logger.warning('index.py | Error connection to %s, %s, %s', multiaddr_info[key], cnode_url, str(e))
-
-
 ######## CELERY TASKS ########
 @celery.task(name="update_discovery_provider", bind=True)
 def update_task(self):
@@ -484,6 +495,10 @@ def update_task(self):
     db = update_task.db
     web3 = update_task.web3
     redis = update_task.redis
+    prefetch_workers = int(update_task.shared_config["discprov"]["block_prefetch_workers"])
+    indexing_mode = get_indexing_mode()
+    # Blocks are fetched with their transactions in blocks mode, as headers in logs mode
+    full_transactions = indexing_mode == indexing_mode_blocks
 
     # Update redis cache for health check queries
     update_latest_block_redis()
@@ -496,13 +511,13 @@ def update_task(self):
         # Attempt to acquire lock - do not block if unable to acquire
         have_lock = update_lock.acquire(blocking=False)
         if have_lock:
-            # Refresh all IPFS peer connections
-            refresh_peer_connections(self)
+            # Pick up the creator node list maintained by the update_ipfs_peers task
+            load_cnode_endpoints(self)
 
             logger.info(f"index.py | {self.request.id} | update_task | Acquired disc_prov_lock")
             initialize_blocks_table_if_necessary(db)
 
-            latest_block = get_latest_block(db)
+            latest_block = get_latest_block(db, indexing_mode)
 
             # Capture block information between latest and target block hash
             index_blocks_list = []
@@ -511,6 +526,16 @@ def update_task(self):
             revert_blocks_list = []
 
             with db.scoped_session() as session:
+                # Prefetch the blocks between the current db block and the target block concurrently
+                # so the walk back to the intersection below does not issue one request per block
+                current_block_number = session.query(Block.number).filter(Block.is_current == True).scalar()
+                prefetched_blocks = fetch_blocks(
+                    web3,
+                    range((current_block_number or 0) + 1, latest_block.number),
+                    prefetch_workers,
+                    full_transactions
+                )
+
                 block_intersection_found = False
                 intersect_block_hash = web3.toHex(latest_block.hash)
 
@@ -554,7 +579,10 @@ def update_task(self):
                         block_intersection_found = True
                         intersect_block_hash = default_config_start_hash
                     else:
-                        latest_block = web3.eth.getBlock(parent_hash, True)
+                        latest_block = prefetched_blocks.get(parent_hash)
+                        if latest_block is None:
+                            # Not part of the prefetched window (e.g. a fork), fetch by hash
+                            latest_block = web3.eth.getBlock(parent_hash, full_transactions)
                         intersect_block_hash = web3.toHex(latest_block.hash)
 
                 # Determine whether current indexed data (is_current == True) matches the
@@ -610,7 +638,7 @@ def update_task(self):
             revert_blocks(self, db, revert_blocks_list)
 
             # Perform indexing operations
-            index_blocks(self, db, index_blocks_list)
+            index_blocks(self, db, index_blocks_list, indexing_mode)
             logger.info(f"index.py | update_task | {self.request.id} | Processing complete within session")
         else:
             logger.error(f"index.py | update_task | {self.request.id} | Failed to acquire disc_prov_lock")
@@ -3,6 +3,8 @@ from src import contract_addresses
 from src.models import IPLDBlacklistBlock, BlacklistedIPLD
 from src.tasks.celery_app import celery
 from src.tasks.ipld_blacklist import ipld_blacklist_state_update
+from src.utils.block_prefetch import fetch_tx_receipts
+from src.utils.tx_router import TxRouter
 
 logger = logging.getLogger(__name__)
 
@@ -76,7 +78,27 @@ def get_latest_blacklist_block(db):
         latest_block = update_ipld_blacklist_task.web3.eth.getBlock(target_latest_block_number, True)
     return latest_block
 
+def get_blacklist_tx_router():
+    tx_router = TxRouter()
+    tx_router.register(contract_addresses["ipld_blacklist_factory"], "ipld_blacklist_factory")
+    return tx_router
+
 def index_blocks(self, db, blocks_list):
+    web3 = update_ipld_blacklist_task.web3
+    prefetch_workers = int(update_ipld_blacklist_task.shared_config["discprov"]["block_prefetch_workers"])
+    tx_router = get_blacklist_tx_router()
+
+    # Only fetch receipts for transactions sent to the blacklist factory
+    tx_receipts = fetch_tx_receipts(
+        web3,
+        [
+            web3.toHex(tx["hash"])
+            for block in blocks_list
+            for tx, _ in tx_router.route_transactions(block.transactions)
+        ],
+        prefetch_workers
+    )
+
     num_blocks = len(blocks_list)
     block_order_range = range(len(blocks_list) - 1, -1, -1)
     for i in block_order_range:
@@ -111,19 +133,15 @@ def index_blocks(self, db, blocks_list):
             ipld_blacklist_factory_txs = []
 
             # Parse tx events in each block
-            for tx in block.transactions:
-                tx_hash = update_ipld_blacklist_task.web3.toHex(tx["hash"])
-                tx_target_contract_address = tx["to"]
-                tx_receipt = update_ipld_blacklist_task.web3.eth.getTransactionReceipt(tx_hash)
-
-                # Handle ipld blacklist operations
-                if tx_target_contract_address == contract_addresses["ipld_blacklist_factory"]:
-                    logger.info(
-                        f"IPLDBlacklistFactory operation, contract addr from block: {tx_target_contract_address}"
-                        f" tx from block - {tx}, receipt - {tx_receipt}, "
-                        "adding to ipld_blacklist_factory_txs to process in bulk"
-                    )
-                    ipld_blacklist_factory_txs.append(tx_receipt)
+            for tx, _ in tx_router.route_transactions(block.transactions):
+                tx_hash = web3.toHex(tx["hash"])
+                tx_receipt = tx_receipts[tx_hash]
+                logger.info(
+                    f"IPLDBlacklistFactory operation, contract addr from block: {tx['to']}"
+                    f" tx from block - {tx}, receipt - {tx_receipt}, "
+                    "adding to ipld_blacklist_factory_txs to process in bulk"
+                )
+                ipld_blacklist_factory_txs.append(tx_receipt)
 
             if ipld_blacklist_factory_txs:
                 logger.warning(f'ipld_blacklist_factory_txs {ipld_blacklist_factory_txs}')
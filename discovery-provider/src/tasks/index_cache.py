@@ -1,34 +1,28 @@
 import logging
-import json
 from src.tasks.celery_app import celery
-from src.tasks.generate_trending import generate_trending, trending_cache_hits_key, \
-        trending_cache_miss_key, trending_cache_total_key
+from src.tasks.generate_trending import trending_time_ranges, get_trending_genres, update_trending_cache
+from src.utils.trending_cache import get_trending_cache_stats
 
 logger = logging.getLogger(__name__)
 
 
 ######## HELPER FUNCTIONS ########
-def update_trending_cache(self, db, redis, time):
-    resp = generate_trending(db, time, None, 1000, 0)
-    resp_json = json.dumps(resp)
-    redis_key = f"trending-{time}"
-    # Cache value for 5 minutes
-    redis.set(redis_key, resp_json, 300)
-    logger.info(f"index_cache.py | Updated trending cache {redis_key}")
-
-# Update cache for all trending timeframes
+# Update cache for all trending timeframes and genres
 def update_all_trending_cache(self, db, redis):
     logger.warning(f"index_cache.py | Update all trending cache")
-    update_trending_cache(self, db, redis, "day")
-    update_trending_cache(self, db, redis, "week")
-    update_trending_cache(self, db, redis, "month")
-    update_trending_cache(self, db, redis, "year")
+    with db.scoped_session() as session:
+        genres = get_trending_genres(session)
+    for time in trending_time_ranges:
+        update_trending_cache(db, redis, time)
+        for genre in genres:
+            update_trending_cache(db, redis, time, genre)
 
 def print_cache_statistics(self, redis):
-    total = redis.get(trending_cache_total_key)
-    hits = redis.get(trending_cache_hits_key)
-    misses = redis.get(trending_cache_miss_key)
-    logger.warning(f"index_cache.py | Trending cache - {hits}  hits, {misses} misses, {total} total")
+    for (cache_key, stats) in sorted(get_trending_cache_stats(redis).items()):
+        logger.warning(
+            f"index_cache.py | Trending cache {cache_key} - {stats['hits']} hits, "
+            f"{stats['stale_hits']} stale hits, {stats['misses']} misses"
+        )
 
 
 ######## CELERY TASKS ########
@@ -0,0 +1,68 @@
+import logging
+import time
+from src.tasks.celery_app import celery
+from src.tasks.lexeme_dict import pop_dirty_lexeme_changes, mark_lexeme_changes_dirty, \
+    update_lexeme_dicts
+from src.utils.redis_constants import lexeme_dict_refresh_duration_redis_key, \
+    lexeme_dict_refresh_lag_redis_key, lexeme_dict_refresh_skipped_redis_key, \
+    lexeme_dict_refresh_completed_redis_key
+
+logger = logging.getLogger(__name__)
+
+
+######## HELPER FUNCTIONS ########
+def refresh_lexeme_dicts(self, db, redis):
+    # Every entity queued since the last run is rebuilt in a single transaction,
+    # no matter how many blocks marked it dirty
+    lexeme_changes, dirty_since = pop_dirty_lexeme_changes(redis)
+    if dirty_since is None:
+        return
+
+    start_time = time.time()
+    try:
+        with db.scoped_session() as session:
+            update_lexeme_dicts(session, lexeme_changes)
+    except Exception as e:
+        # Requeue the entities so they are retried on the next run
+        mark_lexeme_changes_dirty(redis, lexeme_changes, dirty_since)
+        raise e
+    end_time = time.time()
+
+    # Export refresh duration and staleness lag (time between the oldest change and its refresh)
+    redis.set(lexeme_dict_refresh_duration_redis_key, end_time - start_time)
+    redis.set(lexeme_dict_refresh_lag_redis_key, end_time - dirty_since)
+    redis.set(lexeme_dict_refresh_completed_redis_key, end_time)
+    num_changes = sum([len(entity_ids) for entity_ids in lexeme_changes.values()])
+    logger.info(
+        f"index_lexeme_dict.py | Refreshed lexemes for {num_changes} entities "
+        f"in {end_time - start_time}s, lag {end_time - dirty_since}s"
+    )
+
+
+######## CELERY TASKS ########
+@celery.task(name="update_lexeme_dict", bind=True)
+def update_lexeme_dict(self):
+    # Cache custom task class properties
+    # Details regarding custom task context can be found in wiki
+    # Custom Task definition can be found in src/__init__.py
+    db = update_lexeme_dict.db
+    redis = update_lexeme_dict.redis
+    # Define lock acquired boolean
+    have_lock = False
+    # Define redis lock object
+    update_lock = redis.lock("update_lexeme_dict_lock", timeout=7200)
+    try:
+        # Attempt to acquire lock - do not block if unable to acquire
+        have_lock = update_lock.acquire(blocking=False)
+        if have_lock:
+            refresh_lexeme_dicts(self, db, redis)
+        else:
+            # A refresh is still running, pending changes are coalesced into the next run
+            redis.incr(lexeme_dict_refresh_skipped_redis_key)
+            logger.info("index_lexeme_dict.py | Failed to acquire update_lexeme_dict_lock")
+    except Exception as e:
+        logger.error("index_lexeme_dict.py | Fatal error in main loop", exc_info=True)
+        raise e
+    finally:
+        if have_lock:
+            update_lock.release()
@@ -0,0 +1,138 @@
+import json
+import logging
+import concurrent.futures
+from src.models import User
+from src.tasks.celery_app import celery
+from src.utils.helpers import get_ipfs_info_from_cnode_endpoint
+from src.utils.redis_constants import ipfs_cnode_endpoints_redis_key, \
+    ipfs_peer_failure_redis_key_prefix
+
+logger = logging.getLogger(__name__)
+
+
+######## HELPER FUNCTIONS ########
+def get_cnode_endpoints(session, shared_config):
+    """ Return the unique creator node endpoints of current users and the user metadata node """
+    db_cnode_endpts = (
+        session.query(
+            User.creator_node_endpoint).filter(
+                User.creator_node_endpoint != None, User.is_current == True
+            ).distinct()
+    )
+
+    cnode_endpoints = {}
+    # Generate dictionary of unique creator node endpoints
+    for entry in db_cnode_endpts:
+        for cnode_user_set in entry:
+            cnode_entries = cnode_user_set.split(',')
+            for cnode_url in cnode_entries:
+                if cnode_url == '':
+                    continue
+                cnode_endpoints[cnode_url] = True
+
+    # Add user metadata URL to peer connection list
+    user_node_url = shared_config["discprov"]["user_metadata_service_url"]
+    cnode_endpoints[user_node_url] = True
+    return list(cnode_endpoints.keys())
+
+
+def load_cnode_endpoints(task_context):
+    """ Update the IPFS client of this worker with the creator node list published by
+        the update_ipfs_peers task, computing it from the database until the task has run
+    """
+    stored_cnode_endpoints = task_context.redis.get(ipfs_cnode_endpoints_redis_key)
+    if stored_cnode_endpoints is not None:
+        cnode_endpoints = json.loads(stored_cnode_endpoints)
+    else:
+        with task_context.db.scoped_session() as session:
+            cnode_endpoints = get_cnode_endpoints(session, task_context.shared_config)
+    task_context.ipfs_client.update_cnode_urls(cnode_endpoints)
+
+
+def get_peer_failure_redis_key(cnode_url):
+    return f"{ipfs_peer_failure_redis_key_prefix}:{cnode_url}"
+
+
+def refresh_peer_connections(task_context):
+    db = task_context.db
+    ipfs_client = task_context.ipfs_client
+    redis = task_context.redis
+    interval = int(task_context.shared_config["discprov"]["peer_refresh_interval"])
+    failure_interval = int(task_context.shared_config["discprov"]["peer_refresh_failure_interval"])
+    max_workers = int(task_context.shared_config["discprov"]["peer_refresh_workers"])
+
+    with db.scoped_session() as session:
+        cnode_endpoints = get_cnode_endpoints(session, task_context.shared_config)
+
+    # Publish the creator node list for the indexing workers
+    redis.set(ipfs_cnode_endpoints_redis_key, json.dumps(cnode_endpoints))
+    ipfs_client.update_cnode_urls(cnode_endpoints)
+
+    # Skip endpoints that are already peered, or that recently failed to respond
+    pipe = redis.pipeline()
+    for cnode_url in cnode_endpoints:
+        pipe.exists(cnode_url)
+        pipe.exists(get_peer_failure_redis_key(cnode_url))
+    cached = pipe.execute()
+    stale_cnode_endpoints = [
+        cnode_url for i, cnode_url in enumerate(cnode_endpoints)
+        if cnode_url != '' and not cached[2 * i] and not cached[2 * i + 1]
+    ]
+    if not stale_cnode_endpoints:
+        return
+
+    # Query ipfs information for each cnode endpoint concurrently
+    multiaddr_info = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(get_ipfs_info_from_cnode_endpoint, cnode_url, None): cnode_url
+            for cnode_url in stale_cnode_endpoints
+        }
+        for future in concurrent.futures.as_completed(futures):
+            cnode_url = futures[future]
+            try:
+                multiaddr_info[cnode_url] = future.result()
+            except Exception as e:  # pylint: disable=broad-except
+                # Handle error in retrieval by not peering this node until the failure expires
+                logger.warning('index_peers.py | Error retrieving info for %s, %s', cnode_url, str(e))
+                redis.set(get_peer_failure_redis_key(cnode_url), str(e), ex=failure_interval)
+
+    for cnode_url, multiaddr in multiaddr_info.items():
+        try:
+            # Peer nodes
+            logger.warning('index_peers.py | Connecting to %s', multiaddr)
+            ipfs_client.connect_peer(multiaddr)
+            redis.set(cnode_url, multiaddr, ex=interval)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning('index_peers.py | Error connection to %s, %s, %s', multiaddr, cnode_url, str(e))
+
+    logger.info(
+        f"index_peers.py | Probed {len(stale_cnode_endpoints)}/{len(cnode_endpoints)} creator nodes, "
+        f"{len(multiaddr_info)} responded"
+    )
+
+
+######## CELERY TASKS ########
+@celery.task(name="update_ipfs_peers", bind=True)
+def update_ipfs_peers(self):
+    # Cache custom task class properties
+    # Details regarding custom task context can be found in wiki
+    # Custom Task definition can be found in src/__init__.py
+    redis = update_ipfs_peers.redis
+    # Define lock acquired boolean
+    have_lock = False
+    # Define redis lock object
+    update_lock = redis.lock("update_ipfs_peers_lock", timeout=7200)
+    try:
+        # Attempt to acquire lock - do not block if unable to acquire
+        have_lock = update_lock.acquire(blocking=False)
+        if have_lock:
+            refresh_peer_connections(update_ipfs_peers)
+        else:
+            logger.info("index_peers.py | Failed to acquire update_ipfs_peers_lock")
+    except Exception as e:
+        logger.error("index_peers.py | Fatal error in main loop", exc_info=True)
+        raise e
+    finally:
+        if have_lock:
+            update_lock.release()
@@ -0,0 +1,57 @@
+import logging
+import time
+from src.tasks.celery_app import celery
+from src.tasks.generate_trending import trending_time_ranges, fetch_trending_listen_counts, \
+    update_listen_counts, update_trending_tracks, get_trending_genres, get_genre_track_ids
+
+logger = logging.getLogger(__name__)
+
+
+######## HELPER FUNCTIONS ########
+def refresh_trending(self, db):
+    # Listen counts are ingested and rankings recomputed one time range at a time, readers keep
+    # seeing the previous ranking of a time range until its transaction commits
+    with db.scoped_session() as session:
+        genre_track_ids = {
+            genre: get_genre_track_ids(session, genre) for genre in get_trending_genres(session)
+        }
+
+    for time_range in trending_time_ranges:
+        start_time = time.time()
+        listen_counts = fetch_trending_listen_counts(time_range, genre_track_ids)
+        with db.scoped_session() as session:
+            # Keep ranking from the last ingested listen counts when the identity service is unavailable
+            if listen_counts is not None:
+                update_listen_counts(session, time_range, listen_counts)
+            update_trending_tracks(session, time_range)
+        logger.info(
+            f"index_trending.py | Refreshed trending {time_range} from {len(listen_counts or {})} "
+            f"listen counts in {time.time() - start_time}s"
+        )
+
+
+######## CELERY TASKS ########
+@celery.task(name="index_trending", bind=True)
+def index_trending(self):
+    # Cache custom task class properties
+    # Details regarding custom task context can be found in wiki
+    # Custom Task definition can be found in src/__init__.py
+    db = index_trending.db
+    redis = index_trending.redis
+    # Define lock acquired boolean
+    have_lock = False
+    # Define redis lock object
+    update_lock = redis.lock("index_trending_lock", timeout=7200)
+    try:
+        # Attempt to acquire lock - do not block if unable to acquire
+        have_lock = update_lock.acquire(blocking=False)
+        if have_lock:
+            refresh_trending(self, db)
+        else:
+            logger.info("index_trending.py | Failed to acquire index_trending_lock")
+    except Exception as e:
+        logger.error("index_trending.py | Fatal error in main loop", exc_info=True)
+        raise e
+    finally:
+        if have_lock:
+            update_lock.release()
@@ -0,0 +1,207 @@
+import logging
+import time
+import sqlalchemy
+from src.models import User, Track, Playlist
+from src.utils.redis_constants import lexeme_dict_dirty_ids_redis_key_prefix, \
+    lexeme_dict_dirty_since_redis_key
+
+logger = logging.getLogger(__name__)
+
+# The lexeme dictionaries used by search are plain tables maintained incrementally.
+# Rows for changed ids are deleted and rebuilt from the current entity rows, so the cost of an update
+# depends on the number of changed entities instead of the size of the catalogue.
+# The indexer only queues changed ids in redis, the update_lexeme_dict task rebuilds them in bulk.
+# The select statements below must stay in sync with the definitions in the lexeme_dict_tables migration.
+
+track_lexeme_select = """
+    SELECT * FROM (
+      SELECT
+        t.track_id,
+        t.title as track_title,
+        unnest(
+          tsvector_to_array(
+            to_tsvector(
+              'audius_ts_config',
+              replace(COALESCE(t."title", ''), '&', 'and')
+            )
+          )
+        ) as word
+      FROM
+          tracks t
+      INNER JOIN users u ON t.owner_id = u.user_id
+      WHERE
+        t.is_current = true and
+        t.is_unlisted = false and
+        t.is_delete = false and
+        t.stem_of IS NULL and
+        u.is_current = true
+        {filter}
+      GROUP BY t.track_id, t.title
+    ) AS words
+"""
+
+user_lexeme_select = """
+    SELECT * FROM (
+      SELECT
+        u.user_id,
+        u.name as user_name,
+        unnest(
+          tsvector_to_array(
+            to_tsvector(
+              'audius_ts_config',
+              replace(COALESCE(u.name, ''), '&', 'and')
+            ) ||
+            to_tsvector(
+              'audius_ts_config',
+              COALESCE(u.handle, '')
+            )
+          )
+        ) as word
+      FROM
+          users u
+      WHERE
+        u.is_current = true
+        {filter}
+      GROUP BY u.user_id, u.name, u.handle
+    ) AS words
+"""
+
+playlist_lexeme_select = """
+    SELECT * FROM (
+      SELECT
+        p.playlist_id,
+        p.playlist_name,
+        unnest(
+          tsvector_to_array(
+            to_tsvector(
+              'audius_ts_config',
+              replace(COALESCE(p.playlist_name, ''), '&', 'and')
+            )
+          )
+        ) as word
+      FROM
+          playlists p
+      INNER JOIN users u ON p.playlist_owner_id = u.user_id
+      WHERE
+          p.is_current = true and
+          p.is_album = {is_album} and
+          p.is_private = false and
+          p.is_delete = false and
+          u.is_current = true
+          {filter}
+      GROUP BY p.playlist_id, p.playlist_name
+    ) AS words
+"""
+
+# table name -> (id column, select statement)
+lexeme_dicts = {
+    "track_lexeme_dict": ("track_id", track_lexeme_select),
+    "user_lexeme_dict": ("user_id", user_lexeme_select),
+    "playlist_lexeme_dict": ("playlist_id", playlist_lexeme_select.format(is_album="false", filter="{filter}")),
+    "album_lexeme_dict": ("playlist_id", playlist_lexeme_select.format(is_album="true", filter="{filter}")),
+}
+
+# entity type -> lexeme dictionaries keyed by that entity's id
+lexeme_dicts_by_entity = {
+    "track": ["track_lexeme_dict"],
+    "user": ["user_lexeme_dict"],
+    "playlist": ["playlist_lexeme_dict", "album_lexeme_dict"],
+}
+
+# alias of the entity table in each select statement
+entity_aliases = {"track": "t", "user": "u", "playlist": "p"}
+
+
+def empty_lexeme_changes():
+    return {"track": set(), "user": set(), "playlist": set()}
+
+
+def add_lexeme_changes(lexeme_changes, models):
+    """ Record the ids of the users, tracks and playlists in models as needing a lexeme update
+
+        Args:
+            lexeme_changes: dict returned by empty_lexeme_changes, updated in place
+            models: iterable of model instances written or reverted by the indexer
+    """
+    for model in models:
+        if isinstance(model, Track):
+            lexeme_changes["track"].add(model.track_id)
+        elif isinstance(model, User):
+            lexeme_changes["user"].add(model.user_id)
+        elif isinstance(model, Playlist):
+            lexeme_changes["playlist"].add(model.playlist_id)
+    return lexeme_changes
+
+
+def get_dirty_ids_redis_key(entity_type):
+    return f"{lexeme_dict_dirty_ids_redis_key_prefix}:{entity_type}"
+
+
+def mark_lexeme_changes_dirty(redis, lexeme_changes, dirty_since=None):
+    """ Queue changed entities for the update_lexeme_dict task, call once the changes are committed """
+    pipe = redis.pipeline()
+    has_changes = False
+    for entity_type, entity_ids in lexeme_changes.items():
+        if entity_ids:
+            has_changes = True
+            pipe.sadd(get_dirty_ids_redis_key(entity_type), *entity_ids)
+    if has_changes:
+        # Only the oldest pending change determines how stale search results are
+        pipe.set(lexeme_dict_dirty_since_redis_key, dirty_since or time.time(), nx=True)
+        pipe.execute()
+
+
+def pop_dirty_lexeme_changes(redis):
+    """ Atomically take every queued entity id
+
+        Returns:
+            tuple of (lexeme changes dict, timestamp of the oldest queued change or None)
+    """
+    entity_types = list(lexeme_dicts_by_entity.keys())
+    pipe = redis.pipeline()
+    for entity_type in entity_types:
+        pipe.smembers(get_dirty_ids_redis_key(entity_type))
+        pipe.delete(get_dirty_ids_redis_key(entity_type))
+    pipe.get(lexeme_dict_dirty_since_redis_key)
+    pipe.delete(lexeme_dict_dirty_since_redis_key)
+    results = pipe.execute()
+
+    lexeme_changes = empty_lexeme_changes()
+    for i, entity_type in enumerate(entity_types):
+        lexeme_changes[entity_type] = {int(entity_id) for entity_id in results[2 * i]}
+    dirty_since = results[2 * len(entity_types)]
+    if dirty_since is not None:
+        dirty_since = float(dirty_since)
+    return (lexeme_changes, dirty_since)
+
+
+def update_lexeme_dicts(session, lexeme_changes):
+    """ Rebuild the lexeme dictionary rows of the changed entities from their current rows.
+        Pending changes must be flushed to the session beforehand.
+    """
+    for entity_type, entity_ids in lexeme_changes.items():
+        if not entity_ids:
+            continue
+        entity_ids = list(entity_ids)
+        for table_name in lexeme_dicts_by_entity[entity_type]:
+            id_column, select_statement = lexeme_dicts[table_name]
+            session.execute(
+                sqlalchemy.text(f"DELETE FROM {table_name} WHERE {id_column} = ANY(:entity_ids)"),
+                {"entity_ids": entity_ids}
+            )
+            id_filter = f"and {entity_aliases[entity_type]}.{id_column} = ANY(:entity_ids)"
+            session.execute(
+                sqlalchemy.text(
+                    f"INSERT INTO {table_name} {select_statement.format(filter=id_filter)}"
+                ),
+                {"entity_ids": entity_ids}
+            )
+        logger.info(f"lexeme_dict.py | Updated lexemes for {len(entity_ids)} {entity_type}s")
+
+
+def rebuild_lexeme_dicts(session):
+    """ Rebuild every lexeme dictionary from scratch """
+    for table_name, (_, select_statement) in lexeme_dicts.items():
+        session.execute(f"DELETE FROM {table_name}")
+        session.execute(f"INSERT INTO {table_name} {select_statement.format(filter='')}")
+        logger.info(f"lexeme_dict.py | Rebuilt {table_name}")
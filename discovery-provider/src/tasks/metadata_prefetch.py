@@ -0,0 +1,113 @@
+import logging
+import concurrent.futures
+from src.models import BlacklistedIPLD
+from src.tasks.metadata import track_metadata_format, user_metadata_format
+from src.tasks.tracks import track_event_types_lookup, get_track_metadata_multihash
+from src.tasks.users import prefetch_current_users
+from src.utils import helpers
+from src.utils.user_event_constants import user_event_types_arr, user_event_types_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def get_metadata_multihashes(track_factory_txs, user_factory_txs, current_users):
+    """ Collect the metadata multihashes referenced by track and user events
+
+        User metadata is only read for creators with a handle, so the user events are replayed
+        in the order users.py applies them, from the current state of each user, and only the
+        multihashes of users that are creators at that point are collected.
+
+        Args:
+            track_factory_txs, user_factory_txs: decoded events of each transaction, keyed by event
+                type, in the order they are applied
+            current_users: dict of user id -> (is_creator, handle, metadata_multihash) of the
+                current record of the users changed by user_factory_txs
+
+        Returns:
+            dict of multihash -> metadata format used to parse it
+    """
+    multihashes = {}
+
+    for tx_events in track_factory_txs:
+        for event_type in [track_event_types_lookup["new_track"], track_event_types_lookup["update_track"]]:
+            for entry in tx_events.get(event_type, []):
+                multihashes[get_track_metadata_multihash(entry["args"])] = track_metadata_format
+
+    users = {
+        user_id: {"is_creator": is_creator, "handle": handle, "metadata_multihash": metadata_multihash}
+        for user_id, (is_creator, handle, metadata_multihash) in current_users.items()
+    }
+    for tx_events in user_factory_txs:
+        for event_type in user_event_types_arr:
+            for entry in tx_events.get(event_type, []):
+                event_args = entry["args"]
+                user = users.setdefault(
+                    event_args._userId, {"is_creator": False, "handle": None, "metadata_multihash": None}
+                )
+                if event_type == user_event_types_lookup["add_user"]:
+                    user["handle"] = helpers.bytes32_to_str(event_args._handle)
+                elif event_type == user_event_types_lookup["update_multihash"]:
+                    user["metadata_multihash"] = helpers.multihash_digest_to_cid(event_args._multihashDigest)
+                elif event_type == user_event_types_lookup["update_is_creator"]:
+                    user["is_creator"] = event_args._isCreator
+
+                # users.get_metadata_overrides_from_ipfs reads the metadata after every event
+                if user["is_creator"] and user["metadata_multihash"] and user["handle"]:
+                    multihashes[user["metadata_multihash"]] = user_metadata_format
+
+    return multihashes
+
+
+def prefetch_ipfs_metadata(update_task, db, track_factory_txs, user_factory_txs):
+    """ Concurrently fetch the metadata of every track and user event in the block window,
+        so parsing events does not wait on IPFS one multihash at a time.
+
+        Blacklisted multihashes are skipped. Each fetch is bounded by its own timeout, multihashes
+        that fail or time out are left out and fetched synchronously by the event parsers, which
+        also handles peering.
+
+        Returns:
+            dict of multihash -> metadata
+    """
+    with db.scoped_session() as session:
+        current_users = {
+            user_id: (user.is_creator, user.handle, user.metadata_multihash)
+            for user_id, user in prefetch_current_users(session, user_factory_txs).items()
+        }
+        multihashes = get_metadata_multihashes(track_factory_txs, user_factory_txs, current_users)
+        if not multihashes:
+            return {}
+
+        blacklisted = (
+            session.query(BlacklistedIPLD.ipld)
+            .filter(BlacklistedIPLD.ipld.in_(list(multihashes.keys())))
+            .all()
+        )
+    for (ipld,) in blacklisted:
+        multihashes.pop(ipld, None)
+    if not multihashes:
+        return {}
+
+    max_workers = int(update_task.shared_config["discprov"]["ipfs_metadata_prefetch_workers"])
+    timeout = int(update_task.shared_config["discprov"]["ipfs_metadata_prefetch_timeout"])
+    ipfs_client = update_task.ipfs_client
+
+    # get_metadata gives up `timeout` seconds after the worker starts it, so every fetch is done
+    # when the executor exits and no thread is left fetching a multihash the parsers fetch again
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(ipfs_client.get_metadata, multihash, metadata_format, timeout): multihash
+            for multihash, metadata_format in multihashes.items()
+        }
+
+    ipfs_metadata = {}
+    for future, multihash in futures.items():
+        try:
+            ipfs_metadata[multihash] = future.result()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"metadata_prefetch.py | Failed to prefetch {multihash}, {e}")
+
+    logger.info(
+        f"metadata_prefetch.py | Prefetched {len(ipfs_metadata)}/{len(multihashes)} metadata multihashes"
+    )
+    return ipfs_metadata
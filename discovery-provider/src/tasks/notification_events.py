@@ -0,0 +1,595 @@
+import logging
+import sqlalchemy
+from src.models import Follow, Save, SaveType, Playlist, Track, Repost, RepostType, Remix, NotificationEvent
+from src.queries import response_name_constants as const
+
+logger = logging.getLogger(__name__)
+
+def get_owner_ids(session, entity_type, entity_ids):
+    """
+    Fetches the owner user ids of the requested entity_type/entity_ids in a single query
+
+    Args:
+        session: (DB)
+        entity_type: (string) Must be either 'track' | 'album' | 'playlist
+        entity_ids: (Array<int>) The ids of the 'entity_type'
+
+    Returns:
+        owner_ids: (dict) Mapping of entity id to the user id of its owner,
+            deleted or missing entities are left out
+    """
+    if not entity_ids:
+        return {}
+    if entity_type == 'track':
+        owner_id_query = session.query(Track.track_id, Track.owner_id).filter(
+            Track.track_id.in_(entity_ids),
+            Track.is_delete == False,
+            Track.is_current == True)
+    elif entity_type in ('album', 'playlist'):
+        owner_id_query = session.query(Playlist.playlist_id, Playlist.playlist_owner_id).filter(
+            Playlist.playlist_id.in_(entity_ids),
+            Playlist.is_delete == False,
+            Playlist.is_current == True,
+            Playlist.is_album == (entity_type == 'album'))
+    else:
+        return {}
+    return dict(owner_id_query.all())
+
+def get_prev_entries(session, entity_type, entries):
+    """
+    Fetches the previous version of each of the given track/playlist entries in a single query
+
+    Args:
+        session: (DB)
+        entity_type: (string) Must be either 'track' | 'playlist'
+        entries: (Array<Track | Playlist>) Entries to fetch the previous version of
+
+    Returns:
+        prev_entries: (dict) Mapping of (entity id, blocknumber) of each entry to the columns of
+            the latest version of the entity before that blocknumber, if any
+    """
+    if not entries:
+        return {}
+    if entity_type == 'track':
+        table, id_column, columns = 'tracks', 'track_id', 'p.is_unlisted, p.remix_of'
+        entity_ids = [entry.track_id for entry in entries]
+    else:
+        table, id_column, columns = 'playlists', 'playlist_id', 'p.is_private'
+        entity_ids = [entry.playlist_id for entry in entries]
+
+    prev_entry_results = session.execute(
+        sqlalchemy.text(f"""
+            SELECT DISTINCT ON (e.entity_id, e.blocknumber)
+              e.entity_id, e.blocknumber, {columns}
+            FROM unnest(CAST(:entity_ids AS integer[]), CAST(:blocknumbers AS integer[]))
+              AS e(entity_id, blocknumber)
+            JOIN {table} p ON p.{id_column} = e.entity_id and p.blocknumber < e.blocknumber
+            ORDER BY e.entity_id, e.blocknumber, p.blocknumber DESC
+        """),
+        {"entity_ids": entity_ids, "blocknumbers": [entry.blocknumber for entry in entries]}
+    )
+    return {
+        (prev_entry.entity_id, prev_entry.blocknumber): prev_entry
+        for prev_entry in prev_entry_results
+    }
+
+def get_cosign_remix_notifications(session, max_block_number, remix_tracks):
+    """
+    Get the notifications for remix tracks that are reposted/favorited by the parent remix author
+
+    Args:
+        session: (DB)
+        max_block_number: (int)
+        remix_tracks: (Array<{ }>)
+            'user_id'
+            'item_id'
+            const.notification_blocknumber
+            const.notification_timestamp
+            'item_owner_id'
+
+    Returns:
+        Array of cosign notifications
+
+    """
+    if not remix_tracks:
+        return []
+
+    remix_notifications = []
+    remix_track_ids = [r['item_id'] for r in remix_tracks]
+
+    # Query for all the parent tracks of the remix tracks
+    tracks_subquery = (
+        session.query(Track)
+        .filter(
+            Track.is_unlisted == False,
+            Track.is_delete == False,
+            Track.is_current == True
+        )
+        .subquery()
+    )
+
+    parent_tracks = (
+        session.query(
+            Remix.child_track_id,
+            Remix.parent_track_id,
+            tracks_subquery.c.owner_id
+        )
+        .join(
+            tracks_subquery,
+            Remix.parent_track_id == tracks_subquery.c.track_id
+        )
+        .filter(
+            Remix.child_track_id.in_(remix_track_ids)
+        )
+        .all()
+    )
+    # Mapping of parent track users to child track to parent track
+    parent_track_users_to_remixes = {}
+    for track_parent in parent_tracks:
+        [remix_track_id, remix_parent_id, remix_parent_user_id] = track_parent
+        if not remix_parent_user_id in parent_track_users_to_remixes:
+            parent_track_users_to_remixes[remix_parent_user_id] = {
+                remix_track_id: remix_parent_id
+            }
+        else:
+            parent_track_users_to_remixes[remix_parent_user_id][remix_track_id] = remix_parent_id
+
+    for remix_track in remix_tracks:
+        user_id = remix_track['user_id']
+        track_id = remix_track['item_id']
+
+        if (user_id in parent_track_users_to_remixes and track_id in parent_track_users_to_remixes[user_id]):
+            remix_notifications.append({
+                const.notification_type: const.notification_type_remix_cosign,
+                const.notification_blocknumber: remix_track[const.notification_blocknumber],
+                const.notification_timestamp: remix_track[const.notification_timestamp],
+                const.notification_initiator: user_id,
+                const.notification_metadata: {
+                    const.notification_entity_id: track_id,
+                    const.notification_entity_type: 'track',
+                    const.notification_entity_owner_id: remix_track['item_owner_id']
+                }
+            })
+
+    return remix_notifications
+
+def get_block_notifications(session, min_block_number, max_block_number):
+    """
+    Derives the notifications of the blocks in (min_block_number, max_block_number] from the
+    current follows, saves, reposts, tracks and playlists
+
+    Returns:
+        Array of notifications, ordered by blocknumber
+    """
+    notifications_unsorted = []
+    # Query relevant follow information
+    follow_query = session.query(Follow)
+
+    # Impose min block number restriction
+    follow_query = follow_query.filter(
+        Follow.is_current == True,
+        Follow.is_delete == False,
+        Follow.blocknumber > min_block_number,
+        Follow.blocknumber <= max_block_number)
+
+    follow_results = follow_query.all()
+    # Represents all follow notifications
+    follow_notifications = []
+    for entry in follow_results:
+        follow_notif = {
+            const.notification_type: const.notification_type_follow,
+            const.notification_blocknumber: entry.blocknumber,
+            const.notification_timestamp: entry.created_at,
+            const.notification_initiator: entry.follower_user_id,
+            const.notification_metadata: {
+                const.notification_follower_id: entry.follower_user_id,
+                const.notification_followee_id: entry.followee_user_id
+            }
+        }
+        follow_notifications.append(follow_notif)
+
+    notifications_unsorted.extend(follow_notifications)
+
+    # Query relevant favorite information
+    favorites_query = session.query(Save)
+    favorites_query = favorites_query.filter(
+        Save.is_current == True,
+        Save.is_delete == False,
+        Save.blocknumber > min_block_number,
+        Save.blocknumber <= max_block_number)
+    favorite_results = favorites_query.all()
+
+    # Resolve the owners of all the favorited entities at once, one query per entity type
+    favorite_owner_ids = {
+        save_type: get_owner_ids(
+            session,
+            save_type,
+            list({entry.save_item_id for entry in favorite_results if entry.save_type == save_type})
+        )
+        for save_type in [SaveType.track, SaveType.album, SaveType.playlist]
+    }
+
+    # List of favorite notifications
+    favorite_notifications = []
+    favorite_remix_tracks = []
+
+    for entry in favorite_results:
+        favorite_notif = {
+            const.notification_type: const.notification_type_favorite,
+            const.notification_blocknumber: entry.blocknumber,
+            const.notification_timestamp: entry.created_at,
+            const.notification_initiator: entry.user_id
+        }
+        save_type = entry.save_type
+        save_item_id = entry.save_item_id
+        metadata = {
+            const.notification_entity_type: save_type.value,
+            const.notification_entity_id: save_item_id
+        }
+
+        # NOTE if deleted, the favorite can still exist
+        if save_type == SaveType.track:
+            owner_id = favorite_owner_ids[SaveType.track].get(save_item_id)
+            if not owner_id:
+                continue
+            metadata[const.notification_entity_owner_id] = owner_id
+
+            favorite_remix_tracks.append({
+                const.notification_blocknumber: entry.blocknumber,
+                const.notification_timestamp: entry.created_at,
+                'user_id': entry.user_id,
+                'item_owner_id': owner_id,
+                'item_id': save_item_id
+            })
+
+        elif save_type == SaveType.album:
+            owner_id = favorite_owner_ids[SaveType.album].get(save_item_id)
+            if not owner_id:
+                continue
+            metadata[const.notification_entity_owner_id] = owner_id
+
+        elif save_type == SaveType.playlist:
+            owner_id = favorite_owner_ids[SaveType.playlist].get(save_item_id)
+            if not owner_id:
+                continue
+            metadata[const.notification_entity_owner_id] = owner_id
+
+        favorite_notif[const.notification_metadata] = metadata
+        favorite_notifications.append(favorite_notif)
+    notifications_unsorted.extend(favorite_notifications)
+
+    favorite_remix_notifications = get_cosign_remix_notifications(
+        session, max_block_number, favorite_remix_tracks)
+    notifications_unsorted.extend(favorite_remix_notifications)
+
+    #
+    # Query relevant repost information
+    #
+    repost_query = session.query(Repost)
+    repost_query = repost_query.filter(
+        Repost.is_current == True,
+        Repost.is_delete == False,
+        Repost.blocknumber > min_block_number,
+        Repost.blocknumber <= max_block_number)
+    repost_results = repost_query.all()
+
+    # Resolve the owners of all the reposted entities at once, one query per entity type
+    repost_owner_ids = {
+        repost_type: get_owner_ids(
+            session,
+            repost_type,
+            list({entry.repost_item_id for entry in repost_results if entry.repost_type == repost_type})
+        )
+        for repost_type in [RepostType.track, RepostType.album, RepostType.playlist]
+    }
+
+    # List of repost notifications
+    repost_notifications = []
+
+    # Reposted tracks to check for remix cosigns
+    repost_remix_tracks = []
+
+    for entry in repost_results:
+        repost_notif = {
+            const.notification_type: const.notification_type_repost,
+            const.notification_blocknumber: entry.blocknumber,
+            const.notification_timestamp: entry.created_at,
+            const.notification_initiator: entry.user_id
+        }
+        repost_type = entry.repost_type
+        repost_item_id = entry.repost_item_id
+        metadata = {
+            const.notification_entity_type: repost_type.value,
+            const.notification_entity_id: repost_item_id
+        }
+        if repost_type == RepostType.track:
+            owner_id = repost_owner_ids[RepostType.track].get(repost_item_id)
+            if not owner_id:
+                continue
+            metadata[const.notification_entity_owner_id] = owner_id
+            repost_remix_tracks.append({
+                const.notification_blocknumber: entry.blocknumber,
+                const.notification_timestamp: entry.created_at,
+                'user_id': entry.user_id,
+                'item_owner_id': owner_id,
+                'item_id': repost_item_id
+            })
+
+        elif repost_type == RepostType.album:
+            owner_id = repost_owner_ids[RepostType.album].get(repost_item_id)
+            if not owner_id:
+                continue
+            metadata[const.notification_entity_owner_id] = owner_id
+
+        elif repost_type == RepostType.playlist:
+            owner_id = repost_owner_ids[RepostType.playlist].get(repost_item_id)
+            if not owner_id:
+                continue
+            metadata[const.notification_entity_owner_id] = owner_id
+
+        repost_notif[const.notification_metadata] = metadata
+        repost_notifications.append(repost_notif)
+
+    # Append repost notifications
+    notifications_unsorted.extend(repost_notifications)
+
+    repost_remix_notifications = get_cosign_remix_notifications(
+        session, max_block_number, repost_remix_tracks)
+    notifications_unsorted.extend(repost_remix_notifications)
+
+    # Query relevant created entity notification - tracks/albums/playlists
+    created_notifications = []
+
+    # Query relevant created tracks for remix information
+    remix_created_notifications = []
+
+    # Aggregate track notifs
+    tracks_query = session.query(Track)
+    # TODO: Is it valid to use Track.is_current here? Might not be the right info...
+    tracks_query = tracks_query.filter(
+        Track.is_unlisted == False,
+        Track.is_delete == False,
+        Track.stem_of == None,
+        Track.blocknumber > min_block_number,
+        Track.blocknumber <= max_block_number)
+    tracks_query = tracks_query.filter(Track.created_at == Track.updated_at)
+    track_results = tracks_query.all()
+    for entry in track_results:
+        track_notif = {
+            const.notification_type: const.notification_type_create,
+            const.notification_blocknumber: entry.blocknumber,
+            const.notification_timestamp: entry.created_at,
+            const.notification_initiator: entry.owner_id,
+            # TODO: is entity owner id necessary for tracks?
+            const.notification_metadata: {
+                const.notification_entity_type: 'track',
+                const.notification_entity_id: entry.track_id,
+                const.notification_entity_owner_id: entry.owner_id
+            }
+        }
+        created_notifications.append(track_notif)
+
+        if entry.remix_of:
+            # Add notification to remix track owner
+            parent_remix_tracks = [t['parent_track_id'] for t in entry.remix_of['tracks']]
+            remix_track_parents = (
+                session.query(Track.owner_id, Track.track_id)
+                .filter(
+                    Track.track_id.in_(parent_remix_tracks),
+                    Track.is_unlisted == False,
+                    Track.is_delete == False,
+                    Track.is_current == True
+                )
+                .all()
+            )
+            for remix_track_parent in remix_track_parents:
+                [remix_track_parent_owner, remix_track_parent_id] = remix_track_parent
+                remix_notif = {
+                    const.notification_type: const.notification_type_remix_create,
+                    const.notification_blocknumber: entry.blocknumber,
+                    const.notification_timestamp: entry.created_at,
+                    const.notification_initiator: entry.owner_id,
+                    # TODO: is entity owner id necessary for tracks?
+                    const.notification_metadata: {
+                        const.notification_entity_type: 'track',
+                        const.notification_entity_id: entry.track_id,
+                        const.notification_entity_owner_id: entry.owner_id,
+                        const.notification_remix_parent_track_user_id: remix_track_parent_owner,
+                        const.notification_remix_parent_track_id: remix_track_parent_id
+                    }
+                }
+                remix_created_notifications.append(remix_notif)
+
+    # Handle track update notifications
+    # TODO: Consider switching blocknumber for updated at?
+    updated_tracks_query = session.query(Track)
+    updated_tracks_query = updated_tracks_query.filter(
+        Track.is_unlisted == False,
+        Track.stem_of == None,
+        Track.created_at != Track.updated_at,
+        Track.blocknumber > min_block_number,
+        Track.blocknumber <= max_block_number)
+    updated_tracks = updated_tracks_query.all()
+    prev_tracks = get_prev_entries(session, 'track', updated_tracks)
+    for entry in updated_tracks:
+        # Previous unlisted entry indicates transition to public, triggering a notification
+        prev_entry = prev_tracks.get((entry.track_id, entry.blocknumber))
+        if not prev_entry:
+            continue
+
+        # Tracks that were unlisted and turned to public
+        if prev_entry.is_unlisted == True:
+            track_notif = {
+                const.notification_type: const.notification_type_create,
+                const.notification_blocknumber: entry.blocknumber,
+                const.notification_timestamp: entry.created_at,
+                const.notification_initiator: entry.owner_id,
+                # TODO: is entity owner id necessary for tracks?
+                const.notification_metadata: {
+                    const.notification_entity_type: 'track',
+                    const.notification_entity_id: entry.track_id,
+                    const.notification_entity_owner_id: entry.owner_id
+                }
+            }
+            created_notifications.append(track_notif)
+
+        # Tracks that were not remixes and turned into remixes
+        if not prev_entry.remix_of and entry.remix_of:
+            # Add notification to remix track owner
+            parent_remix_tracks = [t['parent_track_id'] for t in entry.remix_of['tracks']]
+            remix_track_parents = (
+                session.query(Track.owner_id, Track.track_id)
+                .filter(
+                    Track.track_id.in_(parent_remix_tracks),
+                    Track.is_unlisted == False,
+                    Track.is_delete == False,
+                    Track.is_current == True
+                )
+                .all()
+            )
+            for remix_track_parent in remix_track_parents:
+                [remix_track_parent_owner, remix_track_parent_id] = remix_track_parent
+                remix_notif = {
+                    const.notification_type: const.notification_type_remix_create,
+                    const.notification_blocknumber: entry.blocknumber,
+                    const.notification_timestamp: entry.created_at,
+                    const.notification_initiator: entry.owner_id,
+                    # TODO: is entity owner id necessary for tracks?
+                    const.notification_metadata: {
+                        const.notification_entity_type: 'track',
+                        const.notification_entity_id: entry.track_id,
+                        const.notification_entity_owner_id: entry.owner_id,
+                        const.notification_remix_parent_track_user_id: remix_track_parent_owner,
+                        const.notification_remix_parent_track_id: remix_track_parent_id
+                    }
+                }
+                remix_created_notifications.append(remix_notif)
+
+    notifications_unsorted.extend(remix_created_notifications)
+
+    # Aggregate playlist/album notifs
+    collection_query = session.query(Playlist)
+    # TODO: Is it valid to use is_current here? Might not be the right info...
+    collection_query = collection_query.filter(
+        Playlist.is_delete == False,
+        Playlist.is_private == False,
+        Playlist.blocknumber > min_block_number,
+        Playlist.blocknumber <= max_block_number)
+    collection_query = collection_query.filter(Playlist.created_at == Playlist.updated_at)
+    collection_results = collection_query.all()
+
+    for entry in collection_results:
+        collection_notif = {
+            const.notification_type: const.notification_type_create,
+            const.notification_blocknumber: entry.blocknumber,
+            const.notification_timestamp: entry.created_at,
+            const.notification_initiator: entry.playlist_owner_id
+        }
+        metadata = {
+            const.notification_entity_id: entry.playlist_id,
+            const.notification_entity_owner_id: entry.playlist_owner_id,
+            const.notification_collection_content: entry.playlist_contents
+        }
+
+        if entry.is_album:
+            metadata[const.notification_entity_type] = 'album'
+        else:
+            metadata[const.notification_entity_type] = 'playlist'
+        collection_notif[const.notification_metadata] = metadata
+        created_notifications.append(collection_notif)
+
+    # Playlists that were private and turned to public aka 'published'
+    # TODO: Consider switching blocknumber for updated at?
+    publish_playlists_query = session.query(Playlist)
+    publish_playlists_query = publish_playlists_query.filter(
+        Playlist.is_private == False,
+        Playlist.created_at != Playlist.updated_at,
+        Playlist.blocknumber > min_block_number,
+        Playlist.blocknumber <= max_block_number)
+    publish_playlist_results = publish_playlists_query.all()
+    prev_playlists = get_prev_entries(session, 'playlist', publish_playlist_results)
+    for entry in publish_playlist_results:
+        # Previous private entry indicates transition to public, triggering a notification
+        prev_entry = prev_playlists.get((entry.playlist_id, entry.blocknumber))
+        if prev_entry and prev_entry.is_private == True:
+            publish_playlist_notif = {
+                const.notification_type: const.notification_type_create,
+                const.notification_blocknumber: entry.blocknumber,
+                const.notification_timestamp: entry.created_at,
+                const.notification_initiator: entry.playlist_owner_id
+            }
+            metadata = {
+                const.notification_entity_id: entry.playlist_id,
+                const.notification_entity_owner_id: entry.playlist_owner_id,
+                const.notification_collection_content: entry.playlist_contents,
+                const.notification_entity_type: 'playlist'
+            }
+            publish_playlist_notif[const.notification_metadata] = metadata
+            created_notifications.append(publish_playlist_notif)
+
+    notifications_unsorted.extend(created_notifications)
+
+    # Stable sort, notifications of a block keep the order they were derived in
+    return sorted(notifications_unsorted, key=lambda i: i[const.notification_blocknumber])
+
+def update_notification_events(session, min_block_number, max_block_number):
+    """
+    Appends the notifications of the blocks in (min_block_number, max_block_number] to the
+    notification_events table. Pending changes must be flushed to the session beforehand.
+    """
+    block_notifications = get_block_notifications(session, min_block_number, max_block_number)
+
+    event_index = 0
+    prev_blocknumber = None
+    for notification in block_notifications:
+        blocknumber = notification[const.notification_blocknumber]
+        event_index = event_index + 1 if blocknumber == prev_blocknumber else 0
+        prev_blocknumber = blocknumber
+
+        metadata = notification[const.notification_metadata]
+        session.add(NotificationEvent(
+            blocknumber=blocknumber,
+            event_index=event_index,
+            type=notification[const.notification_type],
+            initiator=notification[const.notification_initiator],
+            entity_type=metadata.get(const.notification_entity_type),
+            entity_id=metadata.get(const.notification_entity_id),
+            entity_owner_id=metadata.get(const.notification_entity_owner_id),
+            event_metadata=metadata,
+            timestamp=notification[const.notification_timestamp]
+        ))
+    logger.info(
+        f"notification_events.py | Added {len(block_notifications)} notification events for blocks "
+        f"{min_block_number + 1} to {max_block_number}"
+    )
+
+def revert_notification_events(session, block_numbers):
+    session.query(NotificationEvent).filter(
+        NotificationEvent.blocknumber.in_(block_numbers)
+    ).delete(synchronize_session=False)
+
+def get_notification_events(session, min_block_number, max_block_number):
+    """
+    Range read of the notifications of the blocks in (min_block_number, max_block_number]
+
+    Returns:
+        Array of notifications, ordered by blocknumber
+    """
+    notification_events = (
+        session.query(NotificationEvent)
+        .filter(
+            NotificationEvent.blocknumber > min_block_number,
+            NotificationEvent.blocknumber <= max_block_number)
+        .order_by(NotificationEvent.blocknumber, NotificationEvent.event_index)
+        .all()
+    )
+    return [
+        {
+            const.notification_type: event.type,
+            const.notification_blocknumber: event.blocknumber,
+            const.notification_timestamp: event.timestamp,
+            const.notification_initiator: event.initiator,
+            const.notification_metadata: event.event_metadata
+        }
+        for event in notification_events
+    ]
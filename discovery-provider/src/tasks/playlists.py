@@ -1,9 +1,9 @@
 import logging
 from datetime import datetime
 from sqlalchemy.orm.session import make_transient
-from src import contract_addresses
 from src.utils import helpers
 from src.models import Playlist
+from src.tasks.current_versions import invalidate_current_versions, playlist_key_columns
 from src.utils.playlist_event_constants import playlist_event_types_arr, playlist_event_types_lookup
 
 logger = logging.getLogger(__name__)
@@ -12,28 +12,27 @@ logger = logging.getLogger(__name__)
 def playlist_state_update(
         self, update_task, session, playlist_factory_txs, block_number, block_timestamp
 ):
-    """Return int representing number of Playlist model state changes found in transaction."""
+    """Return int representing number of Playlist model state changes found in transaction.
+
+    playlist_factory_txs holds the decoded events of each transaction, keyed by event type.
+    """
     num_total_changes = 0
     if not playlist_factory_txs:
         return num_total_changes
 
-    playlist_abi = update_task.abi_values["PlaylistFactory"]["abi"]
-    playlist_contract = update_task.web3.eth.contract(
-        address=contract_addresses["playlist_factory"], abi=playlist_abi
-    )
+    # Load the current records of every playlist changed in this block at once
+    current_playlists = prefetch_current_playlists(session, playlist_factory_txs)
 
     playlist_events_lookup = {}
-    for tx_receipt in playlist_factory_txs:
+    for tx_events in playlist_factory_txs:
         for event_type in playlist_event_types_arr:
-            playlist_events_tx = getattr(
-                playlist_contract.events, event_type
-            )().processReceipt(tx_receipt)
+            playlist_events_tx = tx_events.get(event_type, [])
             for entry in playlist_events_tx:
                 playlist_id = entry["args"]._playlistId
 
                 if playlist_id not in playlist_events_lookup:
                     existing_playlist_entry = lookup_playlist_record(
-                        update_task, session, entry, block_number
+                        update_task, session, current_playlists, entry, block_number
                     )
                     playlist_events_lookup[playlist_id] = {
                         "playlist": existing_playlist_entry,
@@ -53,33 +52,40 @@ def playlist_state_update(
 
             num_total_changes += len(playlist_events_tx)
 
+    invalidate_old_playlists(session, list(playlist_events_lookup.keys()))
     for playlist_id, value_obj in playlist_events_lookup.items():
         logger.info(f"playlists.py | Adding {value_obj['playlist']})")
-        invalidate_old_playlist(session, playlist_id)
         session.add(value_obj["playlist"])
 
     return num_total_changes
 
 
-def lookup_playlist_record(update_task, session, entry, block_number):
+def prefetch_current_playlists(session, playlist_factory_txs):
+    """ Returns playlist id --> current Playlist of the playlists changed by the playlist factory transactions """
+    playlist_ids = {
+        entry["args"]._playlistId
+        for tx_events in playlist_factory_txs
+        for event_type in playlist_event_types_arr
+        for entry in tx_events.get(event_type, [])
+    }
+    if not playlist_ids:
+        return {}
+    current_playlists = (
+        session.query(Playlist)
+        .filter(Playlist.playlist_id.in_(playlist_ids), Playlist.is_current == True)
+        .all()
+    )
+    return {playlist.playlist_id: playlist for playlist in current_playlists}
+
+
+def lookup_playlist_record(update_task, session, current_playlists, entry, block_number):
     event_blockhash = update_task.web3.toHex(entry.blockHash)
     event_args = entry["args"]
     playlist_id = event_args._playlistId
 
-    # Check if playlist record is in the DB
-    playlist_exists = (
-        session.query(Playlist).filter_by(playlist_id=event_args._playlistId).count()
-        > 0
-    )
-
-    playlist_record = None
-    if playlist_exists:
-        playlist_record = (
-            session.query(Playlist)
-            .filter(Playlist.playlist_id == playlist_id, Playlist.is_current == True)
-            .first()
-        )
-
+    # Use the current playlist record prefetched for the block, if the playlist is in the DB
+    playlist_record = current_playlists.get(playlist_id)
+    if playlist_record is not None:
         # expunge the result from sqlalchemy so we can modify it without UPDATE statements being made
         # https://stackoverflow.com/questions/28871406/how-to-clone-a-sqlalchemy-db-object-with-new-primary-key
         session.expunge(playlist_record)
@@ -98,21 +104,19 @@ def lookup_playlist_record(update_task, session, entry, block_number):
     return playlist_record
 
 
-def invalidate_old_playlist(session, playlist_id):
-    # check if playlist id is in db
-    playlist_exists = (
-        session.query(Playlist).filter_by(playlist_id=playlist_id).count() > 0
+def invalidate_old_playlists(session, playlist_ids):
+    # Update existing records in db to is_current = False
+    invalidated_playlist_keys = invalidate_current_versions(
+        session, Playlist.__tablename__, playlist_key_columns, [(playlist_id,) for playlist_id in playlist_ids]
     )
 
-    if playlist_exists:
-        # Update existing record in db to is_current = False
-        num_invalidated_playlists = (
-            session.query(Playlist)
-            .filter(Playlist.playlist_id == playlist_id, Playlist.is_current == True)
-            .update({"is_current": False})
-        )
+    # Playlists without a current record to invalidate must not be in the db
+    new_playlist_ids = [
+        playlist_id for playlist_id in playlist_ids if (playlist_id,) not in invalidated_playlist_keys
+    ]
+    if new_playlist_ids:
         assert (
-            num_invalidated_playlists > 0
+            session.query(Playlist).filter(Playlist.playlist_id.in_(new_playlist_ids)).count() == 0
         ), "Update operation requires a current playlist to be invalidated"
 
 
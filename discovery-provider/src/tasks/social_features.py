@@ -1,7 +1,7 @@
 import logging
 from datetime import datetime
-from src import contract_addresses
 from src.models import Repost, RepostType, Follow, Playlist
+from src.tasks.current_versions import invalidate_current_versions, repost_key_columns, follow_key_columns
 
 logger = logging.getLogger(__name__)
 
@@ -9,17 +9,15 @@ logger = logging.getLogger(__name__)
 def social_feature_state_update(
         self, update_task, session, social_feature_factory_txs, block_number, block_timestamp
 ):
-    """Return int representing number of social feature related state changes in this transaction"""
+    """Return int representing number of social feature related state changes in this transaction
+
+    social_feature_factory_txs holds the decoded events of each transaction, keyed by event type.
+    """
 
     num_total_changes = 0
     if not social_feature_factory_txs:
         return num_total_changes
 
-    social_feature_factory_abi = update_task.abi_values["SocialFeatureFactory"]["abi"]
-    social_feature_factory_contract = update_task.web3.eth.contract(
-        address=contract_addresses["social_feature_factory"],
-        abi=social_feature_factory_abi,
-    )
     block_datetime = datetime.utcfromtimestamp(block_timestamp)
 
     # stores net state changes of all reposts and follows and corresponding events in current block
@@ -30,63 +28,57 @@ def social_feature_state_update(
     playlist_repost_state_changes = {}
     follow_state_changes = {}
 
-    for tx_receipt in social_feature_factory_txs:
+    for tx_events in social_feature_factory_txs:
         add_track_repost(
             self,
-            social_feature_factory_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             track_repost_state_changes,
         )
         delete_track_repost(
             self,
-            social_feature_factory_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             track_repost_state_changes,
         )
         add_playlist_repost(
             self,
-            social_feature_factory_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             playlist_repost_state_changes,
         )
         delete_playlist_repost(
             self,
-            social_feature_factory_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             playlist_repost_state_changes,
         )
         add_follow(
             self,
-            social_feature_factory_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             follow_state_changes,
         )
         delete_follow(
             self,
-            social_feature_factory_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             follow_state_changes,
@@ -94,26 +86,33 @@ def social_feature_state_update(
 
     # bulk process all repost and follow changes
 
+    repost_keys = []
+    for repost_user_id in track_repost_state_changes:
+        for repost_track_id in track_repost_state_changes[repost_user_id]:
+            repost_keys.append((repost_user_id, repost_track_id, RepostType.track))
+    for repost_user_id in playlist_repost_state_changes:
+        for repost_playlist_id, repost in playlist_repost_state_changes[repost_user_id].items():
+            repost_keys.append((repost_user_id, repost_playlist_id, repost.repost_type))
+    invalidate_old_reposts(session, repost_keys)
+
     for repost_user_id in track_repost_state_changes:
         for repost_track_id in track_repost_state_changes[repost_user_id]:
-            invalidate_old_repost(session, repost_user_id, repost_track_id, RepostType.track)
             session.add(track_repost_state_changes[repost_user_id][repost_track_id])
         num_total_changes += len(track_repost_state_changes[repost_user_id])
 
     for repost_user_id in playlist_repost_state_changes:
         for repost_playlist_id in playlist_repost_state_changes[repost_user_id]:
-            invalidate_old_repost(
-                session,
-                repost_user_id,
-                repost_playlist_id,
-                playlist_repost_state_changes[repost_user_id][repost_playlist_id].repost_type
-            )
             session.add(playlist_repost_state_changes[repost_user_id][repost_playlist_id])
         num_total_changes += len(playlist_repost_state_changes[repost_user_id])
 
+    invalidate_old_follows(session, [
+        (follower_user_id, followee_user_id)
+        for follower_user_id in follow_state_changes
+        for followee_user_id in follow_state_changes[follower_user_id]
+    ])
+
     for follower_user_id in follow_state_changes:
         for followee_user_id in follow_state_changes[follower_user_id]:
-            invalidate_old_follow(session, follower_user_id, followee_user_id)
             session.add(follow_state_changes[follower_user_id][followee_user_id])
         num_total_changes += len(follow_state_changes[follower_user_id])
 
@@ -123,50 +122,36 @@ def social_feature_state_update(
 ######## HELPERS ########
 
 
-def invalidate_old_repost(session, repost_user_id, repost_item_id, repost_type):
-    # update existing db entry to is_current = False
-    num_invalidated_repost_entries = (
-        session.query(Repost)
-        .filter(
-            Repost.user_id == repost_user_id,
-            Repost.repost_item_id == repost_item_id,
-            Repost.repost_type == repost_type,
-            Repost.is_current == True
-        )
-        .update({"is_current": False})
+def invalidate_old_reposts(session, repost_keys):
+    """ repost_keys holds (user_id, repost_item_id, repost_type) tuples """
+    # update existing db entries to is_current = False
+    invalidated_repost_keys = invalidate_current_versions(
+        session, Repost.__tablename__, repost_key_columns, repost_keys
     )
-    # TODO - after on-chain storage is implemented, assert num_invalidated_repost_entries > 0
-    return num_invalidated_repost_entries
-
-
-def invalidate_old_follow(session, follower_user_id, followee_user_id):
-    # update existing db entry to is_current = False
-    num_invalidated_follow_entries = (
-        session.query(Follow)
-        .filter(
-            Follow.follower_user_id == follower_user_id,
-            Follow.followee_user_id == followee_user_id,
-            Follow.is_current == True
-        )
-        .update({"is_current": False})
+    # TODO - after on-chain storage is implemented, assert every repost key was invalidated
+    return len(invalidated_repost_keys)
+
+
+def invalidate_old_follows(session, follow_keys):
+    """ follow_keys holds (follower_user_id, followee_user_id) tuples """
+    # update existing db entries to is_current = False
+    invalidated_follow_keys = invalidate_current_versions(
+        session, Follow.__tablename__, follow_key_columns, follow_keys
     )
-    # TODO - after on-chain storage is implemented, assert num_invalidated_follow_entries > 0
-    return num_invalidated_follow_entries
+    # TODO - after on-chain storage is implemented, assert every follow key was invalidated
+    return len(invalidated_follow_keys)
 
 
 def add_track_repost(
         self,
-        social_feature_factory_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         track_repost_state_changes,
 ):
-    new_track_repost_events = social_feature_factory_contract.events.TrackRepostAdded().processReceipt(
-        tx_receipt
-    )
+    new_track_repost_events = tx_events.get("TrackRepostAdded", [])
     for event in new_track_repost_events:
         event_args = event["args"]
         repost_user_id = event_args._userId
@@ -194,17 +179,14 @@ def add_track_repost(
 
 def delete_track_repost(
         self,
-        social_feature_factory_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         track_repost_state_changes
 ):
-    new_repost_events = social_feature_factory_contract.events.TrackRepostDeleted().processReceipt(
-        tx_receipt
-    )
+    new_repost_events = tx_events.get("TrackRepostDeleted", [])
     for event in new_repost_events:
         event_args = event["args"]
         repost_user_id = event_args._userId
@@ -232,17 +214,14 @@ def delete_track_repost(
 
 def add_playlist_repost(
         self,
-        social_feature_factory_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         playlist_repost_state_changes,
 ):
-    new_playlist_repost_events = social_feature_factory_contract.events.PlaylistRepostAdded().processReceipt(
-        tx_receipt
-    )
+    new_playlist_repost_events = tx_events.get("PlaylistRepostAdded", [])
     for event in new_playlist_repost_events:
         event_args = event["args"]
         repost_user_id = event_args._userId
@@ -279,17 +258,14 @@ def add_playlist_repost(
 
 def delete_playlist_repost(
         self,
-        social_feature_factory_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         playlist_repost_state_changes,
 ):
-    new_playlist_repost_events = social_feature_factory_contract.events.PlaylistRepostDeleted().processReceipt(
-        tx_receipt
-    )
+    new_playlist_repost_events = tx_events.get("PlaylistRepostDeleted", [])
     for event in new_playlist_repost_events:
         event_args = event["args"]
         repost_user_id = event_args._userId
@@ -326,15 +302,14 @@ def delete_playlist_repost(
 
 def add_follow(
         self,
-        social_feature_factory_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         follow_state_changes
 ):
-    new_follow_events = social_feature_factory_contract.events.UserFollowAdded().processReceipt(tx_receipt)
+    new_follow_events = tx_events.get("UserFollowAdded", [])
 
     for entry in new_follow_events:
         event_args = entry["args"]
@@ -361,15 +336,14 @@ def add_follow(
 
 def delete_follow(
         self,
-        social_feature_factory_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         follow_state_changes
 ):
-    new_follow_events = social_feature_factory_contract.events.UserFollowDeleted().processReceipt(tx_receipt)
+    new_follow_events = tx_events.get("UserFollowDeleted", [])
 
     for entry in new_follow_events:
         event_args = entry["args"]
@@ -2,10 +2,10 @@ import logging
 from datetime import datetime
 from sqlalchemy.orm.session import make_transient
 from sqlalchemy.sql import null
-from src import contract_addresses
 from src.utils import multihash, helpers
 from src.models import Track, User, BlacklistedIPLD, Stem, Remix
 from src.tasks.metadata import track_metadata_format
+from src.tasks.current_versions import invalidate_current_versions, track_key_columns
 
 logger = logging.getLogger(__name__)
 
@@ -21,28 +21,32 @@ track_event_types_arr = [
     track_event_types_lookup['delete_track']
 ]
 
-def track_state_update(self, update_task, session, track_factory_txs, block_number, block_timestamp):
-    """Return int representing number of Track model state changes found in transaction."""
+def track_state_update(
+        self, update_task, session, track_factory_txs, block_number, block_timestamp, ipfs_metadata
+):
+    """Return int representing number of Track model state changes found in transaction.
+
+    track_factory_txs holds the decoded events of each transaction, keyed by event type.
+    ipfs_metadata holds track metadata prefetched for the block window, keyed by multihash.
+    """
     num_total_changes = 0
     if not track_factory_txs:
         return num_total_changes
 
-    track_abi = update_task.abi_values["TrackFactory"]["abi"]
-    track_contract = update_task.web3.eth.contract(
-        address=contract_addresses["track_factory"], abi=track_abi
-    )
+    track_lookups = prefetch_track_lookups(session, track_factory_txs)
+
     track_events = {}
-    for tx_receipt in track_factory_txs:
+    for tx_events in track_factory_txs:
         for event_type in track_event_types_arr:
-            track_events_tx = getattr(track_contract.events, event_type)().processReceipt(tx_receipt)
+            track_events_tx = tx_events.get(event_type, [])
             for entry in track_events_tx:
                 event_args = entry["args"]
-                track_id = event_args._trackId if '_trackId' in event_args else event_args._id
+                track_id = get_event_track_id(event_args)
                 blockhash = update_task.web3.toHex(entry.blockHash)
 
                 if track_id not in track_events:
                     track_entry = lookup_track_record(
-                        update_task, session, entry, track_id, block_number, blockhash
+                        session, track_lookups["tracks"], track_id, block_number, blockhash
                     )
 
                     track_events[track_id] = {
@@ -58,31 +62,69 @@ def track_state_update(self, update_task, session, track_factory_txs, block_numb
                     entry,
                     event_type,
                     track_events[track_id]["track"],
-                    block_timestamp)
+                    block_timestamp,
+                    ipfs_metadata,
+                    track_lookups)
             num_total_changes += len(track_events_tx)
 
+    invalidate_old_tracks(session, list(track_events.keys()))
     for track_id, value_obj in track_events.items():
         logger.info(f"tracks.py | Adding {value_obj['track']}")
-        invalidate_old_track(session, track_id)
         session.add(value_obj["track"])
 
     return num_total_changes
 
 
-def lookup_track_record(update_task, session, entry, event_track_id, block_number, block_hash):
-    # Check if track record exists
-    track_exists = (
-        session.query(Track).filter_by(track_id=event_track_id).count() > 0
-    )
+def get_event_track_id(event_args):
+    return event_args._trackId if '_trackId' in event_args else event_args._id
 
-    track_record = None
-    if track_exists:
-        track_record = (
-            session.query(Track)
-            .filter(Track.track_id == event_track_id, Track.is_current == True)
-            .first()
-        )
 
+def prefetch_track_lookups(session, track_factory_txs):
+    """ Load the rows read while applying the track events of a block, with one query per table
+
+        Returns:
+            dict with the current "tracks" by track id, the current "owner_handles" by user id and
+            the "blacklisted_iplds" set of the track metadata multihashes of the events
+    """
+    track_ids = set()
+    owner_ids = set()
+    metadata_multihashes = set()
+    for tx_events in track_factory_txs:
+        for event_type in track_event_types_arr:
+            for entry in tx_events.get(event_type, []):
+                event_args = entry["args"]
+                track_ids.add(get_event_track_id(event_args))
+                if event_type != track_event_types_lookup["delete_track"]:
+                    owner_ids.add(event_args._trackOwnerId)
+                    metadata_multihashes.add(get_track_metadata_multihash(event_args))
+
+    tracks = (
+        session.query(Track)
+        .filter(Track.track_id.in_(track_ids), Track.is_current == True)
+        .all()
+    ) if track_ids else []
+    owner_handles = (
+        session.query(User.user_id, User.handle)
+        .filter(User.user_id.in_(owner_ids), User.is_current == True)
+        .all()
+    ) if owner_ids else []
+    blacklisted_iplds = (
+        session.query(BlacklistedIPLD.ipld)
+        .filter(BlacklistedIPLD.ipld.in_(metadata_multihashes))
+        .all()
+    ) if metadata_multihashes else []
+
+    return {
+        "tracks": {track.track_id: track for track in tracks},
+        "owner_handles": dict(owner_handles),
+        "blacklisted_iplds": {ipld for (ipld,) in blacklisted_iplds},
+    }
+
+
+def lookup_track_record(session, current_tracks, event_track_id, block_number, block_hash):
+    # Use the current track record prefetched for the block, if the track exists
+    track_record = current_tracks.get(event_track_id)
+    if track_record is not None:
         # expunge the result from sqlalchemy so we can modify it without UPDATE statements being made
         # https://stackoverflow.com/questions/28871406/how-to-clone-a-sqlalchemy-db-object-with-new-primary-key
         session.expunge(track_record)
@@ -100,22 +142,17 @@ def lookup_track_record(update_task, session, entry, event_track_id, block_numbe
     return track_record
 
 
-def invalidate_old_track(session, track_id):
-    track_exists = (
-        session.query(Track).filter_by(track_id=track_id).count() > 0
+def invalidate_old_tracks(session, track_ids):
+    invalidated_track_keys = invalidate_current_versions(
+        session, Track.__tablename__, track_key_columns, [(track_id,) for track_id in track_ids]
     )
 
-    if not track_exists:
-        return
-
-    num_invalidated_tracks = (
-        session.query(Track)
-        .filter(Track.track_id == track_id, Track.is_current == True)
-        .update({"is_current": False})
-    )
-    assert (
-        num_invalidated_tracks > 0
-    ), "Update operation requires a current track to be invalidated"
+    # Tracks without a current record to invalidate must not be in the db
+    new_track_ids = [track_id for track_id in track_ids if (track_id,) not in invalidated_track_keys]
+    if new_track_ids:
+        assert (
+            session.query(Track).filter(Track.track_id.in_(new_track_ids)).count() == 0
+        ), "Update operation requires a current track to be invalidated"
 
 def update_stems_table(session, track_record, track_metadata):
     if (not "stem_of" in track_metadata) or (not isinstance(track_metadata["stem_of"], dict)):
@@ -146,8 +183,29 @@ def update_remixes_table(session, track_record, track_metadata):
                     )
                     session.add(remix)
 
+def get_track_metadata_multihash(event_args):
+    """ Return the b58 metadata multihash of a NewTrack or UpdateTrack event """
+    buf = multihash.encode(
+        bytes.fromhex(event_args._multihashDigest.hex()), event_args._multihashHashFn
+    )
+    return multihash.to_b58_string(buf)
+
+def get_track_metadata(update_task, session, owner_id, track_metadata_multihash, ipfs_metadata):
+    # Use metadata prefetched for the block window, fetching synchronously if it was not retrieved
+    if track_metadata_multihash in ipfs_metadata:
+        return ipfs_metadata[track_metadata_multihash]
+
+    # Reconnect to creator nodes for this user
+    refresh_track_owner_ipfs_conn(owner_id, session, update_task)
+
+    return update_task.ipfs_client.get_metadata(
+        track_metadata_multihash,
+        track_metadata_format
+    )
+
 def parse_track_event(
-        self, session, update_task, entry, event_type, track_record, block_timestamp
+        self, session, update_task, entry, event_type, track_record, block_timestamp, ipfs_metadata,
+        track_lookups
     ):
     event_args = entry["args"]
     # Just use block_timestamp as integer
@@ -156,35 +214,21 @@ def parse_track_event(
     if event_type == track_event_types_lookup["new_track"]:
         track_record.created_at = block_datetime
 
-        track_metadata_digest = event_args._multihashDigest.hex()
-        track_metadata_hash_fn = event_args._multihashHashFn
-        buf = multihash.encode(
-            bytes.fromhex(track_metadata_digest), track_metadata_hash_fn
-        )
-        track_metadata_multihash = multihash.to_b58_string(buf)
+        track_metadata_multihash = get_track_metadata_multihash(event_args)
         logger.info(f"track metadata ipld : {track_metadata_multihash}")
 
         # If the IPLD is blacklisted, do not keep processing the current entry
         # continue with the next entry in the update_track_events list
-        if is_blacklisted_ipld(session, track_metadata_multihash):
+        if track_metadata_multihash in track_lookups["blacklisted_iplds"]:
             return track_record
 
         owner_id = event_args._trackOwnerId
-        handle = (
-            session.query(User.handle)
-            .filter(User.user_id == owner_id, User.is_current == True)
-            .first()
-        )[0]
+        handle = track_lookups["owner_handles"][owner_id]
         track_record.owner_id = owner_id
 
-
-        # Reconnect to creator nodes for this user
-        refresh_track_owner_ipfs_conn(track_record.owner_id, session, update_task)
-
         track_record.is_delete = False
-        track_metadata = update_task.ipfs_client.get_metadata(
-            track_metadata_multihash,
-            track_metadata_format
+        track_metadata = get_track_metadata(
+            update_task, session, owner_id, track_metadata_multihash, ipfs_metadata
         )
 
         track_record = populate_track_record_metadata(
@@ -206,34 +250,21 @@ def parse_track_event(
         update_remixes_table(session, track_record, track_metadata)
 
     if event_type == track_event_types_lookup["update_track"]:
-        upd_track_metadata_digest = event_args._multihashDigest.hex()
-        upd_track_metadata_hash_fn = event_args._multihashHashFn
-        update_buf = multihash.encode(
-            bytes.fromhex(upd_track_metadata_digest), upd_track_metadata_hash_fn
-        )
-        upd_track_metadata_multihash = multihash.to_b58_string(update_buf)
+        upd_track_metadata_multihash = get_track_metadata_multihash(event_args)
         logger.info(f"update track metadata ipld : {upd_track_metadata_multihash}")
 
         # If the IPLD is blacklisted, do not keep processing the current entry
         # continue with the next entry in the update_track_events list
-        if is_blacklisted_ipld(session, upd_track_metadata_multihash):
+        if upd_track_metadata_multihash in track_lookups["blacklisted_iplds"]:
             return track_record
 
         owner_id = event_args._trackOwnerId
-        handle = (
-            session.query(User.handle)
-            .filter(User.user_id == owner_id, User.is_current == True)
-            .first()
-        )[0]
+        handle = track_lookups["owner_handles"][owner_id]
         track_record.owner_id = owner_id
         track_record.is_delete = False
 
-        # Reconnect to creator nodes for this user
-        refresh_track_owner_ipfs_conn(track_record.owner_id, session, update_task)
-
-        track_metadata = update_task.ipfs_client.get_metadata(
-            upd_track_metadata_multihash,
-            track_metadata_format
+        track_metadata = get_track_metadata(
+            update_task, session, owner_id, upd_track_metadata_multihash, ipfs_metadata
         )
 
         track_record = populate_track_record_metadata(
@@ -265,12 +296,6 @@ def parse_track_event(
 
     return track_record
 
-def is_blacklisted_ipld(session, ipld_blacklist_multihash):
-    ipld_blacklist_entry = (
-        session.query(BlacklistedIPLD).filter(BlacklistedIPLD.ipld == ipld_blacklist_multihash)
-    )
-    return ipld_blacklist_entry.count() > 0
-
 def is_valid_json_field(metadata, field):
     if field in metadata and isinstance(metadata[field], dict) and len(metadata[field]) > 0:
         return True
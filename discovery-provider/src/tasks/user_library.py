@@ -1,35 +1,33 @@
 import logging
 from datetime import datetime
-from src import contract_addresses
 from src.models import Playlist, SaveType, Save
+from src.tasks.current_versions import invalidate_current_versions, save_key_columns
 
 logger = logging.getLogger(__name__)
 
 def user_library_state_update(
         self, update_task, session, user_library_factory_txs, block_number, block_timestamp
 ):
-    """Return int representing number of User Library model state changes found in transaction."""
+    """Return int representing number of User Library model state changes found in transaction.
+
+    user_library_factory_txs holds the decoded events of each transaction, keyed by event type.
+    """
 
     num_total_changes = 0
     if not user_library_factory_txs:
         return num_total_changes
 
-    user_library_abi = update_task.abi_values["UserLibraryFactory"]["abi"]
-    user_library_contract = update_task.web3.eth.contract(
-        address=contract_addresses["user_library_factory"], abi=user_library_abi
-    )
     block_datetime = datetime.utcfromtimestamp(block_timestamp)
 
     track_save_state_changes = {}
     playlist_save_state_changes = {}
 
-    for tx_receipt in user_library_factory_txs:
+    for tx_events in user_library_factory_txs:
         add_track_save(
             self,
-            user_library_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             track_save_state_changes,
@@ -37,10 +35,9 @@ def user_library_state_update(
 
         add_playlist_save(
             self,
-            user_library_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             playlist_save_state_changes,
@@ -48,10 +45,9 @@ def user_library_state_update(
 
         delete_track_save(
             self,
-            user_library_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             track_save_state_changes,
@@ -59,61 +55,54 @@ def user_library_state_update(
 
         delete_playlist_save(
             self,
-            user_library_contract,
             update_task,
             session,
-            tx_receipt,
+            tx_events,
             block_number,
             block_datetime,
             playlist_save_state_changes,
         )
 
+    save_keys = []
+    for user_id in track_save_state_changes:
+        for track_id in track_save_state_changes[user_id]:
+            save_keys.append((user_id, track_id, SaveType.track))
+    for user_id in playlist_save_state_changes:
+        for playlist_id, save in playlist_save_state_changes[user_id].items():
+            save_keys.append((user_id, playlist_id, save.save_type))
+    invalidate_old_saves(session, save_keys)
+
     for user_id in track_save_state_changes:
         for track_id in track_save_state_changes[user_id]:
-            invalidate_old_save(session, user_id, track_id, SaveType.track)
             session.add(track_save_state_changes[user_id][track_id])
         num_total_changes += len(track_save_state_changes[user_id])
 
     for user_id in playlist_save_state_changes:
         for playlist_id in playlist_save_state_changes[user_id]:
-            invalidate_old_save(
-                session,
-                user_id,
-                playlist_id,
-                playlist_save_state_changes[user_id][playlist_id].save_type)
             session.add(playlist_save_state_changes[user_id][playlist_id])
         num_total_changes += len(playlist_save_state_changes[user_id])
 
     return num_total_changes
 
 
-def invalidate_old_save(session, user_id, playlist_id, save_type):
-    num_invalidated_save_entries = (
-        session.query(Save)
-        .filter(
-            Save.user_id == user_id,
-            Save.save_item_id == playlist_id,
-            Save.save_type == save_type,
-            Save.is_current == True,
-        )
-        .update({"is_current":False})
+def invalidate_old_saves(session, save_keys):
+    """ save_keys holds (user_id, save_item_id, save_type) tuples """
+    invalidated_save_keys = invalidate_current_versions(
+        session, Save.__tablename__, save_key_columns, save_keys
     )
-    return num_invalidated_save_entries
+    return len(invalidated_save_keys)
 
 
 def add_track_save(
         self,
-        user_library_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         track_state_changes,
 ):
-    new_add_track_events = user_library_contract.events.TrackSaveAdded().processReceipt(
-        tx_receipt
-    )
+    new_add_track_events = tx_events.get("TrackSaveAdded", [])
 
     for event in new_add_track_events:
         event_args = event["args"]
@@ -141,17 +130,14 @@ def add_track_save(
 
 def add_playlist_save(
         self,
-        user_library_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         playlist_state_changes,
 ):
-    new_add_playlist_events = user_library_contract.events.PlaylistSaveAdded().processReceipt(
-        tx_receipt
-    )
+    new_add_playlist_events = tx_events.get("PlaylistSaveAdded", [])
 
     for event in new_add_playlist_events:
         event_args = event["args"]
@@ -188,17 +174,14 @@ def add_playlist_save(
 
 def delete_track_save(
         self,
-        user_library_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         track_state_changes,
 ):
-    new_delete_track_events = user_library_contract.events.TrackSaveDeleted().processReceipt(
-        tx_receipt
-    )
+    new_delete_track_events = tx_events.get("TrackSaveDeleted", [])
     for event in new_delete_track_events:
         event_args = event["args"]
         save_user_id = event_args._userId
@@ -225,17 +208,14 @@ def delete_track_save(
 
 def delete_playlist_save(
         self,
-        user_library_contract,
         update_task,
         session,
-        tx_receipt,
+        tx_events,
         block_number,
         block_datetime,
         playlist_state_changes,
 ):
-    new_add_playlist_events = user_library_contract.events.PlaylistSaveDeleted().processReceipt(
-        tx_receipt
-    )
+    new_add_playlist_events = tx_events.get("PlaylistSaveDeleted", [])
 
     for event in new_add_playlist_events:
         event_args = event["args"]
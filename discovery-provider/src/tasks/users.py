@@ -1,39 +1,43 @@
 import logging
 from datetime import datetime
 from sqlalchemy.orm.session import make_transient
-from src import contract_addresses
 from src.utils import helpers
 from src.models import User, BlacklistedIPLD
 from src.tasks.metadata import user_metadata_format
+from src.tasks.current_versions import invalidate_current_versions, user_key_columns
 from src.utils.user_event_constants import user_event_types_arr, user_event_types_lookup
 
 logger = logging.getLogger(__name__)
 
 
-def user_state_update(self, update_task, session, user_factory_txs, block_number, block_timestamp):
-    """Return int representing number of User model state changes found in transaction."""
+def user_state_update(
+        self, update_task, session, user_factory_txs, block_number, block_timestamp, ipfs_metadata
+):
+    """Return int representing number of User model state changes found in transaction.
+
+    user_factory_txs holds the decoded events of each transaction, keyed by event type.
+    ipfs_metadata holds user metadata prefetched for the block window, keyed by multihash.
+    """
 
     num_total_changes = 0
     if not user_factory_txs:
         return num_total_changes
 
-    user_abi = update_task.abi_values["UserFactory"]["abi"]
-    user_contract = update_task.web3.eth.contract(
-        address=contract_addresses["user_factory"], abi=user_abi
-    )
-
     # This stores the state of the user object along with all the events applied to it
     # before it gets committed to the db
     # Data format is {"user_id": {"user", "events": []}}
     # NOTE - events are stored only for debugging purposes and not used or persisted anywhere
     user_events_lookup = {}
 
+    # Load the current records of every user changed in this block at once
+    current_users = prefetch_current_users(session, user_factory_txs)
+
     # for each user factory transaction, loop through every tx
     # loop through all audius event types within that tx and get all event logs
     # for each event, apply changes to the user in user_events_lookup
-    for tx_receipt in user_factory_txs:
+    for tx_events in user_factory_txs:
         for event_type in user_event_types_arr:
-            user_events_tx = getattr(user_contract.events, event_type)().processReceipt(tx_receipt)
+            user_events_tx = tx_events.get(event_type, [])
             for entry in user_events_tx:
                 user_id = entry["args"]._userId
 
@@ -41,7 +45,9 @@ def user_state_update(self, update_task, session, user_factory_txs, block_number
                 # first, get the user object from the db(if exists or create a new one)
                 # then set the lookup object for user_id with the appropriate props
                 if user_id not in user_events_lookup:
-                    ret_user = lookup_user_record(update_task, session, entry, block_number, block_timestamp)
+                    ret_user = lookup_user_record(
+                        update_task, session, current_users, entry, block_number, block_timestamp
+                    )
                     user_events_lookup[user_id] = {"user": ret_user, "events": []}
 
                 user_events_lookup[user_id]["events"].append(event_type)
@@ -51,45 +57,54 @@ def user_state_update(self, update_task, session, user_factory_txs, block_number
                 # (even if multiple operations are present)
                 user_events_lookup[user_id]["user"] = parse_user_event(
                     self,
-                    user_contract,
                     update_task,
                     session,
-                    tx_receipt,
                     block_number,
                     entry,
                     event_type,
                     user_events_lookup[user_id]["user"],
-                    block_timestamp
+                    block_timestamp,
+                    ipfs_metadata
                 )
 
             num_total_changes += len(user_events_tx)
 
-    # for each record in user_events_lookup, invalidate the old record and add the new record
+    # invalidate the old records of every user in user_events_lookup, then add the new records
     # we do this after all processing has completed so the user record is atomic by block, not tx
+    invalidate_old_users(session, list(user_events_lookup.keys()))
     for user_id, value_obj in user_events_lookup.items():
         logger.info(f"users.py | Adding {value_obj['user']}")
-        invalidate_old_user(session, user_id)
         session.add(value_obj["user"])
 
     return num_total_changes
 
 
-def lookup_user_record(update_task, session, entry, block_number, block_timestamp):
+def prefetch_current_users(session, user_factory_txs):
+    """ Returns user id --> current User of the users changed by the user factory transactions """
+    user_ids = {
+        entry["args"]._userId
+        for tx_events in user_factory_txs
+        for event_type in user_event_types_arr
+        for entry in tx_events.get(event_type, [])
+    }
+    if not user_ids:
+        return {}
+    current_users = (
+        session.query(User)
+        .filter(User.user_id.in_(user_ids), User.is_current == True)
+        .all()
+    )
+    return {user.user_id: user for user in current_users}
+
+
+def lookup_user_record(update_task, session, current_users, entry, block_number, block_timestamp):
     event_blockhash = update_task.web3.toHex(entry.blockHash)
     event_args = entry["args"]
     user_id = event_args._userId
 
-    # Check if the userId is in the db
-    user_exists = session.query(User).filter_by(user_id=event_args._userId).count() > 0
-
-    user_record = None # will be set in this if/else
-    if user_exists:
-        user_record = (
-            session.query(User)
-            .filter(User.user_id == user_id, User.is_current == True)
-            .first()
-        )
-
+    # Use the current user record prefetched for the block, if the userId is in the db
+    user_record = current_users.get(user_id)
+    if user_record is not None:
         # expunge the result from sqlalchemy so we can modify it without UPDATE statements being made
         # https://stackoverflow.com/questions/28871406/how-to-clone-a-sqlalchemy-db-object-with-new-primary-key
         session.expunge(user_record)
@@ -108,25 +123,23 @@ def lookup_user_record(update_task, session, entry, block_number, block_timestam
     return user_record
 
 
-def invalidate_old_user(session, user_id):
-    # Check if the userId is in the db
-    user_exists = session.query(User).filter_by(user_id=user_id).count() > 0
+def invalidate_old_users(session, user_ids):
+    # Update existing records in db to is_current = False
+    invalidated_user_keys = invalidate_current_versions(
+        session, User.__tablename__, user_key_columns, [(user_id,) for user_id in user_ids]
+    )
 
-    if user_exists:
-        # Update existing record in db to is_current = False
-        num_invalidated_users = (
-            session.query(User)
-            .filter(User.user_id == user_id, User.is_current == True)
-            .update({"is_current": False})
-        )
+    # Users without a current record to invalidate must not be in the db
+    new_user_ids = [user_id for user_id in user_ids if (user_id,) not in invalidated_user_keys]
+    if new_user_ids:
         assert (
-            num_invalidated_users > 0
+            session.query(User).filter(User.user_id.in_(new_user_ids)).count() == 0
         ), "Update operation requires a current user to be invalidated"
 
 
 def parse_user_event(
-        self, user_contract, update_task, session, tx_receipt, block_number, entry, event_type, user_record,
-        block_timestamp):
+        self, update_task, session, block_number, entry, event_type, user_record, block_timestamp,
+        ipfs_metadata):
     event_args = entry["args"]
 
     # type specific field changes
@@ -160,7 +173,7 @@ def parse_user_event(
 
     # If creator, look up metadata multihash in IPFS and override with metadata fields
     metadata_overrides = get_metadata_overrides_from_ipfs(
-        session, update_task, user_record
+        session, update_task, user_record, ipfs_metadata
     )
 
     if metadata_overrides:
@@ -211,10 +224,15 @@ def refresh_user_connection(user_record, update_task):
             user_node_url
         )
 
-def get_metadata_overrides_from_ipfs(session, update_task, user_record):
+def get_metadata_overrides_from_ipfs(session, update_task, user_record, ipfs_metadata):
     user_metadata = user_metadata_format
 
     if user_record.is_creator and user_record.metadata_multihash and user_record.handle:
+        # Use metadata prefetched for the block window if available, blacklisted multihashes
+        # are never prefetched
+        if user_record.metadata_multihash in ipfs_metadata:
+            return ipfs_metadata[user_record.metadata_multihash]
+
         ipld_blacklist_entry = (
             session.query(BlacklistedIPLD)
             .filter(BlacklistedIPLD.ipld == user_record.metadata_multihash)
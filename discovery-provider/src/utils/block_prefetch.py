@@ -0,0 +1,55 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_blocks(web3, block_numbers, max_workers, full_transactions=True):
+    """ Concurrently fetch blocks for the given block numbers
+
+        Args:
+            web3: web3 instance
+            block_numbers: iterable of block numbers
+            max_workers: maximum number of in-flight RPC requests
+            full_transactions: include the full transactions, only their hashes otherwise
+
+        Returns:
+            dict of blockhash (hex string) -> block
+    """
+    block_numbers = list(block_numbers)
+    if not block_numbers:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        blocks = list(executor.map(lambda number: web3.eth.getBlock(number, full_transactions), block_numbers))
+
+    blocks_by_hash = {}
+    for block in blocks:
+        # Blocks past the chain head are returned as None
+        if block is not None:
+            blocks_by_hash[web3.toHex(block.hash)] = block
+
+    logger.info(f"block_prefetch.py | Prefetched {len(blocks_by_hash)}/{len(block_numbers)} blocks")
+    return blocks_by_hash
+
+
+def fetch_tx_receipts(web3, tx_hashes, max_workers):
+    """ Concurrently fetch transaction receipts
+
+        Args:
+            web3: web3 instance
+            tx_hashes: iterable of transaction hashes as hex strings
+            max_workers: maximum number of in-flight RPC requests
+
+        Returns:
+            dict of tx hash (hex string) -> receipt
+    """
+    tx_hashes = list(tx_hashes)
+    if not tx_hashes:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        receipts = list(executor.map(web3.eth.getTransactionReceipt, tx_hashes))
+
+    logger.info(f"block_prefetch.py | Prefetched {len(receipts)} tx receipts")
+    return dict(zip(tx_hashes, receipts))
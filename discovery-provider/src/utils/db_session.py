@@ -1,12 +1,28 @@
 import ast
+import json
+import logging
+import os
+import threading
+import time
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from flask import current_app, g
 
+logger = logging.getLogger(__name__)
 
 session_manager = None
 
+# Engines are shared by every SessionManager in the process, keyed by url + engine args.
+# Creating an engine per request meant a fresh connection (and auth handshake) per request
+# and made pool_size meaningless.
+_engines = {}
+_engines_lock = threading.Lock()
+
+# Defaults applied to every engine unless explicitly overridden in engine_args_literal
+default_pool_recycle = 3600
+
 
 def get_db():
     """Connect to the configured database. The connection
@@ -36,9 +52,164 @@ def get_db_read_replica():
     return g.db_read_replica
 
 
+@contextmanager
+def collect_new_models(session):
+    """ Usage:
+            with collect_new_models(session) as new_models:
+                session.add(...)
+
+        Collects every model added to the session inside the block, including the models an
+        autoflush writes out before the block exits, which are no longer part of session.new.
+    """
+    new_models = []
+
+    def collect_flushed_models(flush_session, flush_context, instances):  # pylint: disable=W0613
+        new_models.extend(flush_session.new)
+
+    event.listen(session, "before_flush", collect_flushed_models)
+    try:
+        yield new_models
+        new_models.extend(session.new)
+    finally:
+        event.remove(session, "before_flush", collect_flushed_models)
+
+
+class PoolStats:
+    """ Counters describing connection pool usage, used to size pool_size / max_overflow """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidated_after_fork = 0
+        self.waits = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, wait_ms):
+        with self._lock:
+            self.waits += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidated_after_fork": self.invalidated_after_fork,
+                "waits": self.waits,
+                "wait_avg_ms": round(self.wait_total_ms / self.waits, 3) if self.waits else 0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """ QueuePool that records how long each checkout waited for a connection """
+
+    stats = None
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.time()
+        try:
+            return super()._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait((time.time() - start) * 1000)
+
+
+def _add_pool_listeners(engine, stats):
+    """ Attach pool event listeners to the engine.
+
+        Connections are tagged with the pid that opened them. When gunicorn or celery fork a
+        worker after the engine was created, the child would otherwise share sockets with the
+        parent. A mismatching pid on checkout drops the connection without closing it (closing
+        would terminate the parent's session) and the pool opens a new one for this process.
+        See https://docs.sqlalchemy.org/en/latest/core/pooling.html#using-connection-pools-with-multiprocessing
+    """
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):  # pylint: disable=W0612
+        connection_record.info["pid"] = os.getpid()
+        stats.increment("connects")
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):  # pylint: disable=W0612
+        pid = os.getpid()
+        if connection_record.info["pid"] != pid:
+            stats.increment("invalidated_after_fork")
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                f"Connection record belongs to pid {connection_record.info['pid']}, "
+                f"attempting to check out in pid {pid}"
+            )
+        stats.increment("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):  # pylint: disable=W0612
+        stats.increment("checkins")
+
+
+def get_engine(db_url, db_engine_args):
+    """ Return the process-wide engine for the given url and engine args, creating it on first use """
+    engine_key = (db_url, json.dumps(db_engine_args, sort_keys=True, default=str))
+    with _engines_lock:
+        engine = _engines.get(engine_key)
+        if engine is None:
+            engine_args = dict(db_engine_args)
+            engine_args.setdefault("pool_pre_ping", True)
+            engine_args.setdefault("pool_recycle", default_pool_recycle)
+            instrumented = "poolclass" not in engine_args
+            if instrumented:
+                engine_args["poolclass"] = InstrumentedQueuePool
+
+            engine = create_engine(db_url, **engine_args)
+            stats = PoolStats()
+            if instrumented:
+                engine.pool.stats = stats
+            _add_pool_listeners(engine, stats)
+            engine.info_stats = stats
+
+            _engines[engine_key] = engine
+            logger.info(f"db_session.py | Created engine for {repr(engine.url)}")
+    return engine
+
+
+def get_pool_stats():
+    """ Return a list of pool usage snapshots, one per engine created in this process """
+    with _engines_lock:
+        engines = list(_engines.values())
+
+    pool_stats = []
+    for engine in engines:
+        pool = engine.pool
+        engine_stats = {"url": repr(engine.url), "pid": os.getpid()}
+        if isinstance(pool, QueuePool):
+            engine_stats.update({
+                "pool_size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+        engine_stats.update(engine.info_stats.to_dict())
+        pool_stats.append(engine_stats)
+    return pool_stats
+
+
 class SessionManager:
     def __init__(self, db_url, db_engine_args):
-        self._engine = create_engine(db_url, **db_engine_args)
+        self._engine = get_engine(db_url, db_engine_args)
         self._session_factory = sessionmaker(bind=self._engine)
 
     def session(self):
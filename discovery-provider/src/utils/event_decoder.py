@@ -0,0 +1,45 @@
+from eth_utils import event_abi_to_log_topic
+from web3.utils.events import get_event_data
+
+
+class EventDecoder:
+    """ Decodes the logs emitted by the indexed contracts, each log exactly once.
+
+        The event ABIs of every registered contract are indexed by (contract address, topic0), so
+        decoding a log is a single lookup instead of attempting every event type of the contract
+        against it. Addresses are normalized to lowercase so checksummed and plain addresses match.
+        Logs of unregistered contracts or events are skipped.
+
+        Usage:
+            decoder = EventDecoder()
+            decoder.register(contract_addresses["track_factory"], track_factory_abi, "track_factory")
+            tx_events = decoder.decode_receipt(tx_receipt)
+            new_track_events = tx_events["track_factory"]["NewTrack"]
+    """
+
+    def __init__(self):
+        self._event_abis = {}
+
+    def register(self, address, abi, handler_name):
+        for event_abi in abi:
+            if event_abi["type"] != "event" or event_abi.get("anonymous"):
+                continue
+            self._event_abis[(address.lower(), event_abi_to_log_topic(event_abi))] = (handler_name, event_abi)
+
+    def decode_receipt(self, tx_receipt):
+        """ Return the events of the receipt grouped by handler, then by event name, in log order
+
+            Returns:
+                dict of handler name -> dict of event name -> list of decoded events
+        """
+        tx_events = {}
+        for log in tx_receipt["logs"]:
+            if not log["topics"]:
+                continue
+            event_key = (log["address"].lower(), bytes(log["topics"][0]))
+            if event_key not in self._event_abis:
+                continue
+            (handler_name, event_abi) = self._event_abis[event_key]
+            handler_events = tx_events.setdefault(handler_name, {})
+            handler_events.setdefault(event_abi["name"], []).append(get_event_data(event_abi, log))
+        return tx_events
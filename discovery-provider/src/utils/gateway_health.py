@@ -0,0 +1,95 @@
+import threading
+import time
+
+
+class GatewayHealth:
+    """ Tracks latency and error rates of IPFS gateways to query the healthiest ones first.
+
+        Latency and error rate are exponentially weighted moving averages. A gateway failing
+        `eject_after` times in a row is skipped for a backoff period that doubles with every
+        further failure, up to `max_backoff_sec`.
+    """
+
+    def __init__(
+            self,
+            alpha=0.3,
+            eject_after=3,
+            base_backoff_sec=5,
+            max_backoff_sec=300,
+            default_latency_sec=0.5
+    ):
+        self._alpha = alpha
+        self._eject_after = eject_after
+        self._base_backoff_sec = base_backoff_sec
+        self._max_backoff_sec = max_backoff_sec
+        self._default_latency_sec = default_latency_sec
+        self._gateways = {}
+        self._lock = threading.Lock()
+
+    def _get_gateway(self, address):
+        if address not in self._gateways:
+            self._gateways[address] = {
+                "latency_ewma_sec": self._default_latency_sec,
+                "error_rate_ewma": 0.0,
+                "consecutive_failures": 0,
+                "ejected_until": 0,
+                "requests": 0,
+                "failures": 0,
+            }
+        return self._gateways[address]
+
+    def _score(self, gateway):
+        # Lower is better, a gateway failing every request scores 10x its latency
+        return gateway["latency_ewma_sec"] * (1 + 9 * gateway["error_rate_ewma"])
+
+    def record_success(self, address, latency_sec):
+        with self._lock:
+            gateway = self._get_gateway(address)
+            gateway["requests"] += 1
+            gateway["latency_ewma_sec"] += self._alpha * (latency_sec - gateway["latency_ewma_sec"])
+            gateway["error_rate_ewma"] -= self._alpha * gateway["error_rate_ewma"]
+            gateway["consecutive_failures"] = 0
+            gateway["ejected_until"] = 0
+
+    def record_failure(self, address, latency_sec):
+        with self._lock:
+            gateway = self._get_gateway(address)
+            gateway["requests"] += 1
+            gateway["failures"] += 1
+            gateway["latency_ewma_sec"] += self._alpha * (latency_sec - gateway["latency_ewma_sec"])
+            gateway["error_rate_ewma"] += self._alpha * (1 - gateway["error_rate_ewma"])
+            gateway["consecutive_failures"] += 1
+
+            num_ejections = gateway["consecutive_failures"] - self._eject_after
+            if num_ejections >= 0:
+                backoff_sec = min(self._base_backoff_sec * 2 ** num_ejections, self._max_backoff_sec)
+                gateway["ejected_until"] = time.time() + backoff_sec
+
+    def order(self, addresses):
+        """ Return addresses sorted from healthiest to least healthy, leaving out ejected gateways.
+
+            If every gateway is ejected, all of them are returned with the soonest to recover first,
+            so a lookup is still attempted.
+        """
+        now = time.time()
+        with self._lock:
+            gateways = {address: self._get_gateway(address) for address in addresses}
+            available = [address for address in addresses if gateways[address]["ejected_until"] <= now]
+            if not available:
+                return sorted(addresses, key=lambda address: gateways[address]["ejected_until"])
+            return sorted(available, key=lambda address: self._score(gateways[address]))
+
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                address: {
+                    "latency_ewma_sec": gateway["latency_ewma_sec"],
+                    "error_rate_ewma": gateway["error_rate_ewma"],
+                    "consecutive_failures": gateway["consecutive_failures"],
+                    "ejected_for_sec": max(gateway["ejected_until"] - now, 0),
+                    "requests": gateway["requests"],
+                    "failures": gateway["failures"],
+                }
+                for address, gateway in self._gateways.items()
+            }
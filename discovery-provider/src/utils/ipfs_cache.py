@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from src.utils.redis_constants import cid_cache_stats_redis_key
+
+logger = logging.getLogger(__name__)
+
+stat_names = ["hits", "memory_hits", "disk_hits", "misses", "bytes_served", "bytes_stored"]
+
+
+class CIDCache:
+    """ Content-addressed cache of IPFS metadata JSON and directory checks.
+
+        CIDs are immutable so entries never need to be invalidated. Entries are kept in a
+        size-bounded in-memory LRU, backed by an optional sqlite database on disk that survives
+        restarts and is shared by every worker process on the host.
+    """
+
+    def __init__(self, db_path=None, max_memory_bytes=64 * 1024 * 1024):
+        self._db_path = db_path
+        self._max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._stats = dict.fromkeys(stat_names, 0)
+
+    def _get_connection(self):
+        # sqlite connections must not be shared across a fork, open one per process
+        if not self._db_path:
+            return None
+        pid = os.getpid()
+        if self._connection is None or self._connection_pid != pid:
+            self._connection = sqlite3.connect(self._db_path, timeout=10, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cid_metadata (cid TEXT PRIMARY KEY, metadata TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cid_directories (cid TEXT PRIMARY KEY, is_directory INTEGER NOT NULL)"
+            )
+            self._connection.commit()
+            self._connection_pid = pid
+        return self._connection
+
+    def _memory_get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key, value, size):
+        if key in self._memory:
+            return
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self._max_memory_bytes and self._memory:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _record_hit(self, source, size):
+        self._stats["hits"] += 1
+        self._stats[f"{source}_hits"] += 1
+        self._stats["bytes_served"] += size
+
+    def get_metadata(self, cid):
+        """ Return the raw metadata JSON dict stored for cid, or None """
+        key = ("metadata", cid)
+        with self._lock:
+            cached = self._memory_get(key)
+            if cached is not None:
+                raw, size = cached
+                self._record_hit("memory", size)
+                return json.loads(raw)
+
+            try:
+                connection = self._get_connection()
+                row = None
+                if connection is not None:
+                    row = connection.execute(
+                        "SELECT metadata FROM cid_metadata WHERE cid = ?", (cid,)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"ipfs_cache.py | Failed to read {cid} from disk, {e}")
+                row = None
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            raw = row[0]
+            self._memory_put(key, raw, len(raw))
+            self._record_hit("disk", len(raw))
+            return json.loads(raw)
+
+    def put_metadata(self, cid, metadata):
+        """ Store the raw metadata JSON dict retrieved for cid """
+        raw = json.dumps(metadata)
+        with self._lock:
+            self._memory_put(("metadata", cid), raw, len(raw))
+            self._stats["bytes_stored"] += len(raw)
+            try:
+                connection = self._get_connection()
+                if connection is not None:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO cid_metadata (cid, metadata) VALUES (?, ?)", (cid, raw)
+                    )
+                    connection.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"ipfs_cache.py | Failed to write {cid} to disk, {e}")
+
+    def get_is_directory(self, cid):
+        """ Return whether cid is a directory, or None if unknown """
+        key = ("directory", cid)
+        with self._lock:
+            cached = self._memory_get(key)
+            if cached is not None:
+                self._record_hit("memory", 0)
+                return cached[0]
+
+            try:
+                connection = self._get_connection()
+                row = None
+                if connection is not None:
+                    row = connection.execute(
+                        "SELECT is_directory FROM cid_directories WHERE cid = ?", (cid,)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"ipfs_cache.py | Failed to read {cid} from disk, {e}")
+                row = None
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            is_directory = bool(row[0])
+            self._memory_put(key, is_directory, len(cid))
+            self._record_hit("disk", 0)
+            return is_directory
+
+    def put_is_directory(self, cid, is_directory):
+        with self._lock:
+            self._memory_put(("directory", cid), is_directory, len(cid))
+            try:
+                connection = self._get_connection()
+                if connection is not None:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO cid_directories (cid, is_directory) VALUES (?, ?)",
+                        (cid, int(is_directory))
+                    )
+                    connection.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"ipfs_cache.py | Failed to write {cid} to disk, {e}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        return stats
+
+    def flush_stats(self, redis):
+        """ Add the counters accumulated since the last flush to the shared redis hash """
+        with self._lock:
+            stats = self._stats
+            self._stats = dict.fromkeys(stat_names, 0)
+        pipe = redis.pipeline()
+        for name, value in stats.items():
+            if value:
+                pipe.hincrby(cid_cache_stats_redis_key, name, value)
+        pipe.execute()
@@ -1,24 +1,38 @@
 import logging
 import json
 import time
+import concurrent.futures
 from urllib.parse import urlparse, urljoin
 import requests
 from requests.exceptions import ReadTimeout
 import ipfshttpclient
 from src.utils.helpers import get_valid_multiaddr_from_id_json
+from src.utils.ipfs_cache import CIDCache
+from src.utils.gateway_health import GatewayHealth
+from src.utils.redis_constants import ipfs_gateway_health_redis_key
 
 logger = logging.getLogger(__name__)
 
+# Seconds allowed for each request to the local node or a gateway
+ipfs_request_timeout = 3
+
 
 class IPFSClient:
     """ Helper class for Audius Discovery Provider + IPFS interaction """
 
-    def __init__(self, ipfs_peer_host, ipfs_peer_port, gateway_addresses):
+    def __init__(
+            self, ipfs_peer_host, ipfs_peer_port, gateway_addresses, cid_cache=None, gateway_hedge_count=3
+    ):
         self._api = ipfshttpclient.connect(f"/dns/{ipfs_peer_host}/tcp/{ipfs_peer_port}/http")
         self._gateway_addresses = gateway_addresses
         self._cnode_endpoints = None
         self._ipfsid = self._api.id()
         self._multiaddr = get_valid_multiaddr_from_id_json(self._ipfsid)
+        # CIDs are immutable, retrieved metadata and directory checks are cached by CID
+        self._cid_cache = cid_cache if cid_cache is not None else CIDCache()
+        # Number of gateways queried in parallel for each metadata lookup
+        self._gateway_hedge_count = max(gateway_hedge_count, 1)
+        self._gateway_health = GatewayHealth()
 
     def get_metadata_from_json(self, metadata_format, resp_json):
         metadata = {}
@@ -27,19 +41,28 @@ class IPFSClient:
         return metadata
 
     # pylint: disable=broad-except
-    def get_metadata(self, multihash, metadata_format):
+    def get_metadata(self, multihash, metadata_format, timeout=None):
         """ Retrieve file from IPFS, validating metadata requirements prior to
             returning an object with no missing entries
+
+            When `timeout` is set, the local node and gateway requests all share a deadline of
+            `timeout` seconds from now, instead of each getting the full request timeout
         """
         logger.warning(f"IPFSCLIENT | get_metadata - {multihash}")
+        cached_json = self._cid_cache.get_metadata(multihash)
+        if cached_json is not None:
+            logger.info(f"IPFSCLIENT | Retrieved {multihash} from CID cache")
+            return self.get_metadata_from_json(metadata_format, cached_json)
+
         api_metadata = metadata_format
         retrieved_from_local_node = False
         retrieved_from_gateway = False
         start_time = time.time()
+        deadline = start_time + timeout if timeout is not None else None
 
         # First try to retrieve from local ipfs node.
         try:
-            api_metadata = self.get_metadata_from_ipfs_node(multihash, metadata_format)
+            api_metadata = self.get_metadata_from_ipfs_node(multihash, metadata_format, deadline)
             retrieved_from_local_node = (api_metadata != metadata_format)
         except Exception:
             logger.error(f"Failed to retrieve CID from local node, {multihash}", exc_info=True)
@@ -47,7 +70,7 @@ class IPFSClient:
         # Else, try to retrieve from gateways.
         if not retrieved_from_local_node:
             try:
-                api_metadata = self.get_metadata_from_gateway(multihash, metadata_format)
+                api_metadata = self.get_metadata_from_gateway(multihash, metadata_format, deadline)
                 retrieved_from_gateway = (api_metadata != metadata_format)
             except Exception:
                 logger.error(f"Failed to retrieve CID from gateway, {multihash}", exc_info=True)
@@ -71,16 +94,25 @@ class IPFSClient:
 
         return api_metadata
 
-    def get_metadata_from_gateway(self, multihash, metadata_format):
-        # Default return initial metadata format
-        gateway_metadata_json = metadata_format
+    def _request_timeout(self, multihash, deadline):
+        """ Timeout of the next request, bounded by the time left until `deadline` """
+        if deadline is None:
+            return ipfs_request_timeout
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise Exception(f"IPFSCLIENT | Deadline exceeded retrieving {multihash}")
+        return min(ipfs_request_timeout, remaining)
+
+    def get_metadata_from_gateway(self, multihash, metadata_format, deadline=None):
         logger.warning(f"IPFSCLIENT | get_metadata_from_gateway, {multihash}")
-        gateway_endpoints = self._cnode_endpoints
+        # Healthiest gateways first, failing gateways are skipped while ejected
+        gateway_endpoints = self._gateway_health.order(self._cnode_endpoints)
         logger.warning(f"IPFSCLIENT | get_metadata_from_gateway, \
                 \ncombined addresses: {gateway_endpoints}, \
                 \ncnode_endpoints: {self._cnode_endpoints}, \
                 \naddresses: {self._gateway_addresses}")
 
+        gateway_queries = []
         for address in gateway_endpoints:
             gateway_query_address = "%s/ipfs/%s" % (address, multihash)
 
@@ -92,46 +124,76 @@ class IPFSClient:
                     f"provided host: {address} CID address:{gateway_query_address}"
                 )
                 continue
-
-            try:
-                logger.warning(f"IPFSCLIENT | Querying {gateway_query_address}")
-                r = requests.get(gateway_query_address, timeout=3)
-
-                # Do not retrieve metadata for error code
-                if r.status_code != 200:
-                    logger.warning(f"IPFSCLIENT | {gateway_query_address} - {r.status_code}")
-                    continue
-
-                # Override with retrieved JSON value
-                gateway_metadata_json = self.get_metadata_from_json(
-                    metadata_format, r.json()
-                )
-                # Exit loop if dict is successfully retrieved
-                logger.warning(
-                    f"IPFSCLIENT | Retrieved {multihash} from {gateway_query_address}"
-                )
-                return gateway_metadata_json
-            except ReadTimeout:
-                logger.error(
-                    f"IPFSCLIENT | Failed to retrieve CID from {gateway_query_address}"
-                )
-                continue
-            except Exception as e:
-                logger.error(
-                    f"IPFSCLIENT | Unknown exception retrieving from {gateway_query_address}",
-                    exc_info=True,
-                )
-                if "No file found" not in str(e):
-                    raise e
+            gateway_queries.append((address, gateway_query_address))
+
+        # Hedge requests across the top gateways, moving on to the next ones if all of them fail
+        for i in range(0, len(gateway_queries), self._gateway_hedge_count):
+            resp_json = self._query_gateways(
+                multihash,
+                gateway_queries[i:i + self._gateway_hedge_count],
+                self._request_timeout(multihash, deadline)
+            )
+            if resp_json is not None:
+                self._cid_cache.put_metadata(multihash, resp_json)
+                return self.get_metadata_from_json(metadata_format, resp_json)
 
         raise Exception(
             f"IPFSCLIENT | Failed to retrieve CID {multihash} from gateway"
         )
 
-    def get_metadata_from_ipfs_node(self, multihash, metadata_format):
+    def _query_gateways(self, multihash, gateway_queries, timeout=ipfs_request_timeout):
+        """ Query gateways in parallel, returning the first valid JSON dict or None """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(gateway_queries))
+        futures = {
+            executor.submit(self._query_gateway, address, gateway_query_address, timeout): gateway_query_address
+            for address, gateway_query_address in gateway_queries
+        }
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                gateway_query_address = futures[future]
+                try:
+                    resp_json = future.result()
+                    logger.warning(
+                        f"IPFSCLIENT | Retrieved {multihash} from {gateway_query_address}"
+                    )
+                    return resp_json
+                except ReadTimeout:
+                    logger.error(
+                        f"IPFSCLIENT | Failed to retrieve CID from {gateway_query_address}"
+                    )
+                except Exception as e:
+                    logger.warning(f"IPFSCLIENT | {gateway_query_address} - {e}")
+            return None
+        finally:
+            # Do not wait on the slower requests, they still record gateway health once complete
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _query_gateway(self, address, gateway_query_address, timeout=ipfs_request_timeout):
+        start_time = time.time()
+        try:
+            logger.warning(f"IPFSCLIENT | Querying {gateway_query_address}")
+            r = requests.get(gateway_query_address, timeout=timeout)
+
+            # Do not retrieve metadata for error code
+            if r.status_code != 200:
+                raise Exception(f"Received status code {r.status_code}")
+
+            resp_json = r.json()
+            if not isinstance(resp_json, dict):
+                raise Exception(f"Expected dict type, received {resp_json}")
+        except Exception as e:
+            self._gateway_health.record_failure(address, time.time() - start_time)
+            raise e
+
+        self._gateway_health.record_success(address, time.time() - start_time)
+        return resp_json
+
+    def get_metadata_from_ipfs_node(self, multihash, metadata_format, deadline=None):
 
         try:
-            res = self.cat(multihash)
+            res = self.cat(multihash, self._request_timeout(multihash, deadline))
             resp_val = json.loads(res)
 
             # If an invalid response object is retrieved return empty values and log error
@@ -153,17 +215,25 @@ class IPFSClient:
             raise e
 
         logger.info(f"IPFSCLIENT | Retrieved {multihash} from ipfs node")
+        self._cid_cache.put_metadata(multihash, resp_val)
         return self.get_metadata_from_json(metadata_format, resp_val)
 
-    def cat(self, multihash):
+    def cat(self, multihash, timeout=ipfs_request_timeout):
         try:
-            res = self._api.cat(multihash, timeout=3)
+            res = self._api.cat(multihash, timeout=timeout)
             return res
         except:
             logger.error(f"IPFSCLIENT | IPFS cat timed out for CID {multihash}")
             raise  # error is of type ipfshttpclient.exceptions.TimeoutError
 
     def multihash_is_directory(self, multihash):
+        is_directory = self._cid_cache.get_is_directory(multihash)
+        if is_directory is None:
+            is_directory = self._multihash_is_directory(multihash)
+            self._cid_cache.put_is_directory(multihash, is_directory)
+        return is_directory
+
+    def _multihash_is_directory(self, multihash):
         # First attempt to cat multihash locally.
         try:
             # If cat successful, multihash is not directory.
@@ -174,8 +244,8 @@ class IPFSClient:
                 logger.warning(f"IPFSCLIENT | Found directory {multihash}")
                 return True
 
-        # Attempt to retrieve from cnode gateway endpoints.
-        gateway_endpoints = self._cnode_endpoints
+        # Attempt to retrieve from cnode gateway endpoints, healthiest first.
+        gateway_endpoints = self._gateway_health.order(self._cnode_endpoints)
         for address in gateway_endpoints:
             # First, query as dir.
             gateway_query_address = urljoin(address, f"/ipfs/{multihash}/150x150.jpg")
@@ -232,3 +302,15 @@ class IPFSClient:
 
     def ipfs_id_multiaddr(self):
         return self._multiaddr
+
+    def get_cid_cache_stats(self):
+        return self._cid_cache.get_stats()
+
+    def flush_cid_cache_stats(self, redis):
+        self._cid_cache.flush_stats(redis)
+
+    def get_gateway_health(self):
+        return self._gateway_health.get_stats()
+
+    def flush_gateway_health(self, redis):
+        redis.set(ipfs_gateway_health_redis_key, json.dumps(self._gateway_health.get_stats()))
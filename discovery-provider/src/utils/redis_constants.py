@@ -1,3 +1,31 @@
 latest_block_redis_key = 'latest_block_from_chain'
 latest_block_hash_redis_key = 'latest_blockhash_from_chain'
 most_recent_indexed_block_redis_key = 'most_recently_indexed_block_from_db'
+
+# Lexeme dictionary entries waiting to be rebuilt by the update_lexeme_dict task
+lexeme_dict_dirty_ids_redis_key_prefix = 'lexeme_dict_dirty_ids'
+lexeme_dict_dirty_since_redis_key = 'lexeme_dict_dirty_since'
+lexeme_dict_refresh_duration_redis_key = 'lexeme_dict_refresh_duration'
+lexeme_dict_refresh_lag_redis_key = 'lexeme_dict_refresh_lag'
+lexeme_dict_refresh_skipped_redis_key = 'lexeme_dict_refresh_skipped'
+lexeme_dict_refresh_completed_redis_key = 'lexeme_dict_refresh_completed'
+
+# Hash of IPFS CID cache counters summed across worker processes
+cid_cache_stats_redis_key = 'ipfs_cid_cache_stats'
+
+# JSON snapshot of IPFS gateway latency, error rate and ejection state
+ipfs_gateway_health_redis_key = 'ipfs_gateway_health'
+
+# Creator node endpoints published by the update_ipfs_peers task, and endpoints that failed to respond
+ipfs_cnode_endpoints_redis_key = 'ipfs_cnode_endpoints'
+ipfs_peer_failure_redis_key_prefix = 'ipfs_peer_failure'
+
+# Followee ids of a user cached across requests, deleted by the indexer when the user's follows change
+followee_ids_redis_key_prefix = 'followee_ids'
+
+# Trending rankings cached per time range and genre, with per cache key hit/miss counters
+trending_cache_redis_key_prefix = 'trending_ranking'
+trending_cache_refresh_lock_redis_key_prefix = 'trending_cache_refresh_lock'
+trending_cache_hits_redis_key = 'trending_cache_hits'
+trending_cache_stale_hits_redis_key = 'trending_cache_stale_hits'
+trending_cache_misses_redis_key = 'trending_cache_misses'
@@ -0,0 +1,122 @@
+import calendar
+import logging
+import struct
+import time
+from datetime import datetime
+from src.queries import response_name_constants
+from src.utils.config import shared_config
+from src.utils.redis_constants import trending_cache_redis_key_prefix, \
+    trending_cache_refresh_lock_redis_key_prefix, trending_cache_hits_redis_key, \
+    trending_cache_stale_hits_redis_key, trending_cache_misses_redis_key
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached ranking is fresh, and seconds a stale ranking is still served while it is refreshed
+TRENDING_CACHE_MAX_AGE = int(shared_config["discprov"]["trending_cache_max_age"])
+TRENDING_CACHE_TTL = int(shared_config["discprov"]["trending_cache_ttl"])
+
+# Seconds after which an unfinished refresh of a stale entry may be retried by another request
+trending_cache_refresh_lock_timeout = 60
+
+# Rankings are cached as a fixed size header followed by fixed size records so a page is read with
+# GETRANGE and only the requested records are decoded
+# header: refreshed_at timestamp, number of records
+trending_cache_header = struct.Struct("<dI")
+# record: track_id, listens, repost_count, windowed_repost_count, save_count, windowed_save_count,
+# owner_id, owner_follower_count, created_at as seconds since epoch (-1 when unknown)
+trending_cache_record = struct.Struct("<8Iq")
+trending_cache_record_fields = [
+    response_name_constants.track_id,
+    "listens",
+    response_name_constants.repost_count,
+    response_name_constants.windowed_repost_count,
+    response_name_constants.save_count,
+    response_name_constants.windowed_save_count,
+    response_name_constants.track_owner_id,
+    response_name_constants.track_owner_follower_count,
+]
+
+trending_cache_stats_redis_keys = {
+    "hits": trending_cache_hits_redis_key,
+    "stale_hits": trending_cache_stale_hits_redis_key,
+    "misses": trending_cache_misses_redis_key,
+}
+
+
+def get_trending_cache_key(time_range, genre=None):
+    if genre is None:
+        return f"{trending_cache_redis_key_prefix}-{time_range}"
+    return f"{trending_cache_redis_key_prefix}-{time_range}-{genre}"
+
+
+def pack_trending_records(listen_counts, refreshed_at):
+    packed = [trending_cache_header.pack(refreshed_at, len(listen_counts))]
+    for track_entry in listen_counts:
+        # created_at is cached in the isoformat generate_trending returns
+        created_at = track_entry[response_name_constants.created_at]
+        created_at = calendar.timegm(datetime.fromisoformat(created_at).utctimetuple()) if created_at else -1
+        packed.append(trending_cache_record.pack(
+            *[track_entry[field] for field in trending_cache_record_fields],
+            created_at
+        ))
+    return b"".join(packed)
+
+
+def unpack_trending_records(packed_records):
+    listen_counts = []
+    for record in trending_cache_record.iter_unpack(packed_records):
+        track_entry = dict(zip(trending_cache_record_fields, record))
+        created_at = record[-1]
+        track_entry[response_name_constants.created_at] = \
+            datetime.utcfromtimestamp(created_at).isoformat(timespec='seconds') if created_at >= 0 else None
+        listen_counts.append(track_entry)
+    return listen_counts
+
+
+def get_trending_cache_entry(redis, cache_key, offset, limit):
+    """ Returns the (cached response page, is_stale) tuple of cache_key, or None when it is not cached """
+    records_start = trending_cache_header.size + offset * trending_cache_record.size
+    records_end = trending_cache_header.size + (offset + limit) * trending_cache_record.size - 1
+    pipe = redis.pipeline()
+    pipe.getrange(cache_key, 0, trending_cache_header.size - 1)
+    pipe.getrange(cache_key, records_start, records_end)
+    (header, packed_records) = pipe.execute()
+    if len(header) < trending_cache_header.size:
+        return None
+
+    (refreshed_at, _) = trending_cache_header.unpack(header)
+    is_stale = time.time() - refreshed_at > TRENDING_CACHE_MAX_AGE
+    return ({"listen_counts": unpack_trending_records(packed_records)}, is_stale)
+
+
+def set_trending_cache_entry(redis, cache_key, response):
+    packed_entry = pack_trending_records(response["listen_counts"], time.time())
+    redis.set(cache_key, packed_entry, TRENDING_CACHE_TTL)
+
+
+def acquire_trending_cache_refresh(redis, cache_key):
+    """ Returns True for the single caller allowed to refresh a stale cache_key """
+    refresh_lock_key = f"{trending_cache_refresh_lock_redis_key_prefix}:{cache_key}"
+    return bool(redis.set(refresh_lock_key, 1, ex=trending_cache_refresh_lock_timeout, nx=True))
+
+
+def release_trending_cache_refresh(redis, cache_key):
+    redis.delete(f"{trending_cache_refresh_lock_redis_key_prefix}:{cache_key}")
+
+
+def record_trending_cache_access(redis, cache_key, access):
+    """ Increments the counter of cache_key for access, one of hits, stale_hits or misses """
+    redis.hincrby(trending_cache_stats_redis_keys[access], cache_key, 1)
+
+
+def get_trending_cache_stats(redis):
+    """ Returns cache key --> {hits, stale_hits, misses} """
+    stats = {}
+    for (access, stats_redis_key) in trending_cache_stats_redis_keys.items():
+        for (cache_key, count) in redis.hgetall(stats_redis_key).items():
+            cache_key_stats = stats.setdefault(
+                cache_key.decode("utf-8"),
+                {stat: 0 for stat in trending_cache_stats_redis_keys}
+            )
+            cache_key_stats[access] = int(count)
+    return stats
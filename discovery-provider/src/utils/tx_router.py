@@ -0,0 +1,46 @@
+class TxRouter:
+    """ Routes transactions to the handlers registered for the contract they target.
+
+        Addresses are normalized to lowercase so checksummed and plain addresses match. Routing
+        only looks at the transaction itself, so receipts can be fetched solely for transactions
+        that at least one handler cares about.
+
+        Usage:
+            router = TxRouter()
+            router.register(contract_addresses["track_factory"], "track_factory")
+            handlers = router.get_handlers(tx)
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def register(self, address, handler_name):
+        handlers = self._routes.setdefault(address.lower(), [])
+        if handler_name not in handlers:
+            handlers.append(handler_name)
+
+    @property
+    def handler_names(self):
+        names = []
+        for handlers in self._routes.values():
+            for handler_name in handlers:
+                if handler_name not in names:
+                    names.append(handler_name)
+        return names
+
+    def get_handlers(self, tx):
+        """ Return the names of the handlers registered for the tx target address """
+        tx_target_contract_address = tx["to"]
+        # Contract creation transactions have no target
+        if not tx_target_contract_address:
+            return []
+        return self._routes.get(tx_target_contract_address.lower(), [])
+
+    def route_transactions(self, txs):
+        """ Return a list of (tx, handler names) for the transactions with at least one handler """
+        routed_txs = []
+        for tx in txs:
+            handlers = self.get_handlers(tx)
+            if handlers:
+                routed_txs.append((tx, handlers))
+        return routed_txs
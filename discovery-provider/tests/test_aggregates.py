@@ -0,0 +1,109 @@
+from src.models import Track, Playlist, Follow, Repost, RepostType, Save, SaveType, User
+from src.tasks.aggregates import empty_aggregate_changes, add_aggregate_changes, \
+    add_reverted_aggregate_changes, update_aggregates
+
+
+class StatesSession:
+    """ Session stand-in returning the given (key..., was_active, is_active) rows of each social table """
+
+    def __init__(self, social_states):
+        self.social_states = social_states
+        self.statements = []
+
+    def execute(self, statement, params):
+        sql = " ".join(str(statement).split())
+        self.statements.append((sql, dict(params)))
+        for table, rows in self.social_states.items():
+            if f"FROM {table} e" in sql:
+                return rows
+        return []
+
+
+def get_deltas(session, table, id_column, columns):
+    """ Returns entity id -> deltas of columns upserted into the aggregate table """
+    [params] = [params for sql, params in session.statements if sql.startswith(f"INSERT INTO {table}")]
+    return {
+        params[f"{id_column}_{index}"]: tuple(params[f"{column}_{index}"] for column in columns)
+        for index in range(len([param for param in params if param.startswith(f"{id_column}_")]))
+    }
+
+
+def test_add_aggregate_changes():
+    models = [
+        User(user_id=1),
+        Track(track_id=2, owner_id=10),
+        Playlist(playlist_id=3, playlist_owner_id=11),
+        Follow(follower_user_id=12, followee_user_id=10),
+        Repost(user_id=13, repost_item_id=2, repost_type=RepostType.track),
+        Save(user_id=14, save_item_id=3, save_type=SaveType.playlist),
+    ]
+
+    aggregate_changes = add_aggregate_changes(empty_aggregate_changes(), models)
+
+    assert aggregate_changes == {
+        "owner": {10, 11},
+        "follows": {(12, 10): None},
+        "reposts": {(13, 2, RepostType.track): None},
+        "saves": {(14, 3, SaveType.playlist): None},
+    }
+
+
+def test_add_reverted_aggregate_changes():
+    """ Confirm the latest reverted version of a social row gives its state before the revert """
+    models = [
+        Follow(follower_user_id=12, followee_user_id=10, blocknumber=5, is_delete=False),
+        Follow(follower_user_id=12, followee_user_id=10, blocknumber=6, is_delete=True),
+        Repost(user_id=13, repost_item_id=2, repost_type=RepostType.track, blocknumber=6, is_delete=False),
+    ]
+
+    aggregate_changes = add_reverted_aggregate_changes(empty_aggregate_changes(), models)
+
+    assert aggregate_changes["follows"] == {(12, 10): False}
+    assert aggregate_changes["reposts"] == {(13, 2, RepostType.track): True}
+
+
+def test_update_aggregates_applies_deltas():
+    """ Confirm rows becoming active or inactive add or remove one from the counts they feed """
+    aggregate_changes = empty_aggregate_changes()
+    aggregate_changes["follows"] = {(12, 10): None, (12, 11): None}
+    aggregate_changes["reposts"] = {(13, 3, RepostType.album): None}
+    aggregate_changes["saves"] = {(14, 2, SaveType.track): None}
+    session = StatesSession({
+        # new follow, and an unfollow
+        "follows": [(12, 10, False, True), (12, 11, True, False)],
+        "reposts": [(13, 3, "album", False, True)],
+        # saved again in the same batch, no change
+        "saves": [(14, 2, "track", True, True)],
+    })
+
+    update_aggregates(session, aggregate_changes, 100)
+
+    social_states = [params for sql, params in session.statements if "was_active" in sql]
+    assert [params["before_block_number"] for params in social_states] == [100, 100, 100]
+
+    [(user_sql, _)] = [sql for sql in session.statements if sql[0].startswith("INSERT INTO user_aggregates")]
+    assert "follower_count = user_aggregates.follower_count + EXCLUDED.follower_count" in user_sql
+    # user 12 followed and unfollowed in the batch, its deltas cancel out
+    assert get_deltas(session, "user_aggregates", "user_id", ["follower_count", "followee_count", "repost_count"]) == {
+        10: (1, 0, 0),
+        11: (-1, 0, 0),
+        13: (0, 0, 1),
+    }
+    assert get_deltas(session, "playlist_aggregates", "playlist_id", ["album_repost_count", "album_save_count"]) == {
+        3: (1, 0),
+    }
+    assert not [sql for sql, _ in session.statements if sql.startswith("INSERT INTO track_aggregates")]
+
+
+def test_update_aggregates_recomputes_owner_content():
+    """ Confirm only the track and playlist counts of owners are recomputed """
+    aggregate_changes = add_aggregate_changes(empty_aggregate_changes(), [Track(track_id=2, owner_id=10)])
+    session = StatesSession({})
+
+    update_aggregates(session, aggregate_changes, 100)
+
+    [(sql, params)] = session.statements
+    assert sql.startswith("INSERT INTO user_aggregates")
+    assert "follower_count = EXCLUDED.follower_count" not in sql
+    assert "track_count = EXCLUDED.track_count" in sql
+    assert params == {"user_ids": [10]}
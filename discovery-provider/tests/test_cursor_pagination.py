@@ -0,0 +1,118 @@
+from collections import namedtuple
+from datetime import datetime
+import pytest
+from flask import Flask
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.dialects import postgresql
+from src import exceptions
+from src.models import Follow, Repost
+from src.queries.query_helpers import encode_cursor, decode_cursor, get_keyset_filter, \
+    paginate_query_with_cursor
+
+sort_keys = [(Repost.created_at, True), (Repost.repost_item_id, True), (Repost.repost_type, True)]
+follow_sort_keys = [(Follow.follower_user_id, True), (Follow.followee_user_id, False)]
+
+FollowRow = namedtuple("FollowRow", ["follower_user_id", "followee_user_id"])
+
+
+class PageQuery:
+    """ Query stand-in recording the pagination applied by paginate_query_with_cursor """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.keyset_filtered = False
+        self.applied_offset = None
+
+    def order_by(self, *clauses):  # pylint: disable=W0613
+        return self
+
+    def filter(self, *criteria):  # pylint: disable=W0613
+        self.keyset_filtered = True
+        return self
+
+    def offset(self, offset):
+        self.applied_offset = offset
+        self.rows = self.rows[offset:]
+        return self
+
+    def limit(self, limit):
+        self.rows = self.rows[:limit]
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def compile_literal(clause):
+    return str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2020, 6, 1, 12, 30, 15, 250)
+    cursor = encode_cursor([created_at, 42, "track"])
+
+    assert decode_cursor(cursor, sort_keys) == [created_at, 42, "track"]
+
+
+def test_invalid_cursor():
+    with pytest.raises(exceptions.ArgumentError):
+        decode_cursor("not a cursor", sort_keys)
+
+    # cursors are only valid for the sort keys they were created with
+    with pytest.raises(exceptions.ArgumentError):
+        decode_cursor(encode_cursor([42, "track"]), sort_keys)
+
+
+def test_keyset_filter_single_direction():
+    keyset_filter = get_keyset_filter(
+        [(Follow.follower_user_id, True), (Follow.followee_user_id, True)], [10, 5]
+    )
+
+    assert compile_literal(keyset_filter) == compile_literal(
+        tuple_(Follow.follower_user_id, Follow.followee_user_id) < tuple_(10, 5)
+    )
+
+
+def test_keyset_filter_mixed_directions():
+    keyset_filter = get_keyset_filter(follow_sort_keys, [10, 5])
+
+    # rows after (10, 5) have a lower first key, or the same first key and a higher second key
+    assert compile_literal(keyset_filter) == compile_literal(or_(
+        and_(Follow.follower_user_id < 10),
+        and_(Follow.follower_user_id == 10, Follow.followee_user_id > 5)
+    ))
+
+
+def test_paginate_query_with_cursor_next_page():
+    rows = [FollowRow(3, 1), FollowRow(2, 1), FollowRow(1, 1)]
+
+    with Flask(__name__).test_request_context("/?limit=2&offset=0"):
+        query = PageQuery(rows)
+        (results, next_cursor) = paginate_query_with_cursor(query, follow_sort_keys)
+
+    assert results == rows[:2]
+    assert query.applied_offset == 0
+    assert not query.keyset_filtered
+    assert next_cursor == encode_cursor([2, 1])
+
+    # the next page resumes after the cursor instead of skipping rows, and is the last one
+    with Flask(__name__).test_request_context(f"/?limit=2&cursor={next_cursor}"):
+        query = PageQuery(rows[2:])
+        (results, next_cursor) = paginate_query_with_cursor(query, follow_sort_keys)
+
+    assert results == rows[2:]
+    assert query.applied_offset is None
+    assert query.keyset_filtered
+    assert next_cursor is None
+
+
+def test_paginate_query_with_cursor_offset():
+    rows = [FollowRow(3, 1), FollowRow(2, 1), FollowRow(1, 1)]
+
+    with Flask(__name__).test_request_context("/?limit=2&offset=2"):
+        query = PageQuery(rows)
+        (results, next_cursor) = paginate_query_with_cursor(query, follow_sort_keys)
+
+    assert results == rows[2:]
+    assert query.applied_offset == 2
+    assert next_cursor is None
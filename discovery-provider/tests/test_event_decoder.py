@@ -0,0 +1,59 @@
+from eth_abi import encode_abi
+from eth_utils import event_abi_to_log_topic
+from src.utils.event_decoder import EventDecoder
+
+social_feature_factory_address = "0x5aa6B61A0E3E0a4E1E6a5c3F4E7e1B9c6d4E2A31"
+
+follow_event_abis = [
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": False, "name": "_followerUserId", "type": "uint256"},
+            {"indexed": False, "name": "_followeeUserId", "type": "uint256"}
+        ],
+        "name": event_name,
+        "type": "event"
+    }
+    for event_name in ["UserFollowAdded", "UserFollowDeleted"]
+]
+
+
+def make_log(address, event_abi, follower_user_id, followee_user_id, log_index):
+    return {
+        "address": address,
+        "topics": [event_abi_to_log_topic(event_abi)],
+        "data": encode_abi(["uint256", "uint256"], [follower_user_id, followee_user_id]),
+        "logIndex": log_index,
+        "transactionIndex": 0,
+        "transactionHash": b"\x01" * 32,
+        "blockHash": b"\x02" * 32,
+        "blockNumber": 1
+    }
+
+
+def test_decode_receipt():
+    event_decoder = EventDecoder()
+    event_decoder.register(social_feature_factory_address, follow_event_abis, "social_feature_factory")
+    (follow_added_abi, follow_deleted_abi) = follow_event_abis
+
+    tx_receipt = {
+        "logs": [
+            # addresses are matched case insensitively
+            make_log(social_feature_factory_address.lower(), follow_added_abi, 1, 2, 0),
+            make_log(social_feature_factory_address, follow_deleted_abi, 1, 3, 1),
+            make_log(social_feature_factory_address, follow_added_abi, 4, 2, 2),
+            # logs of unregistered contracts are skipped
+            make_log("0x0000000000000000000000000000000000000001", follow_added_abi, 5, 6, 3),
+        ]
+    }
+    tx_events = event_decoder.decode_receipt(tx_receipt)
+
+    assert list(tx_events.keys()) == ["social_feature_factory"]
+    follow_events = tx_events["social_feature_factory"]
+    assert [
+        (event["args"]._followerUserId, event["args"]._followeeUserId)
+        for event in follow_events["UserFollowAdded"]
+    ] == [(1, 2), (4, 2)]
+    assert [event["logIndex"] for event in follow_events["UserFollowDeleted"]] == [1]
+
+    assert event_decoder.decode_receipt({"logs": []}) == {}
@@ -0,0 +1,149 @@
+from datetime import datetime
+from flask import Flask
+import src.queries.queries
+import src.tasks.feed_entries
+from src.models import Track, Playlist, Repost, RepostType, Follow, Save, SaveType
+from src.queries.query_helpers import encode_cursor
+from src.tasks.feed_entries import empty_feed_changes, add_feed_changes, update_feed_entries, \
+    get_feed_entries
+
+
+class ExecuteSession:
+    """ Session stand-in recording the SQL statements and parameters executed on it """
+
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.statements = []
+
+    def execute(self, statement, params):
+        self.statements.append((" ".join(str(statement).split()), dict(params)))
+        return list(self.rows)
+
+
+def test_add_feed_changes():
+    models = [
+        Track(track_id=1, owner_id=10),
+        Playlist(playlist_id=2, playlist_owner_id=10, playlist_contents={"track_ids": [{"track": 3, "time": 0}]}),
+        Repost(user_id=11, repost_item_id=4, repost_type=RepostType.track),
+        Repost(user_id=11, repost_item_id=5, repost_type=RepostType.album),
+        Follow(follower_user_id=12, followee_user_id=10),
+        Save(user_id=13, save_item_id=6, save_type=SaveType.track),
+    ]
+
+    feed_changes = add_feed_changes(empty_feed_changes(), models)
+
+    assert feed_changes == {"track": {1, 3, 4}, "playlist": {2, 5}, "follower": {12}}
+
+
+def test_get_feed_entries_all():
+    """ Confirm the default feed hides folded playlist tracks and dedupes reposts of original items """
+    session = ExecuteSession(rows=[("track", 1, datetime(2020, 1, 1))])
+
+    feed_entries = get_feed_entries(session, 10, "all", False, 5)
+
+    [(sql, params)] = session.statements
+    assert "e.follower_user_id = :follower_user_id" in sql
+    assert "(e.is_repost = true or e.is_playlist_track = false)" in sql
+    assert "NOT EXISTS" in sql
+    assert "c.is_playlist_track = false" in sql
+    assert "e.item_type = 'track'" not in sql
+    assert ":before_timestamp" not in sql
+    assert "LIMIT :limit OFFSET :offset" in sql
+    assert params == {"follower_user_id": 10, "limit": 5, "offset": 0}
+    assert feed_entries == [("track", 1, datetime(2020, 1, 1))]
+
+
+def test_get_feed_entries_tracks_only():
+    """ Confirm tracks only feeds keep folded playlist tracks and skip playlists """
+    session = ExecuteSession()
+
+    get_feed_entries(session, 10, "all", True, 5)
+
+    [(sql, _)] = session.statements
+    assert "e.item_type = 'track'" in sql
+    assert "e.is_playlist_track = false" not in sql
+    assert "c.is_playlist_track" not in sql
+    assert "NOT EXISTS" in sql
+
+
+def test_get_feed_entries_feed_filters():
+    """ Confirm original and repost feeds filter on is_repost without deduping """
+    for (feed_filter, is_repost_filter) in [("original", "e.is_repost = false"), ("repost", "e.is_repost = true")]:
+        session = ExecuteSession()
+
+        get_feed_entries(session, 10, feed_filter, False, 5)
+
+        [(sql, _)] = session.statements
+        assert f" and {is_repost_filter} ORDER BY" in sql
+        assert "NOT EXISTS" not in sql
+
+
+def test_get_feed_entries_before():
+    """ Confirm a cursor reads the entries sorted after it """
+    session = ExecuteSession()
+    before = (datetime(2020, 1, 1), "track", 3)
+
+    get_feed_entries(session, 10, "all", False, 5, before)
+
+    [(sql, params)] = session.statements
+    assert (
+        "(e.activity_timestamp, e.item_type, e.item_id) < "
+        "(:before_timestamp, :before_item_type, :before_item_id)"
+    ) in sql
+    assert params["before_timestamp"] == datetime(2020, 1, 1)
+    assert params["before_item_type"] == "track"
+    assert params["before_item_id"] == 3
+    assert params["offset"] == 0
+
+
+def test_get_feed_items_from_store_offset_fallback(monkeypatch):
+    """ Confirm offset is applied without a cursor and ignored along with one """
+    reads = []
+
+    def mock_get_feed_entries(session, follower_user_id, feed_filter, tracks_only, limit, before, offset):
+        reads.append((limit, before, offset))
+        return []
+
+    monkeypatch.setattr(src.queries.queries, "get_feed_entries", mock_get_feed_entries)
+
+    with Flask(__name__).test_request_context("/?limit=2&offset=4"):
+        src.queries.queries.get_feed_items_from_store(ExecuteSession(), 10, "all", False)
+
+    created_at = datetime(2020, 1, 1)
+    cursor = encode_cursor([created_at, "track", 3])
+    with Flask(__name__).test_request_context(f"/?limit=2&offset=4&cursor={cursor}"):
+        src.queries.queries.get_feed_items_from_store(ExecuteSession(), 10, "all", False)
+
+    assert reads == [(3, None, 4), (3, [created_at, "track", 3], 0)]
+
+
+def test_update_feed_entries_caps_entries_per_user(monkeypatch):
+    """ Confirm recomputed entries are capped and pruned to FEED_ENTRIES_MAX_PER_USER per follower """
+    monkeypatch.setattr(src.tasks.feed_entries, "FEED_ENTRIES_MAX_PER_USER", 50)
+    # Track 7 was removed from playlist 2 but is still within its dedupe window
+    session = ExecuteSession(rows=[(7,)])
+    feed_changes = empty_feed_changes()
+    feed_changes["playlist"].add(2)
+    feed_changes["follower"].add(12)
+
+    update_feed_entries(session, feed_changes)
+
+    statements = [sql for sql, _ in session.statements]
+    assert [params["max_entries"] for _, params in session.statements] == [50] * 6
+    assert session.statements[1][1]["track_ids"] == [7]
+    assert statements[1].startswith("DELETE FROM feed_entries WHERE")
+    assert statements[2].startswith("INSERT INTO feed_entries")
+    assert "WHERE entry_rank <= :max_entries" in statements[2]
+    assert "ranked.entry_rank > :max_entries" in statements[3]
+    assert "WHERE entry_rank <= :max_entries" in statements[5]
+
+
+def test_update_feed_entries_disabled(monkeypatch):
+    """ Confirm nothing is written when the feed store is disabled """
+    monkeypatch.setattr(src.tasks.feed_entries, "FEED_ENTRIES_MAX_PER_USER", 0)
+    session = ExecuteSession()
+    feed_changes = add_feed_changes(empty_feed_changes(), [Track(track_id=1, owner_id=10)])
+
+    update_feed_entries(session, feed_changes)
+
+    assert session.statements == []
@@ -0,0 +1,29 @@
+from src.utils.gateway_health import GatewayHealth
+
+
+def test_gateway_health_orders_by_score():
+    gateway_health = GatewayHealth()
+    gateway_health.record_success("https://fast", 0.1)
+    gateway_health.record_success("https://slow", 2.0)
+    gateway_health.record_failure("https://flaky", 0.1)
+
+    # Errors weigh more than latency
+    assert gateway_health.order(["https://flaky", "https://slow", "https://fast"]) == [
+        "https://fast", "https://slow", "https://flaky"
+    ]
+
+
+def test_gateway_health_ejects_failing_gateway():
+    gateway_health = GatewayHealth(eject_after=2)
+    gateway_health.record_failure("https://dead", 3)
+    assert gateway_health.order(["https://dead", "https://live"]) == ["https://live", "https://dead"]
+
+    gateway_health.record_failure("https://dead", 3)
+    assert gateway_health.order(["https://dead", "https://live"]) == ["https://live"]
+    assert gateway_health.get_stats()["https://dead"]["ejected_for_sec"] > 0
+
+    # Every gateway is still queried when all of them are ejected
+    assert gateway_health.order(["https://dead"]) == ["https://dead"]
+
+    gateway_health.record_success("https://dead", 0.2)
+    assert gateway_health.get_stats()["https://dead"]["ejected_for_sec"] == 0
@@ -0,0 +1,75 @@
+from datetime import datetime
+from types import SimpleNamespace
+from web3 import Web3
+from web3.utils.datastructures import AttributeDict
+import src.tasks.index
+from src.models import Block, User, Track
+from src.tasks.metadata import track_metadata_format
+from src.tasks.tracks import get_track_metadata_multihash
+from src.utils.db_session import get_db
+
+handler_names = [
+    "user_factory",
+    "track_factory",
+    "social_feature_factory",
+    "playlist_factory",
+    "user_library_factory",
+]
+
+
+def make_event(block_hash, **args):
+    return AttributeDict({"args": AttributeDict(args), "blockHash": block_hash})
+
+
+def test_index_block_reports_models_written_by_autoflush(app, monkeypatch):
+    """ Confirm models an earlier state update added are reported after a later one autoflushed them """
+    monkeypatch.setattr(src.tasks.index, "update_task", SimpleNamespace(web3=Web3))
+
+    block_hash = b"\x01" * 32
+    block = SimpleNamespace(
+        number=1,
+        timestamp=datetime(2020, 1, 1).timestamp(),
+        hash=block_hash,
+        parentHash=b"\x00" * 32,
+    )
+    user_event = make_event(
+        block_hash,
+        _userId=1,
+        _handle=b"tester".ljust(32, b"\x00"),
+        _wallet="0xAbC"
+    )
+    track_event = make_event(
+        block_hash,
+        _id=1,
+        _trackOwnerId=1,
+        _multihashDigest=b"\x02" * 32,
+        _multihashHashFn=18
+    )
+    ipfs_metadata = {
+        get_track_metadata_multihash(track_event["args"]): {**track_metadata_format, "title": "track"}
+    }
+    block_tx_events = [
+        ("0x01", {"user_factory": {"AddUser": [user_event]}}),
+        ("0x02", {"track_factory": {"NewTrack": [track_event]}}),
+    ]
+
+    with app.app_context():
+        db = get_db()
+
+    with db.scoped_session() as session:
+        session.add(Block(blockhash=Web3.toHex(block.parentHash), parenthash="0x0", number=0, is_current=True))
+
+    with db.scoped_session() as session:
+        block_models = src.tasks.index.index_block(
+            None,
+            session,
+            block,
+            SimpleNamespace(handler_names=handler_names),
+            block_tx_events,
+            ipfs_metadata
+        )
+
+        # The track prefetch reads the owner handle, autoflushing the new user before the track is added
+        assert [model.user_id for model in block_models if isinstance(model, User)] == [1]
+        assert [model.track_id for model in block_models if isinstance(model, Track)] == [1]
+        assert [model.number for model in block_models if isinstance(model, Block)] == [1]
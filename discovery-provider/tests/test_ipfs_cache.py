@@ -0,0 +1,35 @@
+from src.utils.ipfs_cache import CIDCache
+
+
+def test_cid_cache_persists_metadata(tmpdir):
+    db_path = str(tmpdir.join("cid_cache.db"))
+    cache = CIDCache(db_path)
+
+    assert cache.get_metadata("QmMetadata") is None
+    cache.put_metadata("QmMetadata", {"title": "track"})
+    cache.put_is_directory("QmDirectory", True)
+    assert cache.get_metadata("QmMetadata") == {"title": "track"}
+
+    stats = cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+
+    # A fresh cache reads entries back from disk
+    restarted_cache = CIDCache(db_path)
+    assert restarted_cache.get_metadata("QmMetadata") == {"title": "track"}
+    assert restarted_cache.get_is_directory("QmDirectory") == True
+    assert restarted_cache.get_is_directory("QmUnknown") is None
+    assert restarted_cache.get_stats()["disk_hits"] == 2
+
+
+def test_cid_cache_evicts_least_recently_used():
+    cache = CIDCache(max_memory_bytes=30)
+    cache.put_metadata("QmFirst", {"a": "1234"})
+    cache.put_metadata("QmSecond", {"b": "1234"})
+    # Touch the first entry so the second is evicted next
+    assert cache.get_metadata("QmFirst") is not None
+    cache.put_metadata("QmThird", {"c": "1234"})
+
+    assert cache.get_metadata("QmFirst") == {"a": "1234"}
+    assert cache.get_metadata("QmSecond") is None
+    assert cache.get_stats()["memory_bytes"] <= 30
@@ -0,0 +1,40 @@
+from web3.utils.datastructures import AttributeDict
+from src.tasks.metadata import user_metadata_format
+from src.tasks.metadata_prefetch import get_metadata_multihashes
+from src.utils import helpers
+
+first_digest = b"\x01" * 32
+second_digest = b"\x02" * 32
+
+
+def make_event(**args):
+    return AttributeDict({"args": AttributeDict(args)})
+
+
+def test_get_metadata_multihashes_skips_non_creators():
+    """ Confirm only the user multihashes users.py reads for creators with a handle are collected """
+    user_factory_txs = [
+        # Existing non creator, its metadata is never read
+        {"UpdateMultihash": [make_event(_userId=1, _multihashDigest=first_digest)]},
+        # New user becoming a creator in a later transaction
+        {
+            "AddUser": [make_event(_userId=2, _handle=b"creator".ljust(32, b"\x00"), _wallet="0xabc")],
+            "UpdateMultihash": [make_event(_userId=2, _multihashDigest=second_digest)],
+        },
+        {"UpdateIsCreator": [make_event(_userId=2, _isCreator=True)]},
+    ]
+    current_users = {1: (False, "listener", None)}
+
+    multihashes = get_metadata_multihashes([], user_factory_txs, current_users)
+
+    assert multihashes == {helpers.multihash_digest_to_cid(second_digest): user_metadata_format}
+
+
+def test_get_metadata_multihashes_existing_creator():
+    """ Confirm an existing creator's updated multihash is collected """
+    user_factory_txs = [{"UpdateMultihash": [make_event(_userId=1, _multihashDigest=first_digest)]}]
+    current_users = {1: (True, "creator", None)}
+
+    multihashes = get_metadata_multihashes([], user_factory_txs, current_users)
+
+    assert multihashes == {helpers.multihash_digest_to_cid(first_digest): user_metadata_format}
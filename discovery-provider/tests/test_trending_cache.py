@@ -0,0 +1,35 @@
+from src.utils.trending_cache import pack_trending_records, unpack_trending_records, \
+    trending_cache_header, trending_cache_record
+
+listen_counts = [
+    {
+        "track_id": track_id,
+        "listens": 1000 - track_id,
+        "repost_count": 10,
+        "windowed_repost_count": 3,
+        "save_count": 20,
+        "windowed_save_count": 5,
+        "track_owner_id": 7,
+        "track_owner_follower_count": 300,
+        "created_at": "2020-06-01T12:30:15" if track_id % 2 else None,
+    }
+    for track_id in range(1, 11)
+]
+
+
+def test_pack_trending_records_round_trip():
+    packed = pack_trending_records(listen_counts, 1591014615.0)
+
+    assert trending_cache_header.unpack(packed[:trending_cache_header.size]) == (1591014615.0, 10)
+    assert unpack_trending_records(packed[trending_cache_header.size:]) == listen_counts
+
+
+def test_unpack_trending_records_page():
+    packed = pack_trending_records(listen_counts, 1591014615.0)
+    # a page of 3 records starting at offset 4, as read with GETRANGE
+    start = trending_cache_header.size + 4 * trending_cache_record.size
+    page = packed[start:start + 3 * trending_cache_record.size]
+
+    assert unpack_trending_records(page) == listen_counts[4:7]
+    # pages past the end of the ranking are empty
+    assert unpack_trending_records(packed[len(packed):]) == []
@@ -0,0 +1,30 @@
+from src.utils.tx_router import TxRouter
+
+track_factory_address = "0x5aa6B61A0E3E0a4E1E6a5c3F4E7e1B9c6d4E2A31"
+user_factory_address = "0x8f42c0E1e4a1B8dF3B5d4a2bD6E0c2A7F9E1D3C5"
+
+
+def test_tx_router():
+    tx_router = TxRouter()
+    tx_router.register(track_factory_address, "track_factory")
+    tx_router.register(user_factory_address, "user_factory")
+    tx_router.register(user_factory_address, "user_factory")
+
+    assert tx_router.handler_names == ["track_factory", "user_factory"]
+
+    # Matching is case insensitive so checksummed and lowercase addresses route the same
+    assert tx_router.get_handlers({"to": track_factory_address}) == ["track_factory"]
+    assert tx_router.get_handlers({"to": user_factory_address.lower()}) == ["user_factory"]
+
+    # Unknown targets and contract creations are not routed
+    assert tx_router.get_handlers({"to": "0x0000000000000000000000000000000000000001"}) == []
+    assert tx_router.get_handlers({"to": None}) == []
+
+    txs = [
+        {"hash": "0x1", "to": track_factory_address},
+        {"hash": "0x2", "to": None},
+        {"hash": "0x3", "to": user_factory_address},
+    ]
+    routed_txs = tx_router.route_transactions(txs)
+    assert [tx["hash"] for tx, _ in routed_txs] == ["0x1", "0x3"]
+    assert [handlers for _, handlers in routed_txs] == [["track_factory"], ["user_factory"]]